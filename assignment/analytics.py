@@ -0,0 +1,190 @@
+import itertools
+
+import numpy as np
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import F, FloatField
+from django.db.models.functions import Cast
+
+from school import rosters
+
+from .models import *
+
+VERSION_KEY = "class-grades-version:{}"
+STATS_KEY = "class-grade-stats:{}:{}"
+COLUMNS = ["student_id", "assignment_id", "lesson_id", "class_id", "score"]
+PERCENTILES = [10, 25, 75, 90]
+STATS = ["id", "count", "mean", "std", "min", "max", "median"] + [
+    f"p{p}" for p in PERCENTILES
+]
+HISTOGRAM_BINS = 10
+CHUNK_SIZE = 10000
+
+
+def bump_grades(class_ids):
+    """Invalidate the grade statistics of classes after a grade write."""
+    rosters.bump_versions(class_ids, VERSION_KEY)
+
+
+def load_grades(solutions):
+    """
+    Columns of `solutions` as NumPy arrays, with the grade as `score`, a
+    percentage of the assignment's grade so assignments graded out of 20
+    and out of 100 can be pooled. Rows are streamed into one flat float
+    array; no per-row Python objects are kept.
+    """
+    rows = (
+        solutions.filter(assignment__grade__gt=0)
+        .annotate(
+            lesson_id=F("assignment__lesson_id"),
+            class_id=F("assignment__class_obj_id"),
+            score=Cast("grade", FloatField())
+            * 100
+            / Cast("assignment__grade", FloatField()),
+        )
+        .order_by()
+        .values_list(*COLUMNS)
+        .iterator(chunk_size=CHUNK_SIZE)
+    )
+    data = np.fromiter(itertools.chain.from_iterable(rows), dtype=np.float64)
+    data = data.reshape(-1, len(COLUMNS))
+    grades = {name: data[:, i].astype(np.int64) for i, name in enumerate(COLUMNS)}
+    grades["score"] = data[:, -1]
+    return grades
+
+
+def rounded(values):
+    return np.round(values, 2).tolist()
+
+
+def group_stats(keys, scores):
+    """
+    Count, mean, standard deviation, extremes, median, percentiles and a
+    histogram of `scores` for every distinct value of `keys`, columnar.
+    The scores are sorted by (key, score) once and every statistic is read
+    off the group boundaries of that order. Also returns the z-score of
+    every score within its group, in the original order.
+    """
+    if not len(scores):
+        return {name: [] for name in STATS + ["histogram"]}, np.zeros(0)
+
+    order = np.lexsort((scores, keys))
+    keys, scores = keys[order], scores[order]
+    groups, starts, counts = np.unique(keys, return_index=True, return_counts=True)
+    index = np.repeat(np.arange(len(groups)), counts)
+
+    means = np.add.reduceat(scores, starts) / counts
+    deviations = scores - means[index]
+    stds = np.sqrt(np.add.reduceat(deviations**2, starts) / counts)
+
+    def percentile(p):
+        position = starts + (counts - 1) * p / 100
+        low = np.floor(position).astype(np.int64)
+        high = np.ceil(position).astype(np.int64)
+        return scores[low] + (scores[high] - scores[low]) * (position - low)
+
+    bins = np.clip(
+        (scores * HISTOGRAM_BINS // 100).astype(np.int64), 0, HISTOGRAM_BINS - 1
+    )
+    histogram = np.bincount(
+        index * HISTOGRAM_BINS + bins, minlength=len(groups) * HISTOGRAM_BINS
+    ).reshape(len(groups), HISTOGRAM_BINS)
+
+    z = np.zeros(len(scores))
+    spread = stds[index] > 0
+    z[order[spread]] = deviations[spread] / stds[index][spread]
+
+    stats = {
+        "id": groups.tolist(),
+        "count": counts.tolist(),
+        "mean": rounded(means),
+        "std": rounded(stds),
+        "min": rounded(scores[starts]),
+        "max": rounded(scores[starts + counts - 1]),
+        "median": rounded(percentile(50)),
+        **{f"p{p}": rounded(percentile(p)) for p in PERCENTILES},
+        "histogram": histogram.tolist(),
+    }
+    return stats, z
+
+
+def build_stats(solutions):
+    """
+    Grade statistics of `solutions` per assignment, lesson and class, and
+    every student's mean z-score across the assignments they were graded
+    on, from one query and one vectorized pass per grouping. Scores are
+    percentages of the assignment grades; histograms have
+    `HISTOGRAM_BINS` equal bins over 0-100.
+    """
+    grades = load_grades(solutions)
+    scores = grades["score"]
+    assignments, z = group_stats(grades["assignment_id"], scores)
+    lessons, _ = group_stats(grades["lesson_id"], scores)
+    classes, _ = group_stats(grades["class_id"], scores)
+
+    students, index = np.unique(grades["student_id"], return_inverse=True)
+    counts = np.bincount(index, minlength=len(students))
+    mean_z = np.bincount(index, weights=z, minlength=len(students)) / np.maximum(
+        counts, 1
+    )
+    return {
+        "assignments": assignments,
+        "lessons": lessons,
+        "classes": classes,
+        "students": {
+            "id": students.tolist(),
+            "count": counts.tolist(),
+            "mean_z": rounded(mean_z),
+        },
+        "solutions": {
+            "student": grades["student_id"],
+            "assignment": grades["assignment_id"],
+            "score": scores,
+            "z": z,
+        },
+    }
+
+
+def get_class_stats(class_id):
+    """
+    Cached `build_stats` of the solutions of a class. The key carries a
+    version bumped by every solution or assignment write in the class.
+    """
+    key = STATS_KEY.format(class_id, rosters.get_version(class_id, VERSION_KEY))
+    stats = cache.get(key)
+    if stats is None:
+        stats = build_stats(Solution.objects.filter(assignment__class_obj_id=class_id))
+        cache.set(
+            key,
+            stats,
+            timeout=getattr(settings, "GRADE_STATS_CACHE_TIMEOUT", 3600),
+        )
+    return stats
+
+
+def class_stats(class_id):
+    """Statistics of a class as returned by the API."""
+    stats = get_class_stats(class_id)
+    return {name: value for name, value in stats.items() if name != "solutions"}
+
+
+def assignment_stats(class_id, assignment_id):
+    """
+    Statistics of one assignment, picked out of its class statistics, with
+    the score and z-score of every graded student.
+    """
+    stats = get_class_stats(class_id)
+    assignments = stats["assignments"]
+    try:
+        row = assignments["id"].index(assignment_id)
+        summary = {name: column[row] for name, column in assignments.items()}
+    except ValueError:
+        summary = {"id": assignment_id, "count": 0}
+    solutions = stats["solutions"]
+    graded = solutions["assignment"] == assignment_id
+    summary["students"] = {
+        "id": solutions["student"][graded].tolist(),
+        "score": rounded(solutions["score"][graded]),
+        "z": rounded(solutions["z"][graded]),
+    }
+    return summary
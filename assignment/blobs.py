@@ -0,0 +1,99 @@
+import os
+from collections import Counter
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .models import *
+from .storage import BLOB_PREFIX, blob_digest, blob_path
+
+FILE_FIELDS = {Assignment: ["attachment", "answer_file"], Solution: ["attachment"]}
+BATCH_SIZE = 1000
+
+
+def file_names(instance):
+    return [getattr(instance, field).name for field in FILE_FIELDS[type(instance)]]
+
+
+def stored_names(model, pk):
+    """File names of a row as saved in the database, before a change."""
+    if pk is None:
+        return []
+    row = model.objects.filter(pk=pk).values_list(*FILE_FIELDS[model]).first()
+    return list(row or [])
+
+
+def adjust(changes):
+    """
+    Apply `{sha256: delta}` to the blob reference counts with atomic `F()`
+    updates, one statement per distinct delta and batch of blobs.
+    """
+    by_delta = {}
+    for digest, delta in changes.items():
+        if delta:
+            by_delta.setdefault(delta, []).append(digest)
+    for delta, digests in by_delta.items():
+        for start in range(0, len(digests), BATCH_SIZE):
+            Blob.objects.filter(pk__in=digests[start : start + BATCH_SIZE]).update(
+                refcount=F("refcount") + delta
+            )
+
+
+def count_references(added, removed):
+    """Count references from the `added` names, drop the `removed` ones."""
+    changes = Counter(filter(None, map(blob_digest, added)))
+    changes.subtract(filter(None, map(blob_digest, removed)))
+    adjust(changes)
+
+
+def recount():
+    """
+    Recompute every reference count from the file columns, for counts that
+    drifted (rows changed without signals, such as by `update()`). Returns
+    the number of referenced blobs.
+    """
+    counts = Counter()
+    for model, fields in FILE_FIELDS.items():
+        for field in fields:
+            names = model.objects.filter(
+                **{f"{field}__startswith": f"{BLOB_PREFIX}/"}
+            ).values_list(field, flat=True)
+            counts.update(map(blob_digest, names.iterator(chunk_size=BATCH_SIZE)))
+    with transaction.atomic():
+        Blob.objects.update(refcount=0)
+        adjust(counts)
+    return len(counts)
+
+
+def collect_garbage(batch_size=BATCH_SIZE, grace=None):
+    """
+    Delete the blobs nothing references, `batch_size` at a time: each batch
+    of rows is locked, their files removed and the rows deleted in one
+    transaction. Rows locked by a concurrent save are skipped, and blobs
+    stored in the last `grace` seconds are kept, since the attachment
+    naming them may not be saved yet. Returns the number deleted.
+    """
+    storage = attachment_storage()
+    if grace is None:
+        grace = getattr(settings, "BLOB_GC_GRACE", 60 * 60)
+    cutoff = timezone.now() - timedelta(seconds=grace)
+    deleted = 0
+    while True:
+        with transaction.atomic():
+            digests = list(
+                Blob.objects.select_for_update(skip_locked=True)
+                .filter(refcount__lte=0, stored_at__lt=cutoff)
+                .values_list("sha256", flat=True)[:batch_size]
+            )
+            if not digests:
+                return deleted
+            for digest in digests:
+                try:
+                    os.remove(storage.path(blob_path(digest)))
+                except FileNotFoundError:
+                    pass
+            Blob.objects.filter(pk__in=digests).delete()
+        deleted += len(digests)
@@ -0,0 +1,225 @@
+import mimetypes
+import os
+import re
+import time
+from urllib.parse import quote, urlencode
+
+from django.conf import settings
+from django.http import FileResponse, Http404, HttpResponse, HttpResponseRedirect
+from django.urls import reverse
+from django.utils import timezone
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.crypto import constant_time_compare, salted_hmac
+from django.utils.http import content_disposition_header, http_date
+
+from school.principal import get_principal
+
+from .blobs import FILE_FIELDS
+from .models import *
+
+READ_SIZE = 64 * 1024
+RANGE = re.compile(r"^bytes=(\d*)-(\d*)$")
+SALT = "assignment.downloads"
+DEFAULTS = {
+    # "django" sends files itself; "x-accel-redirect" (nginx) and
+    # "x-sendfile" (Apache, lighttpd) hand the transfer to the front proxy.
+    "BACKEND": "django",
+    "INTERNAL_URL": "/protected/",
+    "URL_EXPIRE": 60 * 60,
+}
+
+
+class DownloadError(Exception):
+    def __init__(self, detail, status):
+        super().__init__(detail)
+        self.detail = detail
+        self.status = status
+
+
+class FileRange:
+    """
+    `length` bytes of an open file from its current position. `fileno()`
+    lets a `wsgi.file_wrapper` (gunicorn) `sendfile()` them from there
+    without copying them through Python.
+    """
+
+    def __init__(self, file, length):
+        self.file = file
+        self.remaining = length
+
+    def read(self, size=-1):
+        if size < 0 or size > self.remaining:
+            size = self.remaining
+        data = self.file.read(size)
+        self.remaining -= len(data)
+        return data
+
+    def fileno(self):
+        return self.file.fileno()
+
+    def close(self):
+        self.file.close()
+
+
+def get_option(name):
+    return getattr(settings, "DOWNLOADS", {}).get(name, DEFAULTS[name])
+
+
+def get_attachment(request, model, pk, field):
+    """
+    Storage name of the `field` file of an assignment or solution, if the
+    user may download it: staff, the teacher and managers of the class,
+    the students of the class for assignment files (the answer once the
+    deadline has passed) and the student of a solution.
+    """
+    if field not in FILE_FIELDS[model]:
+        raise DownloadError("There is no such file.", 404)
+    queryset = model.objects.all()
+    if model is Solution:
+        queryset = queryset.select_related("assignment")
+    instance = queryset.filter(pk=pk).first()
+    if instance is None:
+        raise DownloadError(f"The {model._meta.model_name} was not found.", 404)
+
+    user, principal = request.user, get_principal(request)
+    if model is Solution:
+        class_id = instance.assignment.class_obj_id
+        allowed = instance.student_id == user.id
+    else:
+        class_id = instance.class_obj_id
+        allowed = principal.enrolled_in(class_id) and (
+            field == "attachment" or instance.deadline <= timezone.now()
+        )
+    if not (
+        allowed
+        or user.is_staff
+        or principal.teaches(class_id)
+        or principal.manages_class(class_id)
+    ):
+        raise DownloadError("You do not have permission to download this file.", 403)
+    name = getattr(instance, field).name
+    if not name:
+        raise DownloadError("There is no file attached.", 404)
+    return name
+
+
+def sign(name, expires):
+    return salted_hmac(SALT, f"{name}:{expires}", algorithm="sha256").hexdigest()
+
+
+def signed_url(name):
+    """
+    Path and expiry time of a signed link to the stored file `name`. The
+    expiry is rounded up to a multiple of `URL_EXPIRE`, so links handed out
+    in the same period are identical and stay cacheable.
+    """
+    expire = get_option("URL_EXPIRE")
+    expires = (int(time.time()) // expire + 2) * expire
+    query = urlencode({"expires": expires, "signature": sign(name, expires)})
+    return f"{reverse('signed-download', kwargs={'name': name})}?{query}", expires
+
+
+def check_signature(name, expires, signature):
+    try:
+        expires = int(expires)
+    except (TypeError, ValueError):
+        return False
+    return expires > time.time() and constant_time_compare(
+        sign(name, expires), signature or ""
+    )
+
+
+def requested_range(request, size, etag, last_modified):
+    """
+    `(start, end)` of the byte range requested, inclusive, or None to send
+    the whole file: without a Range header, for several ranges, or when
+    `If-Range` names another version. `start > end` is unsatisfiable.
+    """
+    header = request.headers.get("Range")
+    if not header or request.method not in ["GET", "HEAD"]:
+        return None
+    if_range = request.headers.get("If-Range")
+    if if_range and if_range not in [etag, http_date(last_modified)]:
+        return None
+    match = RANGE.match(header.strip())
+    if match is None:
+        return None
+    first, last = match.groups()
+    if not first:
+        if not last:
+            return None
+        return max(size - int(last), 0) if int(last) else size, size - 1
+    if last and int(last) < int(first):
+        return None
+    return int(first), min(int(last), size - 1) if last else size - 1
+
+
+def file_response(request, path, filename):
+    """
+    Send the file at `path` from Django, with `ETag` and `Last-Modified`
+    validators, conditional requests (304, 412) and a single byte range
+    (206, 416).
+    """
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        raise Http404("The file was not found.")
+    size, last_modified = stat.st_size, int(stat.st_mtime)
+    etag = f'"{last_modified:x}-{size:x}"'
+
+    response = get_conditional_response(
+        request, etag=etag, last_modified=last_modified
+    )
+    byte_range = None
+    if response is None:
+        byte_range = requested_range(request, size, etag, last_modified)
+        start, end = byte_range or (0, size - 1)
+        if start > end and byte_range is not None:
+            response = HttpResponse(status=416)
+            response["Content-Range"] = f"bytes */{size}"
+    if response is None:
+        file = open(path, "rb")
+        file.seek(start)
+        response = FileResponse(
+            FileRange(file, end - start + 1),
+            status=206 if byte_range else 200,
+            as_attachment=True,
+            filename=filename,
+        )
+        response.block_size = READ_SIZE
+        response["Content-Length"] = end - start + 1
+        if byte_range:
+            response["Content-Range"] = f"bytes {start}-{end}/{size}"
+    response["Accept-Ranges"] = "bytes"
+    response["ETag"] = etag
+    response["Last-Modified"] = http_date(last_modified)
+    return response
+
+
+def serve_file(request, name, max_age=0):
+    """
+    Response with the stored file `name` as an attachment. With a proxy
+    backend only headers are sent and the proxy transfers the file,
+    answering ranges and conditional requests itself. Storages without
+    local paths redirect to the storage's own URL.
+    """
+    storage = attachment_storage()
+    filename = os.path.basename(name)
+    try:
+        path = storage.path(name)
+    except NotImplementedError:
+        return HttpResponseRedirect(storage.url(name))
+    backend = get_option("BACKEND")
+    if backend == "django":
+        response = file_response(request, path, filename)
+    else:
+        content_type, _ = mimetypes.guess_type(filename)
+        response = HttpResponse(content_type=content_type or "application/octet-stream")
+        response["Content-Disposition"] = content_disposition_header(True, filename)
+        if backend == "x-accel-redirect":
+            internal_path = quote(os.path.relpath(path, storage.location))
+            response["X-Accel-Redirect"] = get_option("INTERNAL_URL") + internal_path
+        else:
+            response["X-Sendfile"] = path
+    patch_cache_control(response, private=True, max_age=max(max_age, 0))
+    return response
@@ -0,0 +1,29 @@
+from django.db.models import Exists, OuterRef, Q
+
+from school.filters import AccessFilterBackend, attends, teaches
+
+from .models import *
+
+
+class AssignmentAccessFilterBackend(AccessFilterBackend):
+    def get_access_filter(self, request, queryset, view):
+        user = request.user
+        if user.user_type == "teacher":
+            return teaches(user, "class_obj_id")
+        if user.user_type == "student":
+            return attends(user, "class_obj_id")
+        return Q(pk__in=[])
+
+
+class SolutionAccessFilterBackend(AccessFilterBackend):
+    def get_access_filter(self, request, queryset, view):
+        user = request.user
+        if user.user_type == "teacher":
+            return Exists(
+                Assignment.objects.filter(
+                    pk=OuterRef("assignment_id"), class_obj__teacher_id=user.id
+                )
+            )
+        if user.user_type == "student":
+            return Q(student_id=user.id)
+        return Q(pk__in=[])
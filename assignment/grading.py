@@ -0,0 +1,170 @@
+import codecs
+import csv
+from decimal import Decimal, InvalidOperation
+
+import numpy as np
+from django.db import transaction
+from django.utils import timezone
+
+from school.dashboard import bump_activity
+from school.principal import get_principal
+
+from .analytics import bump_grades
+from .models import *
+
+BATCH_SIZE = 1000
+MAX_CSV_ROWS = 10000
+
+
+class GradingError(Exception):
+    """Raised with `{solution_id: message}` when a bulk grading is refused."""
+
+    def __init__(self, errors):
+        super().__init__(errors)
+        self.errors = errors
+
+
+def read_grades_csv(stream):
+    """
+    `{solution_id: grade}` from a binary CSV stream with `solution` and
+    `grade` columns. Unparseable rows raise `GradingError` keyed by row.
+    """
+    grades, errors = {}, {}
+    rows = csv.DictReader(codecs.iterdecode(stream, "utf-8-sig"))
+    for number, row in enumerate(rows, start=2):
+        if number - 1 > MAX_CSV_ROWS:
+            errors[f"row {number}"] = f"At most {MAX_CSV_ROWS} rows are accepted."
+            break
+        try:
+            solution_id = int(row.get("solution") or row.get("solution_id") or "")
+            grades[solution_id] = Decimal((row.get("grade") or "").strip())
+        except (TypeError, ValueError, InvalidOperation):
+            errors[f"row {number}"] = "Expected a solution id and a numeric grade."
+    if errors:
+        raise GradingError(errors)
+    return grades
+
+
+def check_gradable(request, solution_ids):
+    """
+    Check solutions against the `CanGradeSolution` rules (the user teaches
+    the class and the deadline has passed) with one query. Returns the
+    assignment `(id, class_id, grade)` of every solution found and
+    `{solution_id: message}` of the refused ones.
+    """
+    principal = get_principal(request)
+    now = timezone.now()
+    rows = Solution.objects.filter(pk__in=solution_ids).values_list(
+        "id",
+        "assignment_id",
+        "assignment__class_obj_id",
+        "assignment__deadline",
+        "assignment__grade",
+    )
+    assignments, errors = {}, {}
+    for solution_id, assignment_id, class_id, deadline, max_grade in rows:
+        if not principal.teaches(class_id):
+            errors[solution_id] = "You do not teach the class of this solution."
+        elif deadline >= now:
+            errors[solution_id] = "The assignment deadline has not passed yet."
+        assignments[solution_id] = (assignment_id, class_id, max_grade)
+    for solution_id in set(solution_ids) - assignments.keys():
+        errors[solution_id] = "The solution was not found."
+    return assignments, errors
+
+
+def save_grades(grades, class_ids):
+    """Write `{solution_id: grade}` with batched `bulk_update`s in one transaction."""
+    now = timezone.now()
+    solutions = [
+        Solution(pk=solution_id, grade=grade, last_modified=now)
+        for solution_id, grade in grades.items()
+    ]
+    with transaction.atomic():
+        Solution.objects.bulk_update(
+            solutions, ["grade", "last_modified"], batch_size=BATCH_SIZE
+        )
+    # bulk_update skips the save signals.
+    bump_grades(class_ids)
+    bump_activity(
+        Class.objects.filter(pk__in=class_ids).values_list("school_id", flat=True)
+    )
+    return len(solutions)
+
+
+def grade_solutions(request, grades):
+    """
+    Apply `{solution_id: grade}` after checking every solution, all or
+    nothing. Grades must lie between 0 and the assignment's grade.
+    """
+    assignments, errors = check_gradable(request, list(grades))
+    for solution_id, grade in grades.items():
+        if solution_id in assignments and not (
+            0 <= grade <= assignments[solution_id][2]
+        ):
+            errors.setdefault(
+                solution_id, "The grade must be between 0 and the assignment's grade."
+            )
+    if errors:
+        raise GradingError(errors)
+    class_ids = {class_id for _, class_id, _ in assignments.values()}
+    return save_grades(grades, class_ids)
+
+
+def curve(grades, max_grade, method, options):
+    """
+    Curve an array of grades out of `max_grade`:
+
+    - "linear": `grade * scale + offset`; without either option the grades
+      are scaled so the best one becomes `max_grade`.
+    - "clamp": limit the grades to `[low, high]`.
+    - "percentile": map each grade's percentile rank (ties share the mean
+      rank) through the `percentiles` -> `grades` breakpoints.
+
+    Results are clipped to `[0, max_grade]` and rounded to cents.
+    """
+    if method == "linear":
+        scale, offset = options.get("scale"), options.get("offset")
+        if scale is None and offset is None:
+            best = grades.max(initial=0)
+            scale = max_grade / best if best > 0 else 1.0
+        curved = grades * (1.0 if scale is None else scale) + (offset or 0.0)
+    elif method == "clamp":
+        curved = np.clip(
+            grades, options.get("low", 0.0), options.get("high", max_grade)
+        )
+    elif method == "percentile":
+        ordered = np.sort(grades)
+        below = np.searchsorted(ordered, grades, side="left")
+        upto = np.searchsorted(ordered, grades, side="right")
+        ranks = (below + upto) / 2 / max(len(grades), 1) * 100
+        curved = np.interp(ranks, options["percentiles"], options["grades"])
+    else:
+        raise ValueError(f"Unknown curve: {method}")
+    return np.round(np.clip(curved, 0, max_grade), 2)
+
+
+def curve_assignment(request, assignment, method, options, dry_run=False):
+    """
+    Curve the grades of every solution of `assignment`, computed over all
+    of them at once, and save them unless `dry_run`. Returns
+    `{solution_id: new grade}`.
+    """
+    if not get_principal(request).teaches(assignment.class_obj_id):
+        raise GradingError({"assignment": "You do not teach the class."})
+    if assignment.deadline >= timezone.now():
+        raise GradingError({"assignment": "The deadline has not passed yet."})
+    rows = list(
+        Solution.objects.filter(assignment=assignment).values_list("id", "grade")
+    )
+    if not rows:
+        return {}
+    grades = np.array([float(grade) for _, grade in rows])
+    curved = curve(grades, float(assignment.grade), method, options)
+    new_grades = {
+        solution_id: Decimal(f"{grade:.2f}")
+        for (solution_id, _), grade in zip(rows, curved.tolist())
+    }
+    if not dry_run:
+        save_grades(new_grades, [assignment.class_obj_id])
+    return new_grades
@@ -0,0 +1,39 @@
+from django.core.management.base import BaseCommand
+
+from assignment.blobs import BATCH_SIZE, collect_garbage, recount
+
+
+class Command(BaseCommand):
+    help = (
+        "Delete attachment blobs that no assignment or solution references "
+        "any more, in batches."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=BATCH_SIZE,
+            help=f"Delete this many blobs per transaction (default: {BATCH_SIZE}).",
+        )
+        parser.add_argument(
+            "--grace",
+            type=int,
+            default=None,
+            help="Keep blobs stored in the last this many seconds "
+            "(default: BLOB_GC_GRACE).",
+        )
+        parser.add_argument(
+            "--recount",
+            action="store_true",
+            help="Recompute the reference counts from the attachments first.",
+        )
+
+    def handle(self, *args, **options):
+        if options["recount"]:
+            referenced = recount()
+            self.stdout.write(f"Recounted references to {referenced} blobs.")
+        deleted = collect_garbage(
+            batch_size=options["batch_size"], grace=options["grace"]
+        )
+        self.stdout.write(self.style.SUCCESS(f"Deleted {deleted} blobs."))
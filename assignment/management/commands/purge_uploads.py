@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from assignment.uploads import purge_uploads
+
+
+class Command(BaseCommand):
+    help = (
+        "Delete upload sessions older than UPLOAD_SESSIONS['EXPIRE_AFTER'] "
+        "together with their partial files."
+    )
+
+    def handle(self, *args, **options):
+        purged = purge_uploads()
+        self.stdout.write(self.style.SUCCESS(f"Purged {purged} upload sessions."))
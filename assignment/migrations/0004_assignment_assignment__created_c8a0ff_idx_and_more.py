@@ -0,0 +1,24 @@
+# Generated by Django 5.2.18 on 2026-10-18 18:17
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('assignment', '0003_initial'),
+        ('school', '0002_initial'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='assignment',
+            index=models.Index(fields=['created_at', 'id'], name='assignment__created_c8a0ff_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='solution',
+            index=models.Index(fields=['created_at', 'id'], name='assignment__created_0d0d14_idx'),
+        ),
+    ]
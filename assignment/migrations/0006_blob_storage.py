@@ -0,0 +1,42 @@
+# Generated by Django 5.2.18 on 2026-10-18 18:52
+
+import assignment.models
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('assignment', '0005_upload'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='assignment',
+            name='answer_file',
+            field=models.FileField(blank=True, max_length=255, null=True, storage=assignment.models.attachment_storage, upload_to='answers/'),
+        ),
+        migrations.AlterField(
+            model_name='assignment',
+            name='attachment',
+            field=models.FileField(blank=True, max_length=255, null=True, storage=assignment.models.attachment_storage, upload_to='assignments/'),
+        ),
+        migrations.AlterField(
+            model_name='solution',
+            name='attachment',
+            field=models.FileField(blank=True, max_length=255, null=True, storage=assignment.models.attachment_storage, upload_to='assignments/'),
+        ),
+        migrations.CreateModel(
+            name='Blob',
+            fields=[
+                ('sha256', models.CharField(max_length=64, primary_key=True, serialize=False)),
+                ('size', models.PositiveBigIntegerField()),
+                ('refcount', models.IntegerField(default=0)),
+                ('stored_at', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+            options={
+                'indexes': [models.Index(condition=models.Q(('refcount__lte', 0)), fields=['stored_at'], name='unreferenced_blob_idx')],
+            },
+        ),
+    ]
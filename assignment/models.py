@@ -1,18 +1,38 @@
+import uuid
+
+from django.core.files.storage import storages
 from django.db import models
+from django.utils import timezone
 
 from school.models import *
 from user.models import *
 
 
+def attachment_storage():
+    return storages["attachments"]
+
+
 class Assignment(models.Model):
     title = models.CharField(max_length=255, null=False)
     context = models.TextField(null=True)
     grade = models.DecimalField(max_digits=5, decimal_places=2, null=False, blank=True)
     deadline = models.DateTimeField(null=False)
     created_at = models.DateTimeField(auto_now_add=True)
-    attachment = models.FileField(upload_to="assignments/", null=True, blank=True)
+    attachment = models.FileField(
+        upload_to="assignments/",
+        storage=attachment_storage,
+        max_length=255,
+        null=True,
+        blank=True,
+    )
     answer_text = models.TextField(null=True)
-    answer_file = models.FileField(upload_to="answers/", null=True, blank=True)
+    answer_file = models.FileField(
+        upload_to="answers/",
+        storage=attachment_storage,
+        max_length=255,
+        null=True,
+        blank=True,
+    )
     last_modified = models.DateTimeField(auto_now=True)
     lesson = models.ForeignKey(
         Lesson, on_delete=models.CASCADE, related_name="assignments_lesson", null=False
@@ -21,6 +41,9 @@ class Assignment(models.Model):
         Class, on_delete=models.CASCADE, related_name="assignments_class", null=False
     )
 
+    class Meta:
+        indexes = [models.Index(fields=["created_at", "id"])]
+
     def __str__(self):
         return f"{self.title} - {self.context} - {self.grade}"
 
@@ -28,7 +51,13 @@ class Assignment(models.Model):
 class Solution(models.Model):
     context = models.TextField(null=True)
     created_at = models.DateTimeField(auto_now_add=True)
-    attachment = models.FileField(upload_to="assignments/", null=True, blank=True)
+    attachment = models.FileField(
+        upload_to="assignments/",
+        storage=attachment_storage,
+        max_length=255,
+        null=True,
+        blank=True,
+    )
     last_modified = models.DateTimeField(auto_now=True)
     grade = models.DecimalField(max_digits=5, decimal_places=2, null=False, blank=True)
     student = models.ForeignKey(
@@ -40,3 +69,57 @@ class Solution(models.Model):
         null=False,
         on_delete=models.CASCADE,
     )
+
+    class Meta:
+        indexes = [models.Index(fields=["created_at", "id"])]
+
+
+class Upload(models.Model):
+    """
+    Resumable chunked upload of an assignment or solution attachment. Chunks
+    are written to a partial file (see assignment/uploads.py) that becomes
+    the attachment once the upload is completed.
+    """
+
+    TARGETS = (
+        ("assignment", "Assignment"),
+        ("solution", "Solution"),
+    )
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name="uploads")
+    target = models.CharField(max_length=10, choices=TARGETS)
+    object_id = models.PositiveBigIntegerField()
+    filename = models.CharField(max_length=255)
+    size = models.PositiveBigIntegerField()
+    offset = models.PositiveBigIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [models.Index(fields=["created_at"])]
+
+    def __str__(self):
+        return f"{self.filename} - {self.offset}/{self.size}"
+
+
+class Blob(models.Model):
+    """
+    A file stored once by `ContentAddressedStorage` (assignment/storage.py)
+    however many attachments name it. `refcount` counts those names.
+    """
+
+    sha256 = models.CharField(max_length=64, primary_key=True)
+    size = models.PositiveBigIntegerField()
+    refcount = models.IntegerField(default=0)
+    stored_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=["stored_at"],
+                condition=models.Q(refcount__lte=0),
+                name="unreferenced_blob_idx",
+            )
+        ]
+
+    def __str__(self):
+        return f"{self.sha256} - {self.refcount}"
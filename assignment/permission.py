@@ -1,7 +1,8 @@
-from datetime import timezone
-
+from django.utils import timezone
 from rest_framework.permissions import BasePermission
 
+from school.principal import get_principal
+
 from .models import *
 
 
@@ -39,17 +40,15 @@ class IsTeacherOfLesson(BasePermission):
         lesson_id = request.data.get("lesson_id")
         if not lesson_id:
             return False
-
         try:
-            lesson = Lesson.objects.get(id=lesson_id)
-            return request.user == lesson.class_lessons.first().teacher
-        except Lesson.DoesNotExist:
+            return int(lesson_id) in get_principal(request).taught_lesson_ids
+        except (TypeError, ValueError):
             return False
 
 
 class CanUpdateAssignment(BasePermission):
     def has_object_permission(self, request, view, obj):
-        if obj.lesson.class_lessons.first().teacher != request.user:
+        if not get_principal(request).teaches(obj.class_obj_id):
             return False
 
         return obj.deadline > timezone.now()
@@ -57,7 +56,7 @@ class CanUpdateAssignment(BasePermission):
 
 class CanAddAnswer(BasePermission):
     def has_object_permission(self, request, view, obj):
-        if obj.class_obj.teacher != request.user:
+        if not get_principal(request).teaches(obj.class_obj_id):
             return False
 
         return obj.deadline < timezone.now()
@@ -65,7 +64,7 @@ class CanAddAnswer(BasePermission):
 
 class CanSubmitOrUpdateSolution(BasePermission):
     def has_object_permission(self, request, view, obj):
-        if obj.student != request.user:
+        if obj.student_id != request.user.id:
             return False
         return obj.assignment.deadline > timezone.now()
 
@@ -74,16 +73,17 @@ class IsTeacherOfAssignment(BasePermission):
 
     def has_permission(self, request, view):
         assignment_id = view.kwargs.get("pk")
-        try:
-            assignment = Assignment.objects.get(id=assignment_id)
-            return assignment.class_obj.teacher == request.user
-        except Assignment.DoesNotExist:
-            return False
+        class_id = (
+            Assignment.objects.filter(id=assignment_id)
+            .values_list("class_obj_id", flat=True)
+            .first()
+        )
+        return get_principal(request).teaches(class_id)
 
 
 class CanGradeSolution(BasePermission):
     def has_object_permission(self, request, view, obj):
-        if obj.assignment.class_obj.teacher != request.user:
+        if not get_principal(request).teaches(obj.assignment.class_obj_id):
             return False
 
         return obj.assignment.deadline < timezone.now()
@@ -91,8 +91,10 @@ class CanGradeSolution(BasePermission):
 
 class CanViewSolution(BasePermission):
     def has_object_permission(self, request, view, obj):
+        if getattr(view, "access_filtered", False):
+            return True
         if request.user.user_type == "teacher":
-            return obj.assignment.class_obj.teacher == request.user
+            return get_principal(request).teaches(obj.assignment.class_obj_id)
         elif request.user.user_type == "student":
-            return obj.student == request.user
+            return obj.student_id == request.user.id
         return False
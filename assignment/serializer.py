@@ -1,13 +1,16 @@
 import os
 
 from django.core.exceptions import *
+from django.core.files import File
 from django.utils import timezone
 from rest_framework import serializers
 
 from school.models import *
 from school.serializer import *
+from schoolManagement.fieldsets import SparseFieldsMixin
 
 from .models import *
+from .uploads import get_option
 
 
 def validate_attachment(value):
@@ -24,7 +27,7 @@ def validate_answer_file(value):
     return value
 
 
-class AssignmentSerializer(serializers.ModelSerializer):
+class AssignmentSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     class_obj = ClassSerializer(read_only=True)
     lesson = LessonSerializer(read_only=True)
     attachment = serializers.FileField(
@@ -135,7 +138,7 @@ class TeacherSolutionsSerializer(serializers.ModelSerializer):
 """
 
 
-class SolutionSerializer(serializers.ModelSerializer):
+class SolutionSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     class Meta:
         model = Solution
         fields = "__all__"
@@ -199,3 +202,79 @@ class StudentCreateSolutionSerializer(serializers.ModelSerializer):
             raise ValidationError("The deadline was arrived.")
         return data
 """
+
+
+class BulkGradeSerializer(serializers.Serializer):
+    grades = serializers.DictField(
+        child=serializers.DecimalField(max_digits=5, decimal_places=2),
+        required=False,
+    )
+    file = serializers.FileField(required=False)
+
+    def validate_grades(self, value):
+        try:
+            return {int(solution_id): grade for solution_id, grade in value.items()}
+        except ValueError:
+            raise serializers.ValidationError("Keys must be solution ids.")
+
+    def validate(self, data):
+        if ("grades" in data) == ("file" in data):
+            raise serializers.ValidationError(
+                "Send either a grades map or a CSV file."
+            )
+        if len(data.get("grades", ())) > 10000:
+            raise serializers.ValidationError("At most 10000 grades are accepted.")
+        return data
+
+
+class CurveSerializer(serializers.Serializer):
+    method = serializers.ChoiceField(choices=["linear", "clamp", "percentile"])
+    scale = serializers.FloatField(required=False, min_value=0)
+    offset = serializers.FloatField(required=False)
+    low = serializers.FloatField(required=False, min_value=0)
+    high = serializers.FloatField(required=False, min_value=0)
+    percentiles = serializers.ListField(
+        child=serializers.FloatField(min_value=0, max_value=100), required=False
+    )
+    grades = serializers.ListField(
+        child=serializers.FloatField(min_value=0), required=False
+    )
+    dry_run = serializers.BooleanField(default=False)
+
+    def validate(self, data):
+        if data["method"] == "percentile":
+            percentiles = data.get("percentiles", [])
+            grades = data.get("grades", [])
+            if len(percentiles) < 2 or len(percentiles) != len(grades):
+                raise serializers.ValidationError(
+                    "Give at least two percentiles and as many grades."
+                )
+            if percentiles != sorted(percentiles):
+                raise serializers.ValidationError("Percentiles must be increasing.")
+        return data
+
+
+class UploadSerializer(serializers.ModelSerializer):
+    size = serializers.IntegerField(min_value=1)
+
+    class Meta:
+        model = Upload
+        fields = ["id", "target", "object_id", "filename", "size", "offset"]
+        read_only_fields = ["id", "offset"]
+
+    def validate_filename(self, value):
+        validate_attachment(File(None, name=value))
+        return os.path.basename(value)
+
+    def validate_size(self, value):
+        max_size = get_option("MAX_SIZE")
+        if value > max_size:
+            raise ValidationError(f"Uploads are limited to {max_size} bytes.")
+        return value
+
+
+class CompleteUploadSerializer(serializers.Serializer):
+    sha256 = serializers.RegexField(
+        r"^[0-9a-fA-F]{64}$",
+        error_messages={"invalid": "Expected a hex SHA-256 digest."},
+    )
@@ -0,0 +1,88 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from school.counters import adjust
+from school.dashboard import bump_activity
+from school.models import Class
+
+from .analytics import bump_grades
+from .blobs import FILE_FIELDS, count_references, file_names, stored_names
+from .models import *
+
+
+@receiver(post_save, sender=Assignment)
+@receiver(post_delete, sender=Assignment)
+def bump_assignment_school(sender, instance, **kwargs):
+    # Resolved now: a cascade may have deleted the class by commit time.
+    school_ids = list(
+        Class.objects.filter(pk=instance.class_obj_id).values_list(
+            "school_id", flat=True
+        )
+    )
+    transaction.on_commit(lambda: bump_activity(school_ids))
+
+
+@receiver(post_save, sender=Solution)
+@receiver(post_delete, sender=Solution)
+def bump_solution_school(sender, instance, **kwargs):
+    classes = Class.objects.filter(assignments_class=instance.assignment_id)
+    school_ids, class_ids = [], []
+    for class_id, school_id in classes.values_list("id", "school_id"):
+        class_ids.append(class_id)
+        school_ids.append(school_id)
+    transaction.on_commit(lambda: bump_activity(school_ids))
+    transaction.on_commit(lambda: bump_grades(class_ids))
+
+
+@receiver(pre_save, sender=Assignment)
+def remember_assignment_class(sender, instance, **kwargs):
+    instance._counted_class = None
+    if instance.pk:
+        instance._counted_class = (
+            Assignment.objects.filter(pk=instance.pk)
+            .values_list("class_obj_id", flat=True)
+            .first()
+        )
+
+
+@receiver(post_save, sender=Assignment)
+def count_saved_assignment(sender, instance, **kwargs):
+    total = {instance.class_obj_id: 1}
+    previous = getattr(instance, "_counted_class", None)
+    if previous is not None:
+        total[previous] = total.get(previous, 0) - 1
+    adjust("assignment_count", total)
+    transaction.on_commit(lambda: bump_grades(list(total)))
+
+
+@receiver(post_delete, sender=Assignment)
+def count_deleted_assignment(sender, instance, **kwargs):
+    adjust("assignment_count", {instance.class_obj_id: -1})
+    class_id = instance.class_obj_id
+    transaction.on_commit(lambda: bump_grades([class_id]))
+
+
+@receiver(pre_save, sender=Assignment)
+@receiver(pre_save, sender=Solution)
+def remember_files(sender, instance, update_fields=None, **kwargs):
+    if update_fields is not None and not set(update_fields) & set(
+        FILE_FIELDS[sender]
+    ):
+        instance._stored_files = None
+    else:
+        instance._stored_files = stored_names(sender, instance.pk)
+
+
+@receiver(post_save, sender=Assignment)
+@receiver(post_save, sender=Solution)
+def count_saved_files(sender, instance, **kwargs):
+    stored = getattr(instance, "_stored_files", None)
+    if stored is not None:
+        count_references(file_names(instance), stored)
+
+
+@receiver(post_delete, sender=Assignment)
+@receiver(post_delete, sender=Solution)
+def count_deleted_files(sender, instance, **kwargs):
+    count_references([], file_names(instance))
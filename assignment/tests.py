@@ -1,3 +1,534 @@
-from django.test import TestCase
+import hashlib
+import os
+import shutil
+import tempfile
+from datetime import timedelta
+from io import StringIO
 
-# Create your tests here.
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from school.membership import enrollment_index
+from school.models import *
+from user.models import User
+
+from .analytics import class_stats
+from .blobs import collect_garbage, recount
+from .models import *
+from .storage import blob_path
+
+
+class BulkGradingTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        enrollment_index.clear()
+        self.client = APIClient()
+        self.teacher_user = User.objects.create_user(
+            username="teacher",
+            email="teacher@example.com",
+            password="teacherpassword123",
+            user_type="teacher",
+            national_id="0000000004",
+        )
+        self.other_teacher = User.objects.create_user(
+            username="other",
+            email="other@example.com",
+            password="teacherpassword123",
+            user_type="teacher",
+            national_id="0000000005",
+        )
+        self.students = User.objects.bulk_create(
+            User(
+                username=f"student{i}",
+                email=f"student{i}@example.com",
+                national_id=f"100000000{i}",
+                user_type="student",
+            )
+            for i in range(4)
+        )
+        school = School.objects.create(name="Test School")
+        self.class_obj = Class.objects.create(
+            name="Class A", school=school, teacher=self.teacher_user
+        )
+        lesson = Lesson.objects.create(name="Math")
+        self.assignment = Assignment.objects.create(
+            title="Homework",
+            grade=20,
+            deadline=timezone.now() - timedelta(days=1),
+            lesson=lesson,
+            class_obj=self.class_obj,
+        )
+        self.open_assignment = Assignment.objects.create(
+            title="Project",
+            grade=20,
+            deadline=timezone.now() + timedelta(days=1),
+            lesson=lesson,
+            class_obj=self.class_obj,
+        )
+        self.solutions = [
+            Solution.objects.create(
+                student=student, assignment=self.assignment, grade=grade
+            )
+            for student, grade in zip(self.students, [8, 10, 12, 16])
+        ]
+        self.client.force_authenticate(user=self.teacher_user)
+
+    def grades(self):
+        return [
+            float(grade)
+            for grade in Solution.objects.filter(assignment=self.assignment)
+            .order_by("id")
+            .values_list("grade", flat=True)
+        ]
+
+    def test_bulk_grade_map(self):
+        class_stats(self.class_obj.pk)
+        response = self.client.post(
+            reverse("solution-bulk-grade"),
+            {"grades": {self.solutions[0].pk: 9.5, self.solutions[3].pk: 17}},
+            format="json",
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data["updated"], 2)
+        self.assertEqual(self.grades(), [9.5, 10, 12, 17])
+        # cached statistics were invalidated
+        self.assertEqual(class_stats(self.class_obj.pk)["assignments"]["max"], [85.0])
+
+    def test_bulk_grade_csv(self):
+        rows = "solution,grade\n" + "".join(
+            f"{solution.pk},{grade}\n"
+            for solution, grade in zip(self.solutions, [1, 2, 3, 4])
+        )
+        response = self.client.post(
+            reverse("solution-bulk-grade"),
+            {"file": SimpleUploadedFile("grades.csv", rows.encode())},
+            format="multipart",
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(self.grades(), [1, 2, 3, 4])
+
+    def test_bulk_grade_is_all_or_nothing(self):
+        open_solution = Solution.objects.create(
+            student=self.students[0], assignment=self.open_assignment, grade=0
+        )
+        response = self.client.post(
+            reverse("solution-bulk-grade"),
+            {
+                "grades": {
+                    self.solutions[0].pk: 11,
+                    self.solutions[1].pk: 25,
+                    open_solution.pk: 5,
+                    999999: 5,
+                }
+            },
+            format="json",
+        )
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(
+            set(response.data["detail"]),
+            {self.solutions[1].pk, open_solution.pk, 999999},
+        )
+        self.assertEqual(self.grades(), [8, 10, 12, 16])
+
+        self.client.force_authenticate(user=self.other_teacher)
+        response = self.client.post(
+            reverse("solution-bulk-grade"),
+            {"grades": {self.solutions[0].pk: 11}},
+            format="json",
+        )
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(self.grades(), [8, 10, 12, 16])
+
+    def curve(self, data, assignment=None):
+        assignment = assignment or self.assignment
+        return self.client.post(
+            reverse("assignment-curve", kwargs={"pk": assignment.pk}),
+            data,
+            format="json",
+        )
+
+    def test_curves(self):
+        response = self.curve({"method": "linear", "dry_run": True})
+        self.assertEqual(response.data["updated"], 0)
+        self.assertEqual(
+            sorted(map(float, response.data["grades"].values())), [10, 12.5, 15, 20]
+        )
+        self.assertEqual(self.grades(), [8, 10, 12, 16])
+
+        self.curve({"method": "linear", "scale": 1, "offset": 6})
+        self.assertEqual(self.grades(), [14, 16, 18, 20])
+        self.curve({"method": "clamp", "low": 15, "high": 19})
+        self.assertEqual(self.grades(), [15, 16, 18, 19])
+        self.curve(
+            {"method": "percentile", "percentiles": [0, 100], "grades": [0, 20]}
+        )
+        self.assertEqual(self.grades(), [2.5, 7.5, 12.5, 17.5])
+
+    def test_curve_rules(self):
+        response = self.curve({"method": "linear"}, self.open_assignment)
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+        response = self.curve({"method": "percentile", "percentiles": [0]})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.client.force_authenticate(user=self.other_teacher)
+        response = self.curve({"method": "linear"})
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+        self.assertEqual(self.grades(), [8, 10, 12, 16])
+
+
+class ChunkedUploadTest(TestCase):
+    def setUp(self):
+        enrollment_index.clear()
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root)
+        settings = override_settings(
+            MEDIA_ROOT=self.media_root,
+            UPLOAD_SESSIONS={
+                "DIR": os.path.join(self.media_root, "partial"),
+                "MAX_CHUNK_SIZE": 8,
+                "MAX_SIZE": 64,
+            },
+        )
+        settings.enable()
+        self.addCleanup(settings.disable)
+
+        self.client = APIClient()
+        self.student = User.objects.create_user(
+            username="student",
+            email="student@example.com",
+            password="studentpassword123",
+            user_type="student",
+            national_id="1000000000",
+        )
+        self.other_student = User.objects.create_user(
+            username="other",
+            email="other@example.com",
+            password="studentpassword123",
+            user_type="student",
+            national_id="1000000001",
+        )
+        school = School.objects.create(name="Test School")
+        class_obj = Class.objects.create(name="Class A", school=school)
+        self.assignment = Assignment.objects.create(
+            title="Homework",
+            grade=20,
+            deadline=timezone.now() + timedelta(days=1),
+            lesson=Lesson.objects.create(name="Math"),
+            class_obj=class_obj,
+        )
+        self.solution = Solution.objects.create(
+            student=self.student, assignment=self.assignment, grade=0
+        )
+        self.content = b"%PDF-1.4 twenty bytes"
+        self.client.force_authenticate(user=self.student)
+
+    def start(self, **data):
+        data = {
+            "target": "solution",
+            "object_id": self.solution.pk,
+            "filename": "answer.pdf",
+            "size": len(self.content),
+            **data,
+        }
+        return self.client.post(reverse("upload-list"), data, format="json")
+
+    def put(self, upload_id, start, end):
+        return self.client.put(
+            reverse("upload-chunk", kwargs={"pk": upload_id}),
+            self.content[start:end],
+            content_type="application/octet-stream",
+            HTTP_CONTENT_RANGE=f"bytes {start}-{end - 1}/{len(self.content)}",
+        )
+
+    def complete(self, upload_id, content=None):
+        digest = hashlib.sha256(content or self.content).hexdigest()
+        return self.client.post(
+            reverse("upload-complete", kwargs={"pk": upload_id}),
+            {"sha256": digest},
+            format="json",
+        )
+
+    def test_resumable_upload(self):
+        response = self.start()
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        upload_id = response.data["id"]
+        self.assertEqual(response.data["chunk_size"], 8)
+
+        self.assertEqual(self.put(upload_id, 0, 8).data["offset"], 8)
+        # a chunk past the offset is refused with the offset to resume from
+        response = self.put(upload_id, 16, 21)
+        self.assertEqual(response.status_code, status.HTTP_409_CONFLICT)
+        self.assertEqual(response.data["offset"], 8)
+        # a resent chunk overlapping received bytes is accepted
+        self.assertEqual(self.put(upload_id, 4, 12).data["offset"], 12)
+        response = self.client.get(reverse("upload-detail", kwargs={"pk": upload_id}))
+        self.assertEqual(response.data["offset"], 12)
+        self.assertEqual(self.complete(upload_id).status_code, status.HTTP_409_CONFLICT)
+        self.assertEqual(self.put(upload_id, 12, 20).data["offset"], 20)
+        self.assertEqual(self.put(upload_id, 20, 21).data["offset"], 21)
+
+        response = self.complete(upload_id, b"something else")
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        response = self.complete(upload_id)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.solution.refresh_from_db()
+        with self.solution.attachment.open("rb") as attachment:
+            self.assertEqual(attachment.read(), self.content)
+        self.assertFalse(Upload.objects.exists())
+        self.assertEqual(os.listdir(os.path.join(self.media_root, "partial")), [])
+
+    def test_upload_rules(self):
+        self.assertEqual(
+            self.start(filename="answer.exe").status_code,
+            status.HTTP_400_BAD_REQUEST,
+        )
+        self.assertEqual(self.start(size=65).status_code, status.HTTP_400_BAD_REQUEST)
+        upload_id = self.start().data["id"]
+        response = self.put(upload_id, 0, 9)
+        self.assertEqual(
+            response.status_code, status.HTTP_413_REQUEST_ENTITY_TOO_LARGE
+        )
+
+        self.client.force_authenticate(user=self.other_student)
+        self.assertEqual(self.start().status_code, status.HTTP_403_FORBIDDEN)
+        response = self.put(upload_id, 0, 8)
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_purge_expired_uploads(self):
+        upload_id = self.start().data["id"]
+        Upload.objects.update(created_at=timezone.now() - timedelta(days=2))
+        call_command("purge_uploads", stdout=StringIO())
+        self.assertFalse(Upload.objects.filter(pk=upload_id).exists())
+        self.assertEqual(os.listdir(os.path.join(self.media_root, "partial")), [])
+
+
+class AttachmentDownloadTest(TestCase):
+    def setUp(self):
+        enrollment_index.clear()
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root)
+        settings = override_settings(MEDIA_ROOT=self.media_root)
+        settings.enable()
+        self.addCleanup(settings.disable)
+
+        self.client = APIClient()
+        self.teacher = User.objects.create_user(
+            username="teacher",
+            email="teacher@example.com",
+            password="teacherpassword123",
+            user_type="teacher",
+            national_id="2000000000",
+        )
+        self.student = User.objects.create_user(
+            username="student",
+            email="student@example.com",
+            password="studentpassword123",
+            user_type="student",
+            national_id="2000000001",
+        )
+        self.outsider = User.objects.create_user(
+            username="outsider",
+            email="outsider@example.com",
+            password="studentpassword123",
+            user_type="student",
+            national_id="2000000002",
+        )
+        school = School.objects.create(name="Test School")
+        class_obj = Class.objects.create(
+            name="Class A", school=school, teacher=self.teacher
+        )
+        class_obj.students.add(self.student)
+        self.content = b"0123456789" * 10
+        self.assignment = Assignment.objects.create(
+            title="Homework",
+            grade=20,
+            deadline=timezone.now() + timedelta(days=1),
+            lesson=Lesson.objects.create(name="Math"),
+            class_obj=class_obj,
+            attachment=SimpleUploadedFile("task.pdf", self.content),
+            answer_file=SimpleUploadedFile("answer.pdf", b"answer"),
+        )
+        self.url = reverse(
+            "assignment-download",
+            kwargs={"pk": self.assignment.pk, "field": "attachment"},
+        )
+
+    def body(self, response):
+        return b"".join(response.streaming_content)
+
+    def test_download_with_ranges(self):
+        self.client.force_authenticate(user=self.student)
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(self.body(response), self.content)
+        self.assertEqual(response["Accept-Ranges"], "bytes")
+        self.assertIn("attachment", response["Content-Disposition"])
+        etag = response["ETag"]
+
+        response = self.client.get(self.url, HTTP_RANGE="bytes=10-19")
+        self.assertEqual(response.status_code, status.HTTP_206_PARTIAL_CONTENT)
+        self.assertEqual(response["Content-Range"], "bytes 10-19/100")
+        self.assertEqual(self.body(response), self.content[10:20])
+        response = self.client.get(self.url, HTTP_RANGE="bytes=-5")
+        self.assertEqual(self.body(response), self.content[-5:])
+        response = self.client.get(self.url, HTTP_RANGE="bytes=100-")
+        self.assertEqual(
+            response.status_code, status.HTTP_416_REQUESTED_RANGE_NOT_SATISFIABLE
+        )
+        self.assertEqual(response["Content-Range"], "bytes */100")
+        # a stale If-Range sends the whole file
+        response = self.client.get(
+            self.url, HTTP_RANGE="bytes=10-19", HTTP_IF_RANGE='"stale"'
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+    def test_download_permissions(self):
+        answer_url = reverse(
+            "assignment-download",
+            kwargs={"pk": self.assignment.pk, "field": "answer_file"},
+        )
+        self.client.force_authenticate(user=self.outsider)
+        self.assertEqual(
+            self.client.get(self.url).status_code, status.HTTP_403_FORBIDDEN
+        )
+        # students get the answer once the deadline has passed
+        self.client.force_authenticate(user=self.student)
+        self.assertEqual(
+            self.client.get(answer_url).status_code, status.HTTP_403_FORBIDDEN
+        )
+        self.client.force_authenticate(user=self.teacher)
+        self.assertEqual(self.client.get(answer_url).status_code, status.HTTP_200_OK)
+        response = self.client.get(
+            reverse(
+                "assignment-download",
+                kwargs={"pk": self.assignment.pk, "field": "title"},
+            )
+        )
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+        solution = Solution.objects.create(
+            student=self.student,
+            assignment=self.assignment,
+            grade=0,
+            attachment=SimpleUploadedFile("mine.pdf", b"solution"),
+        )
+        solution_url = reverse(
+            "solution-download", kwargs={"pk": solution.pk, "field": "attachment"}
+        )
+        self.assertEqual(self.client.get(solution_url).status_code, status.HTTP_200_OK)
+        self.client.force_authenticate(user=self.outsider)
+        self.assertEqual(
+            self.client.get(solution_url).status_code, status.HTTP_403_FORBIDDEN
+        )
+
+    @override_settings(DOWNLOADS={"BACKEND": "x-accel-redirect"})
+    def test_proxy_offload(self):
+        self.client.force_authenticate(user=self.student)
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        digest = hashlib.sha256(self.content).hexdigest()
+        self.assertEqual(
+            response["X-Accel-Redirect"], "/protected/" + blob_path(digest)
+        )
+        self.assertEqual(response.content, b"")
+
+    def test_signed_link(self):
+        self.client.force_authenticate(user=self.student)
+        response = self.client.get(
+            reverse(
+                "assignment-download-link",
+                kwargs={"pk": self.assignment.pk, "field": "attachment"},
+            )
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        url = response.data["url"]
+
+        self.client.force_authenticate(user=None)
+        response = self.client.get(url, HTTP_RANGE="bytes=0-9")
+        self.assertEqual(response.status_code, status.HTTP_206_PARTIAL_CONTENT)
+        self.assertEqual(self.body(response), self.content[:10])
+        self.assertIn("private", response["Cache-Control"])
+        response = self.client.get(url.replace("signature=", "signature=0"))
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+
+class BlobStorageTest(TestCase):
+    def setUp(self):
+        enrollment_index.clear()
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root)
+        settings = override_settings(MEDIA_ROOT=self.media_root)
+        settings.enable()
+        self.addCleanup(settings.disable)
+
+        self.student = User.objects.create_user(
+            username="student",
+            email="student@example.com",
+            password="studentpassword123",
+            user_type="student",
+            national_id="3000000000",
+        )
+        school = School.objects.create(name="Test School")
+        self.assignment = Assignment.objects.create(
+            title="Homework",
+            grade=20,
+            deadline=timezone.now() + timedelta(days=1),
+            lesson=Lesson.objects.create(name="Math"),
+            class_obj=Class.objects.create(name="Class A", school=school),
+            attachment=SimpleUploadedFile("template.pdf", b"template"),
+        )
+        self.digest = hashlib.sha256(b"template").hexdigest()
+
+    def submit(self, filename, content):
+        return Solution.objects.create(
+            student=self.student,
+            assignment=self.assignment,
+            grade=0,
+            attachment=SimpleUploadedFile(filename, content),
+        )
+
+    def blob_file(self, digest):
+        return os.path.join(self.media_root, blob_path(digest))
+
+    def test_identical_files_share_a_blob(self):
+        first = self.submit("mine.pdf", b"template")
+        second = self.submit("copy.pdf", b"template")
+        self.assertEqual(first.attachment.name, f"blobs/{self.digest}/mine.pdf")
+        self.assertEqual(second.attachment.name, f"blobs/{self.digest}/copy.pdf")
+        self.assertEqual(Blob.objects.get().refcount, 3)
+        shard = os.path.dirname(self.blob_file(self.digest))
+        self.assertEqual(os.listdir(shard), [self.digest])
+        with second.attachment.open("rb") as attachment:
+            self.assertEqual(attachment.read(), b"template")
+
+    def test_references_are_counted_and_collected(self):
+        solution = self.submit("mine.pdf", b"mine")
+        mine = hashlib.sha256(b"mine").hexdigest()
+        solution.attachment = SimpleUploadedFile("mine.pdf", b"fixed")
+        solution.save()
+        self.assertEqual(Blob.objects.get(pk=mine).refcount, 0)
+        self.assertEqual(collect_garbage(), 0)  # within the grace period
+        self.assertEqual(collect_garbage(grace=0), 1)
+        self.assertFalse(os.path.exists(self.blob_file(mine)))
+
+        self.assignment.delete()
+        self.assertEqual(
+            dict(Blob.objects.values_list("sha256", "refcount")),
+            {self.digest: 0, hashlib.sha256(b"fixed").hexdigest(): 0},
+        )
+        call_command("collect_blobs", "--grace=0", stdout=StringIO())
+        self.assertFalse(Blob.objects.exists())
+        self.assertFalse(os.path.exists(self.blob_file(self.digest)))
+
+    def test_recount(self):
+        self.submit("mine.pdf", b"template")
+        Blob.objects.update(refcount=7)
+        self.assertEqual(recount(), 1)
+        self.assertEqual(Blob.objects.get().refcount, 2)
@@ -0,0 +1,185 @@
+import hashlib
+import hmac
+import os
+import re
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.core.files import File
+from django.db import transaction
+from django.utils import timezone
+
+from school.principal import Principal
+
+from .models import *
+
+READ_SIZE = 64 * 1024
+CONTENT_RANGE = re.compile(r"^bytes (\d+)-(\d+)/(\d+)$")
+DEFAULTS = {
+    "DIR": os.path.join(settings.BASE_DIR, "uploads", "partial"),
+    "MAX_CHUNK_SIZE": 8 * 1024 * 1024,
+    "MAX_SIZE": 200 * 1024 * 1024,
+    "EXPIRE_AFTER": 24 * 60 * 60,
+}
+
+
+class UploadError(Exception):
+    def __init__(self, detail, status, **extra):
+        super().__init__(detail)
+        self.detail = detail
+        self.status = status
+        self.extra = extra
+
+
+class PartialFile(File):
+    """
+    A finished partial file. Storages that can move temporary files
+    (`FileSystemStorage`) move it into place instead of copying it.
+    """
+
+    def temporary_file_path(self):
+        return self.file.name
+
+
+def get_option(name):
+    return getattr(settings, "UPLOAD_SESSIONS", {}).get(name, DEFAULTS[name])
+
+
+def partial_path(upload):
+    return os.path.join(get_option("DIR"), f"{upload.pk.hex}.part")
+
+
+def get_target(user, target, object_id, started_at=None):
+    """
+    The assignment or solution an upload attaches to, if `user` may change
+    its attachment: the teacher of an open assignment's class, or the
+    student of a solution to an open assignment. An upload started before
+    the deadline may still be completed after it.
+    """
+    started_at = started_at or timezone.now()
+    if target == "assignment":
+        instance = Assignment.objects.filter(pk=object_id).first()
+        if instance is None:
+            raise UploadError("The assignment was not found.", 404)
+        allowed = Principal(user).teaches(instance.class_obj_id)
+        deadline = instance.deadline
+    else:
+        instance = (
+            Solution.objects.select_related("assignment").filter(pk=object_id).first()
+        )
+        if instance is None:
+            raise UploadError("The solution was not found.", 404)
+        allowed = instance.student_id == user.id
+        deadline = instance.assignment.deadline
+    if not allowed:
+        raise UploadError("You can not change this attachment.", 403)
+    if deadline <= started_at:
+        raise UploadError("The deadline has passed.", 403)
+    return instance
+
+
+def start_upload(user, target, object_id, filename, size):
+    get_target(user, target, object_id)
+    upload = Upload.objects.create(
+        user=user, target=target, object_id=object_id, filename=filename, size=size
+    )
+    os.makedirs(get_option("DIR"), exist_ok=True)
+    open(partial_path(upload), "wb").close()
+    return upload
+
+
+def parse_content_range(header):
+    """`(start, length)` of a `Content-Range: bytes start-end/total` header."""
+    match = CONTENT_RANGE.match(header or "")
+    if match is None:
+        return None
+    start, end, _ = map(int, match.groups())
+    if end < start:
+        return None
+    return start, end - start + 1
+
+
+def write_chunk(upload_id, stream, start, length):
+    """
+    Write `length` bytes read from `stream` at byte `start` of the partial
+    file, `READ_SIZE` bytes at a time. Chunks must continue the upload;
+    bytes already received (a chunk resent after a lost response) are
+    skipped. The session row is locked meanwhile, so chunks of one upload
+    are written one at a time. Returns the new offset.
+    """
+    with transaction.atomic():
+        upload = Upload.objects.select_for_update().get(pk=upload_id)
+        if start > upload.offset:
+            raise UploadError(
+                "The chunk does not continue the upload.", 409, offset=upload.offset
+            )
+        if start + length > upload.size:
+            raise UploadError("The chunk goes past the upload size.", 400)
+        skip = min(upload.offset - start, length)
+        received = 0
+        with open(partial_path(upload), "r+b") as partial:
+            partial.seek(upload.offset)
+            while received < length:
+                data = stream.read(min(READ_SIZE, length - received))
+                if not data:
+                    break
+                received += len(data)
+                if skip:
+                    data, skip = data[skip:], max(skip - len(data), 0)
+                partial.write(data)
+        if received < length:
+            raise UploadError("The chunk ended early.", 400, offset=upload.offset)
+        upload.offset = max(upload.offset, start + length)
+        upload.save(update_fields=["offset"])
+    return upload.offset
+
+
+def file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as partial:
+        for block in iter(lambda: partial.read(READ_SIZE), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def complete_upload(upload, sha256, validate):
+    """
+    Check that every byte arrived and matches `sha256`, run `validate` on
+    the file, and store it as the target's attachment. The session and its
+    partial file are removed afterwards.
+    """
+    if upload.offset != upload.size:
+        raise UploadError("The upload is incomplete.", 409, offset=upload.offset)
+    path = partial_path(upload)
+    if not hmac.compare_digest(file_sha256(path), sha256.lower()):
+        raise UploadError("The checksum does not match.", 400)
+    instance = get_target(
+        upload.user, upload.target, upload.object_id, upload.created_at
+    )
+    with open(path, "rb") as partial:
+        content = PartialFile(partial, name=upload.filename)
+        try:
+            validate(content)
+        except ValidationError as e:
+            raise UploadError(" ".join(e.messages), 400)
+        instance.attachment.save(upload.filename, content, save=True)
+    discard_upload(upload)
+    return instance
+
+
+def discard_upload(upload):
+    try:
+        os.remove(partial_path(upload))
+    except FileNotFoundError:
+        pass
+    upload.delete()
+
+
+def purge_uploads():
+    """Remove sessions, and their partial files, older than `EXPIRE_AFTER`."""
+    cutoff = timezone.now() - timedelta(seconds=get_option("EXPIRE_AFTER"))
+    expired = list(Upload.objects.filter(created_at__lt=cutoff))
+    for upload in expired:
+        discard_upload(upload)
+    return len(expired)
@@ -6,7 +6,9 @@ from .views import *
 router = DefaultRouter()
 router.register("assignments", AssignmentViewSet)
 router.register("solutions", SolutionViewSet)
+router.register("uploads", UploadViewSet)
 
 urlpatterns = [
     path("", include(router.urls)),
+    path("files/<path:name>", signed_download, name="signed-download"),
 ]
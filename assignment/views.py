@@ -1,54 +1,198 @@
+import time
+
+from django.http import JsonResponse
+from django.views.decorators.http import require_safe
+from django_filters.rest_framework import DjangoFilterBackend
 from drf_yasg.utils import swagger_auto_schema
-from rest_framework import status, viewsets
+from rest_framework import mixins, status, viewsets
 from rest_framework.decorators import *
 from rest_framework.permissions import *
 from rest_framework.response import Response
 from rest_framework.views import *
 
 from school.models import *
+from school.principal import get_principal, to_id
+from schoolManagement.queryplan import QueryPlanMixin
 from user.models import *
 
+from .analytics import assignment_stats
+from .downloads import (
+    DownloadError,
+    check_signature,
+    get_attachment,
+    serve_file,
+    signed_url,
+)
+from .filters import *
+from .grading import GradingError, curve_assignment, grade_solutions, read_grades_csv
 from .models import *
 from .permission import *
 from .serializer import *
+from .uploads import (
+    UploadError,
+    complete_upload,
+    discard_upload,
+    get_option,
+    parse_content_range,
+    start_upload,
+    write_chunk,
+)
+
+
+class AttachmentDownloadMixin:
+    """
+    Actions downloading the files of the viewset's model. Permissions are
+    checked once per request; the transfer itself is left to
+    assignment/downloads.py, which may hand it to the front proxy.
+    """
+
+    def download_error(self, e):
+        return Response({"detail": e.detail}, status=e.status)
+
+    @swagger_auto_schema(operation_description="Download an attached file.")
+    @action(
+        detail=True,
+        methods=["get"],
+        url_path=r"download/(?P<field>\w+)",
+        url_name="download",
+    )
+    def download(self, request, pk=None, field=None):
+        """
+
+        URL: /assignments/{assignment_id}/download/{attachment|answer_file}/
+             /solutions/{solution_id}/download/attachment/
+        Supports Range, If-Range, If-None-Match and If-Modified-Since.
+
+        """
+        try:
+            name = get_attachment(request, self.queryset.model, to_id(pk), field)
+        except DownloadError as e:
+            return self.download_error(e)
+        return serve_file(request, name)
+
+    @swagger_auto_schema(
+        operation_description="An expiring signed link to an attached file."
+    )
+    @action(
+        detail=True,
+        methods=["get"],
+        url_path=r"download-link/(?P<field>\w+)",
+        url_name="download-link",
+    )
+    def download_link(self, request, pk=None, field=None):
+        """
+
+        URL: /assignments/{assignment_id}/download-link/{attachment|answer_file}/
+             /solutions/{solution_id}/download-link/attachment/
+        The link downloads the file without authentication until it expires.
 
+        """
+        try:
+            name = get_attachment(request, self.queryset.model, to_id(pk), field)
+        except DownloadError as e:
+            return self.download_error(e)
+        url, expires = signed_url(name)
+        return Response(
+            {"url": request.build_absolute_uri(url), "expires": expires},
+            status=status.HTTP_200_OK,
+        )
 
-class AssignmentViewSet(viewsets.ModelViewSet):
+
+class AssignmentViewSet(AttachmentDownloadMixin, QueryPlanMixin, viewsets.ModelViewSet):
     permission_classes = [IsAuthenticated]
     queryset = Assignment.objects.all().order_by("created_at")
     serializer_class = AssignmentSerializer
+    filter_backends = [DjangoFilterBackend, AssignmentAccessFilterBackend]
 
     def get_permissions(self):
         if self.action == "create":
             permission_classes = [IsTeacherOfLesson]
         elif self.action in ["update", "partial_update"]:
             permission_classes = [CanUpdateAssignment]
+        elif self.action == "curve":
+            permission_classes = [IsTeacher]
         else:
             permission_classes = [IsAuthenticated]
 
         return [permission() for permission in permission_classes]
 
-    def get_queryset(self):
-        user = self.request.user
-
-        if user.user_type == "teacher":
-            return Assignment.objects.filter(class_obj__teacher=user).order_by(
-                "created_at"
-            )
-
-        elif user.user_type == "student":
-            return Assignment.objects.filter(class_obj__students=user).order_by(
-                "created_at"
-            )
-
-        return Assignment.objects.none()
-
     def get_serializer_class(self):
         if self.action in ["update", "partial_update", "create"]:
             return CreateAssignmentSerializer
         else:
             return super().get_serializer_class()
 
+    @swagger_auto_schema(
+        operation_description="Grade statistics and z-scores of an assignment."
+    )
+    @action(detail=True, methods=["get"])
+    def stats(self, request, pk=None):
+        """
+
+        URL: /assignments/{assignment_id}/stats/
+        Scores are percentages of the assignment grade.
+
+        """
+        assignment_id = to_id(pk)
+        class_id = (
+            Assignment.objects.filter(pk=assignment_id)
+            .values_list("class_obj_id", flat=True)
+            .first()
+        )
+        if class_id is None:
+            return Response(
+                {"detail": "The assignment was not found."},
+                status=status.HTTP_404_NOT_FOUND,
+            )
+        principal = get_principal(request)
+        if not (
+            request.user.is_staff
+            or principal.teaches(class_id)
+            or principal.manages_class(class_id)
+        ):
+            return Response(
+                {"detail": "You do not have permission to see these grades."},
+                status=status.HTTP_403_FORBIDDEN,
+            )
+        return Response(
+            assignment_stats(class_id, assignment_id), status=status.HTTP_200_OK
+        )
+
+    @swagger_auto_schema(
+        operation_description="Curve the grades of an assignment by teacher.",
+        request_body=CurveSerializer,
+    )
+    @action(detail=True, methods=["post"])
+    def curve(self, request, pk=None):
+        """
+
+        URL: /assignments/{assignment_id}/curve/
+        Request Body: {"method": "linear", "scale": 1.1, "offset": 0}
+                      {"method": "clamp", "low": 10, "high": 20}
+                      {"method": "percentile", "percentiles": [0, 50, 100],
+                       "grades": [8, 14, 20]}
+        Add "dry_run": true to preview the grades without saving them.
+
+        """
+        serializer = CurveSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        options = dict(serializer.validated_data)
+        method, dry_run = options.pop("method"), options.pop("dry_run")
+        try:
+            assignment = Assignment.objects.get(pk=to_id(pk))
+            grades = curve_assignment(request, assignment, method, options, dry_run)
+        except Assignment.DoesNotExist:
+            return Response(
+                {"detail": "The assignment was not found."},
+                status=status.HTTP_404_NOT_FOUND,
+            )
+        except GradingError as e:
+            return Response({"detail": e.errors}, status=status.HTTP_403_FORBIDDEN)
+        return Response(
+            {"updated": 0 if dry_run else len(grades), "grades": grades},
+            status=status.HTTP_200_OK,
+        )
+
     @swagger_auto_schema(
         operation_description="Add assignment's answer after deadline."
     )
@@ -84,29 +228,27 @@ class AssignmentViewSet(viewsets.ModelViewSet):
             )
 
 
-class SolutionViewSet(viewsets.ModelViewSet):
+class SolutionViewSet(AttachmentDownloadMixin, QueryPlanMixin, viewsets.ModelViewSet):
     permission_classes = [IsAuthenticated]
     queryset = Solution.objects.all()
     serializer_class = SolutionSerializer
+    filter_backends = [DjangoFilterBackend, SolutionAccessFilterBackend]
 
     def get_queryset(self):
-        user = self.request.user
-        if user.user_type == "teacher":
-            assignment_id = self.kwargs.get("assignment_id")
-            if assignment_id:
-                return Solution.objects.filter(
-                    assignment__id=assignment_id, assignment__class_obj__teacher=user
-                )
-            return Solution.objects.filter(assignment__class_obj__teacher=user)
-        elif user.user_type == "student":
-            return Solution.objects.filter(student=user)
-        return Solution.objects.none()
+        assignment_id = self.kwargs.get("assignment_id")
+        if assignment_id and self.request.user.user_type == "teacher":
+            return Solution.objects.filter(assignment_id=assignment_id)
+        return Solution.objects.all()
 
     def get_permissions(self):
         if self.action in ["create", "update", "partial_update"]:
             permission_classes = [CanSubmitOrUpdateSolution]
         elif self.action == "grade":
             permission_classes = [CanGradeSolution]
+        elif self.action == "bulk_grade":
+            permission_classes = [IsTeacher]
+        elif self.action in ["download", "download_link"]:
+            permission_classes = [IsAuthenticated]
         else:
             permission_classes = [CanViewSolution]
         return [permission() for permission in permission_classes]
@@ -141,6 +283,35 @@ class SolutionViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_404_NOT_FOUND,
             )
 
+    @swagger_auto_schema(
+        operation_description="Grade many solutions after deadline by teacher.",
+        request_body=BulkGradeSerializer,
+    )
+    @action(
+        detail=False,
+        methods=["post"],
+        url_path="bulk-grade",
+        url_name="bulk-grade",
+    )
+    def bulk_grade(self, request):
+        """
+
+        URL: /solutions/bulk-grade/
+        Request Body: {"grades": {solution_id: grade, ...}}
+                      or a CSV "file" with solution and grade columns
+
+        """
+        serializer = BulkGradeSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        try:
+            grades = serializer.validated_data.get("grades")
+            if grades is None:
+                grades = read_grades_csv(serializer.validated_data["file"])
+            updated = grade_solutions(request, grades)
+        except GradingError as e:
+            return Response({"detail": e.errors}, status=status.HTTP_400_BAD_REQUEST)
+        return Response({"updated": updated}, status=status.HTTP_200_OK)
+
     @swagger_auto_schema(
         operation_description="Add solution's grade after deadline by teacher."
     )
@@ -167,3 +338,129 @@ class SolutionViewSet(viewsets.ModelViewSet):
 
         except Solution.DoesNotExist:
             return Response({"detail": "The solution not found."}, status=404)
+
+
+class UploadViewSet(
+    mixins.CreateModelMixin,
+    mixins.RetrieveModelMixin,
+    mixins.DestroyModelMixin,
+    viewsets.GenericViewSet,
+):
+    """
+    Resumable chunked uploads of assignment and solution attachments:
+    create a session, PUT the bytes in chunks, then complete it with the
+    file's SHA-256. GET a session to learn where to resume.
+    """
+
+    permission_classes = [IsAuthenticated]
+    queryset = Upload.objects.all()
+    serializer_class = UploadSerializer
+
+    def get_queryset(self):
+        return Upload.objects.filter(user=self.request.user)
+
+    def error(self, e):
+        return Response({"detail": e.detail, **e.extra}, status=e.status)
+
+    def create(self, request, *args, **kwargs):
+        """
+
+        URL: /uploads/
+        Request Body: {"target": "solution", "object_id": 12,
+                       "filename": "answer.pdf", "size": 10485760}
+
+        """
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        try:
+            upload = start_upload(user=request.user, **serializer.validated_data)
+        except UploadError as e:
+            return self.error(e)
+        data = UploadSerializer(upload).data
+        data["chunk_size"] = get_option("MAX_CHUNK_SIZE")
+        return Response(data, status=status.HTTP_201_CREATED)
+
+    @swagger_auto_schema(operation_description="Upload a chunk of an upload.")
+    @action(detail=True, methods=["put"])
+    def chunk(self, request, pk=None):
+        """
+
+        URL: /uploads/{upload_id}/chunk/
+        Headers: Content-Range: bytes {start}-{end}/{size}
+        Request Body: the raw bytes of the chunk
+
+        """
+        content_range = parse_content_range(request.headers.get("Content-Range"))
+        if content_range is None:
+            return Response(
+                {"detail": "A Content-Range: bytes start-end/size header is required."},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        start, length = content_range
+        if str(length) != request.META.get("CONTENT_LENGTH"):
+            return Response(
+                {"detail": "Content-Length does not match Content-Range."},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        if length > get_option("MAX_CHUNK_SIZE"):
+            return Response(
+                {"detail": "The chunk is too large."},
+                status=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            )
+        upload = self.get_object()
+        try:
+            # The body is streamed from the request, never parsed or buffered.
+            offset = write_chunk(upload.pk, request.stream, start, length)
+        except UploadError as e:
+            return self.error(e)
+        return Response({"offset": offset}, status=status.HTTP_200_OK)
+
+    @swagger_auto_schema(
+        operation_description="Verify and attach a finished upload.",
+        request_body=CompleteUploadSerializer,
+    )
+    @action(detail=True, methods=["post"])
+    def complete(self, request, pk=None):
+        """
+
+        URL: /uploads/{upload_id}/complete/
+        Request Body: {"sha256": "hex digest of the whole file"}
+
+        """
+        serializer = CompleteUploadSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        upload = self.get_object()
+        try:
+            instance = complete_upload(
+                upload, serializer.validated_data["sha256"], validate_attachment
+            )
+        except UploadError as e:
+            return self.error(e)
+        return Response(
+            {
+                "target": upload.target,
+                "object_id": instance.pk,
+                "attachment": instance.attachment.name,
+            },
+            status=status.HTTP_200_OK,
+        )
+
+    def perform_destroy(self, instance):
+        discard_upload(instance)
+
+
+@require_safe
+def signed_download(request, name):
+    """
+
+    URL: /files/{name}?expires={timestamp}&signature={signature}
+    The signature is the permission: no authentication or database access.
+
+    """
+    expires = request.GET.get("expires")
+    if not check_signature(name, expires, request.GET.get("signature")):
+        return JsonResponse(
+            {"detail": "The link is invalid or has expired."},
+            status=status.HTTP_403_FORBIDDEN,
+        )
+    return serve_file(request, name, max_age=int(expires) - int(time.time()))
@@ -1,9 +1,39 @@
-import django_filters
-from rest_framework import filters
+from django.db.models import Q
+
+from school.filters import (
+    AccessFilterBackend,
+    attends,
+    manages_class,
+    manages_school,
+    member_of_school,
+    teaches,
+)
 
 from .models import *
 
 
-class TeacherHasAccessFilterBackend(filters.BaseFilterBackend):
-    def filter_queryset(self, request, queryset, view):
-        pass
+class NewsAccessFilterBackend(AccessFilterBackend):
+    """
+    Class news are visible to the class's students and teacher and to the
+    manager of its school; school news to the members and the manager of
+    the school. Staff see every news item.
+    """
+
+    def get_access_filter(self, request, queryset, view):
+        user = request.user
+        if user.is_staff:
+            return None
+        if user.user_type == "student":
+            class_news = attends(user, "class_obj_id")
+            school_news = member_of_school(user, "school_id")
+        elif user.user_type == "teacher":
+            class_news = teaches(user, "class_obj_id")
+            school_news = member_of_school(user, "school_id")
+        elif user.user_type == "manager":
+            class_news = manages_class(user, "class_obj_id")
+            school_news = manages_school(user, "school_id")
+        else:
+            return Q(pk__in=[])
+        return (Q(class_obj__isnull=False) & Q(class_news)) | (
+            Q(class_obj__isnull=True) & Q(school_news)
+        )
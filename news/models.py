@@ -19,5 +19,8 @@ class News(models.Model):
         Class, on_delete=models.CASCADE, related_name="news", null=True, blank=True
     )
 
+    class Meta:
+        indexes = [models.Index(fields=["created_at", "id"])]
+
     def __str__(self):
         return f"{self.title} - {self.context}"
@@ -1,5 +1,7 @@
 from rest_framework.permissions import BasePermission
 
+from school.principal import get_principal
+
 from .models import *
 
 
@@ -34,18 +36,12 @@ class IsStudentReadOnly(BasePermission):
 
 class IsMemberOfSchool(BasePermission):
     def has_object_permission(self, request, view, obj):
-        if hasattr(request.user, "school_manager"):
-            return obj.school == request.user.school_manager
-
-        if request.user.user_type == "teacher":
-            return obj.school in [
-                cls.school for cls in request.user.class_teacher.all()
-            ]
+        principal = get_principal(request)
+        if principal.managed_school_id is not None:
+            return obj.school_id == principal.managed_school_id
 
-        if request.user.user_type == "student":
-            return obj.school in [
-                cls.school for cls in request.user.class_students.all()
-            ]
+        if request.user.user_type in ["teacher", "student"]:
+            return principal.member_of_school(obj.school_id)
 
         return False
 
@@ -55,12 +51,7 @@ class IsTeacherOfClass(BasePermission):
         class_id = request.data.get("class_id")
         if not class_id:
             return False
-
-        try:
-            class_obj = Class.objects.get(id=class_id)
-            return request.user == class_obj.teacher
-        except Class.DoesNotExist:
-            return False
+        return get_principal(request).teaches(class_id)
 
 
 class IsManagerOfSchool(BasePermission):
@@ -68,44 +59,37 @@ class IsManagerOfSchool(BasePermission):
         school_id = request.data.get("school_id")
         if not school_id:
             return False
-
-        try:
-            school = School.objects.get(id=school_id)
-            return request.user == school.manager
-        except School.DoesNotExist:
-            return False
+        return get_principal(request).manages_school(school_id)
 
 
 class CanViewNews(BasePermission):
     def has_object_permission(self, request, view, obj):
-        if obj.class_obj:
-            if request.user.user_type == "student":
-                return obj.class_obj.students.filter(id=request.user.id).exists()
-            elif request.user.user_type == "teacher":
-                return obj.class_obj.teacher == request.user
-            elif request.user.user_type == "Manager":
-                return obj.class_obj.school.manager == request.user
-        elif obj.school:
+        if getattr(view, "access_filtered", False):
+            return True
+        principal = get_principal(request)
+        if obj.class_obj_id:
             if request.user.user_type == "student":
-                return obj.school in [
-                    cls.school for cls in request.user.class_students.all()
-                ]
+                return principal.enrolled_in(obj.class_obj_id)
             elif request.user.user_type == "teacher":
-                return obj.school in [
-                    cls.school for cls in request.user.class_teacher.all()
-                ]
+                return principal.teaches(obj.class_obj_id)
+            elif request.user.user_type == "manager":
+                return principal.manages_class(obj.class_obj_id)
+        elif obj.school_id:
+            if request.user.user_type in ["student", "teacher"]:
+                return principal.member_of_school(obj.school_id)
             elif request.user.user_type == "manager":
-                return obj.school.manager == request.user
+                return principal.manages_school(obj.school_id)
         return False
 
 
 class IsCreatorOrManager(BasePermission):
     def has_object_permission(self, request, view, obj):
-        if obj.creator == request.user:
+        if obj.creator_id == request.user.id:
             return True
         if (
             request.user.user_type == "manager"
-            and obj.school == request.user.school_manager
+            and obj.school_id is not None
+            and obj.school_id == get_principal(request).managed_school_id
         ):
             return True
 
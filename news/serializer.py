@@ -1,12 +1,13 @@
 from rest_framework import serializers
 
 from school.serializer import *
+from schoolManagement.fieldsets import SparseFieldsMixin
 from user.serializer import *
 
 from .models import *
 
 
-class NewsSerializer(serializers.ModelSerializer):
+class NewsSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     creator = UserSerializer(read_only=True)
     school = SchoolSerializer(read_only=True)
     class_obj = ClassSerializer(read_only=True)
@@ -1,3 +1,168 @@
+from django.db import connection
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APIClient
 
-# Create your tests here.
+from school.models import *
+from schoolManagement.testing import count_queries, without_silk
+from user.models import *
+
+from .models import *
+
+
+@without_silk
+class NewsQueryPlanTest(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.admin_user = User.objects.create_superuser(
+            username="admin",
+            email="admin@example.com",
+            password="adminpassword123",
+            national_id="0000000001",
+        )
+        self.manager_user = User.objects.create_user(
+            username="manager",
+            email="manager@example.com",
+            password="managerpassword123",
+            user_type="manager",
+            national_id="0000000002",
+        )
+        self.school = School.objects.create(
+            name="Test School", manager=self.manager_user
+        )
+        self.classes = []
+        for i in range(3):
+            class_obj = Class.objects.create(name=f"Class {i}", school=self.school)
+            class_obj.lessons.add(Lesson.objects.create(name=f"Lesson {i}"))
+            class_obj.students.add(
+                User.objects.create_user(
+                    username=f"student{i}",
+                    email=f"student{i}@example.com",
+                    password="studentpassword123",
+                    user_type="student",
+                    national_id=f"100000000{i}",
+                )
+            )
+            self.classes.append(class_obj)
+        self.client.force_authenticate(user=self.admin_user)
+
+    def add_news(self, count):
+        News.objects.bulk_create(
+            News(
+                title=f"News {i}",
+                context="context",
+                creator=self.manager_user,
+                school=self.school,
+                class_obj=self.classes[i % len(self.classes)],
+            )
+            for i in range(count)
+        )
+
+    def list_news(self, **params):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse("news-list"), {"limit": 100, **params})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return queries, response.data["results"]
+
+    def test_list_queries_do_not_grow_with_rows(self):
+        expand = "class_obj.students,class_obj.lessons,school"
+        self.add_news(3)
+        few, _ = self.list_news(expand=expand)
+        self.add_news(30)
+        many, results = self.list_news(expand=expand)
+
+        # news with school and class joined, students, lessons, open assignments
+        self.assertEqual(count_queries(many), count_queries(few))
+        self.assertEqual(count_queries(many), 4)
+        self.assertEqual(len(results), 33)
+        students = results[0]["class_obj"]["students"]
+        self.assertEqual(students[0]["username"], "student0")
+        self.assertEqual(results[0]["school"]["manager"], self.manager_user.pk)
+        self.assertEqual(results[0]["creator"], self.manager_user.pk)
+
+    def test_nested_objects_default_to_ids(self):
+        self.add_news(1)
+        queries, results = self.list_news()
+        self.assertEqual(count_queries(queries), 1)
+        self.assertEqual(results[0]["class_obj"], self.classes[0].pk)
+        self.assertEqual(results[0]["school"], self.school.pk)
+
+    def test_sparse_fields_skip_columns(self):
+        self.add_news(1)
+        queries, results = self.list_news(
+            fields="id,title,class_obj.name", expand="class_obj"
+        )
+        self.assertEqual(
+            results[0],
+            {
+                "id": results[0]["id"],
+                "title": "News 0",
+                "class_obj": {"name": "Class 0"},
+            },
+        )
+        sql = queries.captured_queries[-1]["sql"]
+        self.assertNotIn('"news_news"."context"', sql)
+        self.assertNotIn('"school_class"."teacher_id"', sql)
+
+
+@without_silk
+class NewsAccessFilterTest(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.manager_user = User.objects.create_user(
+            username="manager",
+            email="manager@example.com",
+            password="managerpassword123",
+            user_type="manager",
+            national_id="0000000002",
+        )
+        self.student_user = User.objects.create_user(
+            username="student",
+            email="student@example.com",
+            password="studentpassword123",
+            user_type="student",
+            national_id="0000000003",
+        )
+        self.school = School.objects.create(
+            name="Test School", manager=self.manager_user
+        )
+        self.other_school = School.objects.create(name="Other School")
+        self.class_obj = Class.objects.create(name="Class A", school=self.school)
+        self.other_class = Class.objects.create(name="Class B", school=self.school)
+        self.class_obj.students.add(self.student_user)
+
+        def news(title, **kwargs):
+            return News.objects.create(
+                title=title, context="context", creator=self.manager_user, **kwargs
+            )
+
+        self.class_news = news("class", class_obj=self.class_obj)
+        self.other_class_news = news("other class", class_obj=self.other_class)
+        self.school_news = news("school", school=self.school)
+        self.other_school_news = news("other school", school=self.other_school)
+
+    def titles(self, user):
+        self.client.force_authenticate(user=user)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse("news-list"))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(count_queries(queries), 1)
+        return sorted(news["title"] for news in response.data["results"])
+
+    def test_list_only_visible_news(self):
+        self.assertEqual(self.titles(self.student_user), ["class", "school"])
+        self.assertEqual(
+            self.titles(self.manager_user), ["class", "other class", "school"]
+        )
+
+    def test_retrieve_invisible_news(self):
+        self.client.force_authenticate(user=self.student_user)
+        url = reverse("news-detail", kwargs={"pk": self.other_class_news.pk})
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+        url = reverse("news-detail", kwargs={"pk": self.school_news.pk})
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
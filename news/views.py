@@ -1,4 +1,5 @@
 from django.shortcuts import render
+from django_filters.rest_framework import DjangoFilterBackend
 from drf_yasg.utils import swagger_auto_schema
 from rest_framework import generics, status, viewsets
 from rest_framework.decorators import *
@@ -8,18 +9,21 @@ from rest_framework.views import *
 from rest_framework_simplejwt.tokens import RefreshToken
 
 from school.models import *
+from schoolManagement.queryplan import QueryPlanMixin
 from user.models import *
 from user.serializer import *
 
+from .filters import *
 from .models import *
 from .permission import *
 from .serializer import *
 
 
-class NewsViewSet(viewsets.ModelViewSet):
+class NewsViewSet(QueryPlanMixin, viewsets.ModelViewSet):
     permission_classes = [IsAuthenticated]
     queryset = News.objects.all()
     serializer_class = NewsSerializer
+    filter_backends = [DjangoFilterBackend, NewsAccessFilterBackend]
 
     def get_permissions(self):
         if self.action == "create":
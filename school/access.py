@@ -0,0 +1,111 @@
+from django.db import transaction
+
+from .models import *
+
+BATCH_SIZE = 5000
+
+
+def grant(class_ids, user_ids, role, lesson_ids=None):
+    """
+    Give `user_ids` access to the lessons of `class_ids` (or only to
+    `lesson_ids` of them) in the given role.
+    """
+    lessons = Class.lessons.through.objects.filter(class_id__in=class_ids)
+    if lesson_ids is not None:
+        lessons = lessons.filter(lesson_id__in=lesson_ids)
+    rows = [
+        LessonAccess(
+            user_id=user_id, lesson_id=lesson_id, class_obj_id=class_id, role=role
+        )
+        for class_id, lesson_id in lessons.values_list("class_id", "lesson_id")
+        for user_id in user_ids
+    ]
+    LessonAccess.objects.bulk_create(
+        rows, batch_size=BATCH_SIZE, ignore_conflicts=True
+    )
+
+
+def grant_lessons(class_id, lesson_ids):
+    """Give the teacher and students of a class access to new lessons."""
+    grant_class_lessons({class_id: lesson_ids})
+
+
+def grant_class_lessons(lessons_by_class):
+    """
+    Give the teachers and students of many classes access to new lessons,
+    `lessons_by_class` mapping class ids to lesson ids, in two reads and
+    batched inserts.
+    """
+    class_ids = list(lessons_by_class)
+    members = [
+        (class_id, teacher_id, "teacher")
+        for class_id, teacher_id in Class.objects.filter(
+            id__in=class_ids, teacher__isnull=False
+        ).values_list("id", "teacher_id")
+    ]
+    members += [
+        (class_id, user_id, "student")
+        for class_id, user_id in Class.students.through.objects.filter(
+            class_id__in=class_ids
+        ).values_list("class_id", "user_id")
+    ]
+    rows = [
+        LessonAccess(
+            user_id=user_id, lesson_id=lesson_id, class_obj_id=class_id, role=role
+        )
+        for class_id, user_id, role in members
+        for lesson_id in lessons_by_class[class_id]
+    ]
+    LessonAccess.objects.bulk_create(
+        rows, batch_size=BATCH_SIZE, ignore_conflicts=True
+    )
+
+
+def revoke(**filters):
+    LessonAccess.objects.filter(**filters).delete()
+
+
+def lesson_ids_for(user):
+    """Subquery of the ids of lessons the user teaches or attends."""
+    return LessonAccess.objects.filter(user=user).values("lesson_id")
+
+
+@transaction.atomic
+def rebuild():
+    """Repopulate the whole table from classes, students and lessons."""
+    LessonAccess.objects.all().delete()
+
+    lessons_by_class = {}
+    for class_id, lesson_id in Class.lessons.through.objects.values_list(
+        "class_id", "lesson_id"
+    ).iterator(chunk_size=BATCH_SIZE):
+        lessons_by_class.setdefault(class_id, []).append(lesson_id)
+
+    def members():
+        teachers = Class.objects.filter(teacher__isnull=False).values_list(
+            "id", "teacher_id"
+        )
+        for class_id, teacher_id in teachers.iterator(chunk_size=BATCH_SIZE):
+            yield class_id, teacher_id, "teacher"
+        students = Class.students.through.objects.values_list("class_id", "user_id")
+        for class_id, user_id in students.iterator(chunk_size=BATCH_SIZE):
+            yield class_id, user_id, "student"
+
+    created = 0
+    rows = []
+    for class_id, user_id, role in members():
+        for lesson_id in lessons_by_class.get(class_id, ()):
+            rows.append(
+                LessonAccess(
+                    user_id=user_id,
+                    lesson_id=lesson_id,
+                    class_obj_id=class_id,
+                    role=role,
+                )
+            )
+        if len(rows) >= BATCH_SIZE:
+            LessonAccess.objects.bulk_create(rows)
+            created += len(rows)
+            rows = []
+    LessonAccess.objects.bulk_create(rows)
+    return created + len(rows)
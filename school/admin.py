@@ -1,8 +1,88 @@
-from django.contrib import admin
+from django import forms
+from django.contrib import admin, messages
+from django.contrib.admin.helpers import ActionForm
 
-# Register your models here.
+from schoolManagement.pagination import EstimatedCountPaginator
+
+from .counters import with_open_assignment_count
+from .enrollment import move_students
 from .models import *
 
-admin.site.register(School)
-admin.site.register(Class)
-admin.site.register(Lesson)
+
+class MoveStudentsForm(ActionForm):
+    target_class = forms.IntegerField(
+        required=False, min_value=1, label="Target class id"
+    )
+
+
+@admin.register(School)
+class SchoolAdmin(admin.ModelAdmin):
+    list_display = ["id", "name", "manager"]
+    list_select_related = ["manager"]
+    search_fields = ["name"]
+    autocomplete_fields = ["manager"]
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+
+
+@admin.register(Class)
+class ClassAdmin(admin.ModelAdmin):
+    list_display = [
+        "id",
+        "name",
+        "school",
+        "teacher",
+        "student_count",
+        "lesson_count",
+        "assignment_count",
+        "open_assignment_count",
+    ]
+    list_select_related = ["school", "teacher"]
+    search_fields = ["name", "school__name"]
+    autocomplete_fields = ["school", "teacher", "students", "lessons"]
+    readonly_fields = [
+        "student_count",
+        "lesson_count",
+        "assignment_count",
+        "open_assignment_count",
+    ]
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+    action_form = MoveStudentsForm
+    actions = ["move_students"]
+
+    def get_queryset(self, request):
+        # `Class.__str__` reads both, e.g. in autocomplete results.
+        queryset = super().get_queryset(request).select_related("school", "teacher")
+        return with_open_assignment_count(queryset)
+
+    @admin.display(ordering="open_assignment_count")
+    def open_assignment_count(self, obj):
+        return obj.open_assignment_count
+
+    @admin.action(description="Move students of selected classes to target class")
+    def move_students(self, request, queryset):
+        target_id = request.POST.get("target_class")
+        if not target_id or not target_id.isdigit():
+            self.message_user(
+                request, "Enter the id of the target class.", messages.ERROR
+            )
+            return
+        class_ids = list(queryset.values_list("id", flat=True))
+        try:
+            moved = move_students(class_ids, int(target_id))
+        except Class.DoesNotExist:
+            self.message_user(
+                request, f"Class {target_id} does not exist.", messages.ERROR
+            )
+            return
+        self.message_user(request, f"{moved} students moved to class {target_id}.")
+
+
+@admin.register(Lesson)
+class LessonAdmin(admin.ModelAdmin):
+    list_display = ["id", "name"]
+    search_fields = ["name"]
+    ordering = ["name"]
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
@@ -0,0 +1,129 @@
+from collections import Counter
+
+from django.db.models import (
+    Count,
+    F,
+    IntegerField,
+    OuterRef,
+    Prefetch,
+    Subquery,
+    Value,
+)
+from django.db.models.functions import Coalesce, Greatest, Now
+
+from assignment.models import Assignment
+
+from .models import *
+
+
+def adjust(counter, changes):
+    """
+    Apply `{class_id: delta}` to a counter of `Class` with atomic `F()`
+    updates, one statement per distinct delta. Counts are clamped at zero,
+    so a counter that drifted low (rows deleted without signals) does not
+    fail the save; `reconcile` corrects it.
+    """
+    by_delta = {}
+    for class_id, delta in changes.items():
+        if delta:
+            by_delta.setdefault(delta, []).append(class_id)
+    for delta, class_ids in by_delta.items():
+        Class.objects.filter(pk__in=class_ids).update(
+            **{counter: Greatest(F(counter) + delta, 0)}
+        )
+
+
+def m2m_changes(through, instance, reverse, pk_set, target_column):
+    """
+    Number of existing through rows per class touched by a remove or clear,
+    counted before the rows are deleted (`pk_set` of a remove may name rows
+    that do not exist).
+    """
+    if reverse:
+        rows = through.objects.filter(**{target_column: instance.pk})
+        if pk_set is not None:
+            rows = rows.filter(class_id__in=pk_set)
+    else:
+        rows = through.objects.filter(class_id=instance.pk)
+        if pk_set is not None:
+            rows = rows.filter(**{f"{target_column}__in": pk_set})
+    return Counter(rows.values_list("class_id", flat=True))
+
+
+def track_m2m(counter, target_column, instance, action, reverse, pk_set, through):
+    """Keep `counter` in step with an `m2m_changed` signal on `through`."""
+    attribute = f"_{counter}_changes"
+    if action in ["pre_remove", "pre_clear"]:
+        changes = m2m_changes(through, instance, reverse, pk_set, target_column)
+        setattr(instance, attribute, changes)
+    elif action == "post_add" and pk_set:
+        if reverse:
+            adjust(counter, {class_id: 1 for class_id in pk_set})
+        else:
+            adjust(counter, {instance.pk: len(pk_set)})
+    elif action in ["post_remove", "post_clear"]:
+        changes = getattr(instance, attribute, {})
+        adjust(counter, {class_id: -n for class_id, n in changes.items()})
+        setattr(instance, attribute, {})
+
+
+def count_subquery(queryset, column):
+    counts = (
+        queryset.filter(**{column: OuterRef("pk")})
+        .order_by()
+        .values(column)
+        .annotate(count=Count("*"))
+        .values("count")
+    )
+    return Coalesce(Subquery(counts, output_field=IntegerField()), Value(0))
+
+
+def open_assignments():
+    return Assignment.objects.filter(deadline__gt=Now())
+
+
+def with_open_assignment_count(queryset):
+    """
+    Annotate classes with `open_assignment_count`. Assignments close when
+    their deadline passes, without a write a stored counter could follow,
+    so open assignments are counted when the classes are read.
+    """
+    return queryset.annotate(
+        open_assignment_count=count_subquery(open_assignments(), "class_obj_id")
+    )
+
+
+def prefetch_open_assignments():
+    """The ids of open assignments, for classes read without the annotation."""
+    return Prefetch(
+        "assignments_class",
+        open_assignments().only("id", "class_obj_id"),
+        to_attr="open_assignments",
+    )
+
+
+def reconcile(batch_size=None):
+    """
+    Recompute every counter from the source tables with one `UPDATE` per
+    batch of class ids (all classes at once without `batch_size`).
+    """
+    values = {
+        "student_count": count_subquery(Class.students.through.objects, "class_id"),
+        "lesson_count": count_subquery(Class.lessons.through.objects, "class_id"),
+        "assignment_count": count_subquery(Assignment.objects, "class_obj_id"),
+    }
+    if batch_size is None:
+        return Class.objects.update(**values)
+
+    updated = 0
+    last_id = 0
+    while True:
+        ids = list(
+            Class.objects.filter(pk__gt=last_id)
+            .order_by("pk")
+            .values_list("pk", flat=True)[:batch_size]
+        )
+        if not ids:
+            return updated
+        updated += Class.objects.filter(pk__range=(ids[0], ids[-1])).update(**values)
+        last_id = ids[-1]
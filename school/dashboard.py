@@ -0,0 +1,107 @@
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Avg, Count
+
+from assignment.models import Assignment, Solution
+
+from . import rosters
+from .membership import get_versions
+from .models import *
+
+ACTIVITY_VERSION_KEY = "school-activity-version:{}"
+DASHBOARD_KEY = "school-dashboard:{}:{}:{}"
+
+
+def bump_activity(school_ids):
+    """Invalidate dashboards after assignment or solution changes."""
+    rosters.bump_versions(school_ids, ACTIVITY_VERSION_KEY)
+
+
+def build_dashboard(school_id):
+    """
+    Counts and grade averages of a school, overall and per class, from a
+    handful of grouped aggregate queries.
+    """
+    classes = list(
+        Class.objects.filter(school_id=school_id)
+        .order_by("id")
+        .values("id", "name", "teacher_id")
+    )
+    enrollments = Class.students.through.objects.filter(class__school_id=school_id)
+    students_per_class = dict(
+        enrollments.values("class_id")
+        .annotate(count=Count("user_id"))
+        .values_list("class_id", "count")
+    )
+    assignments_per_class = dict(
+        Assignment.objects.filter(class_obj__school_id=school_id)
+        .values("class_obj_id")
+        .annotate(count=Count("id"))
+        .values_list("class_obj_id", "count")
+    )
+    solutions_per_class = {
+        row["assignment__class_obj_id"]: row
+        for row in Solution.objects.filter(assignment__class_obj__school_id=school_id)
+        .values("assignment__class_obj_id")
+        .annotate(count=Count("id"), average=Avg("grade"))
+    }
+    lessons = Class.lessons.through.objects.filter(
+        class__school_id=school_id
+    ).aggregate(count=Count("lesson_id", distinct=True))["count"]
+    students = enrollments.aggregate(count=Count("user_id", distinct=True))["count"]
+
+    per_class = []
+    submissions = 0
+    grade_total = 0.0
+    for class_obj in classes:
+        solutions = solutions_per_class.get(class_obj["id"], {})
+        count = solutions.get("count", 0)
+        average = solutions.get("average")
+        submissions += count
+        if average is not None:
+            average = float(average)
+            grade_total += average * count
+        per_class.append(
+            {
+                "id": class_obj["id"],
+                "name": class_obj["name"],
+                "teacher": class_obj["teacher_id"],
+                "students": students_per_class.get(class_obj["id"], 0),
+                "assignments": assignments_per_class.get(class_obj["id"], 0),
+                "submissions": count,
+                "average_grade": None if average is None else round(average, 2),
+            }
+        )
+
+    return {
+        "classes": len(classes),
+        "students": students,
+        "teachers": len({c["teacher_id"] for c in classes} - {None}),
+        "lessons": lessons,
+        "assignments": sum(assignments_per_class.values()),
+        "submissions": submissions,
+        "average_grade": round(grade_total / submissions, 2) if submissions else None,
+        "per_class": per_class,
+    }
+
+
+def get_dashboard(school_id):
+    """
+    Cached dashboard of a school. The key carries the roster version (bumped
+    on enrollment, class and member changes) and the activity version
+    (bumped on assignment and solution changes).
+    """
+    version_keys = [
+        rosters.VERSION_KEY.format(school_id),
+        ACTIVITY_VERSION_KEY.format(school_id),
+    ]
+    key = DASHBOARD_KEY.format(school_id, *get_versions(version_keys).values())
+    data = cache.get(key)
+    if data is None:
+        data = build_dashboard(school_id)
+        cache.set(
+            key,
+            data,
+            timeout=getattr(settings, "SCHOOL_DASHBOARD_CACHE_TIMEOUT", 3600),
+        )
+    return data
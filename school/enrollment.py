@@ -0,0 +1,185 @@
+from collections import Counter
+
+from django.db import transaction
+
+from user.models import User
+
+from . import access, counters, rosters
+from .lessons import get_or_create_lessons
+from .membership import enrollment_index
+from .models import *
+
+MODES = ["add", "remove", "set"]
+
+
+def resolve_students(national_ids):
+    """Map national ids to student ids in one query; return `(found, unknown)`."""
+    national_ids = set(national_ids)
+    found = dict(
+        User.objects.filter(
+            national_id__in=national_ids, user_type="student"
+        ).values_list("national_id", "id")
+    )
+    return found, sorted(national_ids - found.keys())
+
+
+def sync_students(class_id, national_ids, mode):
+    """
+    Add, remove or replace (`mode` "set") the students of a class. The diff
+    against the current roster is applied with one bulk insert and one
+    delete on the `Class.students` through table in a single transaction.
+    Bulk writes skip `m2m_changed`, so lesson access, the enrollment index,
+    the class student count and the school roster version are updated here.
+    """
+    found, unknown = resolve_students(national_ids)
+    requested = set(found.values())
+    through = Class.students.through
+
+    with transaction.atomic():
+        school_id = (
+            Class.objects.select_for_update()
+            .filter(pk=class_id)
+            .values_list("school_id", flat=True)
+            .get()
+        )
+        current = set(
+            through.objects.filter(class_id=class_id).values_list("user_id", flat=True)
+        )
+        to_add = requested - current if mode in ["add", "set"] else set()
+        if mode == "remove":
+            to_remove = requested & current
+        elif mode == "set":
+            to_remove = current - requested
+        else:
+            to_remove = set()
+
+        through.objects.bulk_create(
+            [through(class_id=class_id, user_id=user_id) for user_id in to_add],
+            batch_size=access.BATCH_SIZE,
+            ignore_conflicts=True,
+        )
+        if to_remove:
+            through.objects.filter(class_id=class_id, user_id__in=to_remove).delete()
+            access.revoke(class_obj_id=class_id, user__in=to_remove, role="student")
+            enrollment_index.remove_students(class_id, to_remove)
+        if to_add:
+            access.grant([class_id], to_add, "student")
+            enrollment_index.add_students(class_id, to_add)
+        counters.adjust("student_count", {class_id: len(to_add) - len(to_remove)})
+        if to_add or to_remove:
+            transaction.on_commit(lambda: rosters.bump_versions([school_id]))
+
+    return {"added": len(to_add), "removed": len(to_remove), "unknown": unknown}
+
+
+def add_lessons_to_classes(class_ids, names):
+    """
+    Add the lessons named `names` to every class in `class_ids`, creating
+    lessons that do not exist yet. Pairs already present are skipped and
+    the rest go in with one bulk insert on the `Class.lessons` through
+    table; as in `sync_students`, lesson access, the class lesson counts and
+    the school roster versions are updated here.
+    """
+    lessons = get_or_create_lessons(names)
+    through = Class.lessons.through
+
+    with transaction.atomic():
+        classes = dict(
+            Class.objects.select_for_update()
+            .filter(pk__in=class_ids)
+            .values_list("id", "school_id")
+        )
+        current = set(
+            through.objects.filter(
+                class_id__in=classes, lesson_id__in=lessons
+            ).values_list("class_id", "lesson_id")
+        )
+        added = {}
+        for class_id in classes:
+            for lesson_id in lessons:
+                if (class_id, lesson_id) not in current:
+                    added.setdefault(class_id, []).append(lesson_id)
+
+        through.objects.bulk_create(
+            [
+                through(class_id=class_id, lesson_id=lesson_id)
+                for class_id, lesson_ids in added.items()
+                for lesson_id in lesson_ids
+            ],
+            batch_size=access.BATCH_SIZE,
+            ignore_conflicts=True,
+        )
+        if added:
+            access.grant_class_lessons(added)
+            counters.adjust(
+                "lesson_count",
+                {class_id: len(lesson_ids) for class_id, lesson_ids in added.items()},
+            )
+            school_ids = {classes[class_id] for class_id in added}
+            transaction.on_commit(lambda: rosters.bump_versions(school_ids))
+
+    return {
+        "added": sum(len(lesson_ids) for lesson_ids in added.values()),
+        "lessons": [
+            {"id": lesson_id, "name": name} for lesson_id, name in lessons.items()
+        ],
+        "unknown_classes": sorted(set(class_ids) - classes.keys()),
+    }
+
+
+def move_students(class_ids, target_id):
+    """
+    Move every student of the classes `class_ids` into the class
+    `target_id`, with one delete on the `Class.students` through table and
+    one bulk insert. As in `sync_students`, lesson access, the enrollment
+    index, the student counts and the school roster versions are updated
+    here. Returns the number of students moved.
+    """
+    through = Class.students.through
+
+    with transaction.atomic():
+        classes = dict(
+            Class.objects.select_for_update()
+            .filter(pk__in=[*class_ids, target_id])
+            .values_list("id", "school_id")
+        )
+        if target_id not in classes:
+            raise Class.DoesNotExist
+        sources = [class_id for class_id in classes if class_id != target_id]
+        rows = list(
+            through.objects.filter(class_id__in=sources).values_list(
+                "class_id", "user_id"
+            )
+        )
+        moved = {user_id for _, user_id in rows}
+        current = set(
+            through.objects.filter(class_id=target_id).values_list(
+                "user_id", flat=True
+            )
+        )
+        to_add = moved - current
+
+        through.objects.filter(class_id__in=sources).delete()
+        access.revoke(class_obj_id__in=sources, role="student")
+        for class_id in sources:
+            enrollment_index.remove_students(class_id)
+        through.objects.bulk_create(
+            [through(class_id=target_id, user_id=user_id) for user_id in to_add],
+            batch_size=access.BATCH_SIZE,
+            ignore_conflicts=True,
+        )
+        if to_add:
+            access.grant([target_id], to_add, "student")
+            enrollment_index.add_students(target_id, to_add)
+
+        changes = {
+            class_id: -count
+            for class_id, count in Counter(class_id for class_id, _ in rows).items()
+        }
+        changes[target_id] = len(to_add)
+        counters.adjust("student_count", changes)
+        if rows:
+            school_ids = set(classes.values())
+            transaction.on_commit(lambda: rosters.bump_versions(school_ids))
+
+    return len(moved)
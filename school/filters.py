@@ -1,9 +1,110 @@
 import django_filters
+from django.db.models import Exists, OuterRef, Q
 from rest_framework import filters
 
 from .models import *
 
 
-class TeacherHasAccessFilterBackend(filters.BaseFilterBackend):
+def teaches(user, class_ref):
+    """Rows whose class (`class_ref` column) is taught by `user`."""
+    return Exists(Class.objects.filter(pk=OuterRef(class_ref), teacher_id=user.id))
+
+
+def attends(user, class_ref):
+    """Rows whose class (`class_ref` column) has `user` as a student."""
+    return Exists(
+        Class.students.through.objects.filter(
+            class_id=OuterRef(class_ref), user_id=user.id
+        )
+    )
+
+
+def manages_school(user, school_ref):
+    """Rows whose school (`school_ref` column) is managed by `user`."""
+    return Exists(School.objects.filter(pk=OuterRef(school_ref), manager_id=user.id))
+
+
+def manages_class(user, class_ref):
+    """Rows whose class (`class_ref` column) belongs to a school of `user`."""
+    return Exists(
+        Class.objects.filter(pk=OuterRef(class_ref), school__manager_id=user.id)
+    )
+
+
+def member_of_school(user, school_ref):
+    """Rows whose school has a class taught or attended by `user`."""
+    if user.user_type == "teacher":
+        return Exists(
+            Class.objects.filter(school_id=OuterRef(school_ref), teacher_id=user.id)
+        )
+    return Exists(
+        Class.students.through.objects.filter(
+            user_id=user.id, class__school_id=OuterRef(school_ref)
+        )
+    )
+
+
+class ClassFilter(django_filters.FilterSet):
+    # Annotated by `ClassViewSet.get_queryset`, not a column.
+    open_assignment_count__gte = django_filters.NumberFilter(
+        field_name="open_assignment_count", lookup_expr="gte"
+    )
+    open_assignment_count__lte = django_filters.NumberFilter(
+        field_name="open_assignment_count", lookup_expr="lte"
+    )
+
+    class Meta:
+        model = Class
+        fields = {
+            "school": ["exact"],
+            "teacher": ["exact"],
+            "student_count": ["gte", "lte"],
+            "lesson_count": ["gte", "lte"],
+            "assignment_count": ["gte", "lte"],
+        }
+
+
+class AccessFilterBackend(filters.BaseFilterBackend):
+    """
+    Restrict a queryset to the rows the requesting user may see, as a SQL
+    predicate. Subclasses implement `get_access_filter`, returning a `Q` or
+    expression, or None for every row. The view is marked with
+    `access_filtered` so object permissions can skip re-checking rows that
+    came out of the filtered queryset.
+    """
+
+    def get_access_filter(self, request, queryset, view):
+        raise NotImplementedError
+
     def filter_queryset(self, request, queryset, view):
-        queryset.filter()
+        view.access_filtered = True
+        if not request.user.is_authenticated:
+            return queryset.none()
+        predicate = self.get_access_filter(request, queryset, view)
+        if predicate is None:
+            return queryset
+        return queryset.filter(predicate)
+
+
+class SchoolAccessFilterBackend(AccessFilterBackend):
+    def get_access_filter(self, request, queryset, view):
+        user = request.user
+        if user.is_staff:
+            return None
+        if user.user_type == "manager":
+            return Q(manager_id=user.id)
+        return Q(pk__in=[])
+
+
+class ClassAccessFilterBackend(AccessFilterBackend):
+    def get_access_filter(self, request, queryset, view):
+        user = request.user
+        if user.is_staff:
+            return None
+        if user.user_type == "teacher":
+            return Q(teacher_id=user.id)
+        if user.user_type == "student":
+            return attends(user, "pk")
+        if user.user_type == "manager":
+            return manages_school(user, "school_id")
+        return Q(pk__in=[])
@@ -0,0 +1,134 @@
+import json
+
+import numpy as np
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import FloatField
+from django.db.models.functions import Cast
+from rest_framework.renderers import BaseRenderer
+from rest_framework.settings import api_settings
+
+from assignment.models import Assignment, Solution
+from user.models import User
+
+from .models import *
+
+try:
+    import pyarrow
+    import pyarrow.ipc
+except ImportError:  # Arrow output is optional
+    pyarrow = None
+
+STUDENT_COLUMNS = ["id", "username", "first_name", "last_name"]
+ASSIGNMENT_COLUMNS = ["id", "title", "grade", "deadline"]
+
+
+def columns(rows, names):
+    """Transpose `values_list` rows into `{name: [values]}`."""
+    values = list(zip(*rows)) or [()] * len(names)
+    return {name: list(column) for name, column in zip(names, values)}
+
+
+def positions(axis, ids):
+    """
+    Index of each of `ids` in the unsorted id array `axis`, and a mask of
+    the ids found there.
+    """
+    if not len(axis):
+        return np.zeros(len(ids), dtype=np.int64), np.zeros(len(ids), dtype=bool)
+    order = np.argsort(axis)
+    found = np.minimum(np.searchsorted(axis, ids, sorter=order), len(axis) - 1)
+    index = order[found]
+    return index, axis[index] == ids
+
+
+def build_gradebook(class_id):
+    """
+    Grades of a class as a students x assignments matrix in coordinate
+    form. The `rows`, `columns` and `values` arrays list the graded cells,
+    indexing into the `students` and `assignments` axes, which are returned
+    column-wise. All solutions are read in one query and pivoted with NumPy.
+    When a student handed in several solutions, the latest one counts.
+    """
+    students = User.objects.filter(class_students=class_id).order_by(
+        "last_name", "first_name", "id"
+    )
+    students = columns(students.values_list(*STUDENT_COLUMNS), STUDENT_COLUMNS)
+    assignments = Assignment.objects.filter(class_obj_id=class_id).order_by(
+        "deadline", "id"
+    )
+    assignments = columns(
+        assignments.values_list(*ASSIGNMENT_COLUMNS), ASSIGNMENT_COLUMNS
+    )
+    assignments["grade"] = [float(grade) for grade in assignments["grade"]]
+
+    solutions = (
+        Solution.objects.filter(assignment__class_obj_id=class_id)
+        .annotate(value=Cast("grade", FloatField()))
+        .order_by("id")
+        .values_list("student_id", "assignment_id", "value")
+    )
+    cells = np.array(list(solutions), dtype=np.float64).reshape(-1, 3)
+    rows, in_class = positions(
+        np.array(students["id"], dtype=np.int64), cells[:, 0].astype(np.int64)
+    )
+    cols, in_assignments = positions(
+        np.array(assignments["id"], dtype=np.int64), cells[:, 1].astype(np.int64)
+    )
+    keep = in_class & in_assignments
+    rows, cols, values = rows[keep], cols[keep], cells[keep, 2]
+
+    # Keep the last (latest) solution of every cell.
+    flat = rows * max(len(assignments["id"]), 1) + cols
+    _, last = np.unique(flat[::-1], return_index=True)
+    latest = len(flat) - 1 - last
+    return {
+        "students": students,
+        "assignments": assignments,
+        "rows": rows[latest].tolist(),
+        "columns": cols[latest].tolist(),
+        "values": values[latest].tolist(),
+    }
+
+
+class ArrowRenderer(BaseRenderer):
+    """
+    Gradebook as an Arrow IPC stream: one record batch of `row`, `column`
+    and `value`, with the axes as JSON in the schema metadata.
+    """
+
+    media_type = "application/vnd.apache.arrow.stream"
+    format = "arrow"
+    charset = None
+    render_style = "binary"
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        response = (renderer_context or {}).get("response")
+        if (
+            getattr(response, "exception", False)
+            or not isinstance(data, dict)
+            or "values" not in data
+        ):
+            # Errors are not gradebooks; send them as JSON, labelled as such.
+            if response is not None:
+                response["Content-Type"] = "application/json"
+            return json.dumps(data, cls=DjangoJSONEncoder).encode()
+        table = pyarrow.table(
+            {
+                "row": pyarrow.array(data["rows"], type=pyarrow.int32()),
+                "column": pyarrow.array(data["columns"], type=pyarrow.int32()),
+                "value": pyarrow.array(data["values"], type=pyarrow.float64()),
+            },
+            metadata={
+                "students": json.dumps(data["students"], cls=DjangoJSONEncoder),
+                "assignments": json.dumps(data["assignments"], cls=DjangoJSONEncoder),
+            },
+        )
+        sink = pyarrow.BufferOutputStream()
+        with pyarrow.ipc.new_stream(sink, table.schema) as writer:
+            writer.write_table(table)
+        return sink.getvalue().to_pybytes()
+
+
+RENDERERS = api_settings.DEFAULT_RENDERER_CLASSES + (
+    [ArrowRenderer] if pyarrow is not None else []
+)
@@ -0,0 +1,109 @@
+import threading
+import time
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models.functions import Lower
+
+from .membership import bump_version, get_version
+from .models import *
+
+VERSION_KEY = "school-lesson-catalog-version"
+
+
+def name_key(name):
+    """Key lessons are unique on: the normalized, lower-cased name."""
+    return normalize_lesson_name(name).lower()
+
+
+class LessonCatalog:
+    """
+    Process-local copy of the lesson table, `{id: name}` plus a lookup by
+    `name_key`. The catalog is small and rarely changes, so it is loaded
+    whole on first use. Changes bump a shared version in the database; other
+    workers compare it with their own at most every `SYNC_INTERVAL` seconds
+    and reload when it moved.
+    """
+
+    def __init__(self):
+        options = getattr(settings, "LESSON_CATALOG", {})
+        self.sync_interval = options.get("SYNC_INTERVAL", 5)
+        self.lock = threading.Lock()
+        self.clear()
+
+    def clear(self):
+        with self.lock:
+            self.names = None
+            self.keys = {}
+            self.version = None
+            self.last_sync = 0.0
+
+    def load(self):
+        version = get_version(VERSION_KEY)
+        names = dict(Lesson.objects.values_list("id", "name"))
+        with self.lock:
+            self.names = names
+            self.keys = {name.lower(): lesson_id for lesson_id, name in names.items()}
+            self.version = version
+            self.last_sync = time.monotonic()
+
+    def sync(self):
+        if self.names is None:
+            self.load()
+        elif time.monotonic() - self.last_sync >= self.sync_interval:
+            self.last_sync = time.monotonic()
+            if get_version(VERSION_KEY) != self.version:
+                self.load()
+
+    def invalidate(self):
+        """Publish a lesson change; this and every other catalog reload."""
+        bump_version(VERSION_KEY)
+        self.clear()
+
+    def find(self, name):
+        self.sync()
+        return self.keys.get(name_key(name))
+
+    def serialize(self, lesson_ids):
+        """Lessons rendered as `LessonSerializer` does, ordered by id."""
+        self.sync()
+        lesson_ids = sorted(set(lesson_ids))
+        if any(lesson_id not in self.names for lesson_id in lesson_ids):
+            # Created by another worker since our last sync.
+            self.load()
+        names = self.names
+        return [
+            {"id": lesson_id, "name": names[lesson_id]}
+            for lesson_id in lesson_ids
+            if lesson_id in names
+        ]
+
+
+lesson_catalog = LessonCatalog()
+
+
+def get_or_create_lessons(names):
+    """
+    Return `{id: name}` of the lessons named `names`, creating the missing
+    ones. Lookups go through the unique index on the lower-cased name, and
+    inserts use `ignore_conflicts`, so concurrent requests creating the
+    same lesson both end up with the one row.
+    """
+    wanted = {}
+    for name in names:
+        wanted.setdefault(name_key(name), normalize_lesson_name(name))
+    lessons = Lesson.objects.annotate(key=Lower("name")).values_list(
+        "key", "id", "name"
+    )
+
+    existing = lessons.filter(key__in=wanted)
+    found = {key: (lesson_id, name) for key, lesson_id, name in existing}
+    missing = [name for key, name in wanted.items() if key not in found]
+    if missing:
+        Lesson.objects.bulk_create(
+            [Lesson(name=name) for name in missing], ignore_conflicts=True
+        )
+        transaction.on_commit(lesson_catalog.invalidate)
+        created = lessons.filter(key__in=[name.lower() for name in missing])
+        found.update((key, (lesson_id, name)) for key, lesson_id, name in created)
+    return dict(found.values())
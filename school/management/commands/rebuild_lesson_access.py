@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from school.access import rebuild
+
+
+class Command(BaseCommand):
+    help = "Repopulate the lesson access table from classes, students and lessons."
+
+    def handle(self, *args, **options):
+        created = rebuild()
+        self.stdout.write(self.style.SUCCESS(f"Created {created} lesson access rows."))
@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+
+from school.counters import reconcile
+
+
+class Command(BaseCommand):
+    help = "Recompute the student, lesson and assignment counters of classes."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=None,
+            help="Update this many classes per statement (default: all at once).",
+        )
+
+    def handle(self, *args, **options):
+        updated = reconcile(batch_size=options["batch_size"])
+        self.stdout.write(self.style.SUCCESS(f"Reconciled {updated} classes."))
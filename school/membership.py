@@ -0,0 +1,357 @@
+import threading
+import time
+from array import array
+from bisect import bisect_left
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import F
+
+from .models import *
+
+VERSION_KEY = "school-enrollment-version"
+LOW_MASK = (1 << 32) - 1
+CHUNK_SIZE = 10000
+
+
+def pack(high, low):
+    return high << 32 | low
+
+
+class PairSet:
+    """
+    Set of `(high, low)` id pairs packed into 64-bit integers: a sorted
+    `array("Q")` (8 bytes a pair) plus small sets of pending additions and
+    removals, merged into the array once they grow past `merge_threshold`.
+    """
+
+    def __init__(self, keys, merge_threshold=4096):
+        self.keys = keys
+        self.added = set()
+        self.removed = set()
+        self.merge_threshold = merge_threshold
+
+    def _in_base(self, key):
+        index = bisect_left(self.keys, key)
+        return index < len(self.keys) and self.keys[index] == key
+
+    def __contains__(self, pair):
+        key = pack(*pair)
+        if key in self.added:
+            return True
+        if key in self.removed:
+            return False
+        return self._in_base(key)
+
+    def __len__(self):
+        return len(self.keys) - len(self.removed) + len(self.added)
+
+    def add(self, high, low):
+        key = pack(high, low)
+        self.removed.discard(key)
+        if not self._in_base(key):
+            self.added.add(key)
+        self._merge()
+
+    def discard(self, high, low):
+        key = pack(high, low)
+        self.added.discard(key)
+        if self._in_base(key):
+            self.removed.add(key)
+        self._merge()
+
+    def lows(self, high):
+        start = bisect_left(self.keys, pack(high, 0))
+        end = bisect_left(self.keys, pack(high + 1, 0))
+        lows = [
+            key & LOW_MASK for key in self.keys[start:end] if key not in self.removed
+        ]
+        lows += [key & LOW_MASK for key in self.added if key >> 32 == high]
+        return lows
+
+    def _merge(self):
+        if len(self.added) + len(self.removed) <= self.merge_threshold:
+            return
+        keys = [key for key in self.keys if key not in self.removed]
+        keys += self.added
+        keys.sort()
+        self.keys = array("Q", keys)
+        self.added = set()
+        self.removed = set()
+
+
+def get_version(key=VERSION_KEY):
+    version = (
+        SyncVersion.objects.filter(key=key).values_list("version", flat=True).first()
+    )
+    return version or 0
+
+
+def get_versions(keys):
+    """`{key: version}` of several keys in one query."""
+    rows = SyncVersion.objects.filter(key__in=keys).values_list("key", "version")
+    versions = dict(rows)
+    return {key: versions.get(key, 0) for key in keys}
+
+
+def bump_version(key=VERSION_KEY):
+    versions = SyncVersion.objects.filter(key=key)
+    if not versions.update(version=F("version") + 1):
+        SyncVersion.objects.bulk_create([SyncVersion(key=key)], ignore_conflicts=True)
+        versions.update(version=F("version") + 1)
+    return get_version(key)
+
+
+def bump_versions(keys):
+    """`bump_version` of several keys, in two statements."""
+    keys = sorted(set(keys))
+    if not keys:
+        return
+    SyncVersion.objects.bulk_create(
+        [SyncVersion(key=key) for key in keys], ignore_conflicts=True
+    )
+    SyncVersion.objects.filter(key__in=keys).update(version=F("version") + 1)
+
+
+class EnrollmentIndex:
+    """
+    Process-local index of class students, class teachers and school
+    classes, so membership checks are in-memory lookups. Enrollments are
+    kept in two `PairSet`s, (class, student) and (student, class), about
+    16 bytes an enrollment.
+
+    The index is loaded on first use and updated in place from the signals
+    in school/signals.py once their transaction commits. Every change then
+    bumps a version counter in the database (`SyncVersion`); other workers
+    compare it with their own at most every `SYNC_INTERVAL` seconds and
+    reload when it moved, so a change made by another worker is seen after
+    that delay. The index is also reloaded whole every `MAX_AGE` seconds,
+    whatever the version says.
+
+    Reloads after the first run in a background thread, one at a time, while
+    lookups keep answering from the current snapshot. Changes applied during
+    a load are replayed onto the new snapshot before it replaces the old.
+    """
+
+    def __init__(self):
+        options = getattr(settings, "ENROLLMENT_INDEX", {})
+        self.sync_interval = options.get("SYNC_INTERVAL", 5)
+        self.max_age = options.get("MAX_AGE", 300)
+        self.merge_threshold = options.get("MERGE_THRESHOLD", 4096)
+        self.background_reload = options.get("BACKGROUND_RELOAD", True)
+        self.lock = threading.RLock()
+        self.load_lock = threading.Lock()
+        self.clear()
+
+    def clear(self):
+        with self.lock:
+            self.students = None
+            self.enrollments = None
+            self.classes = {}
+            self.taught = {}
+            self.school_classes = {}
+            self.version = None
+            self.last_sync = 0.0
+            self.loaded_at = 0.0
+            self.changes = None
+
+    def _pairs(self, first, second):
+        keys = array("Q")
+        rows = (
+            Class.students.through.objects.order_by(first, second)
+            .values_list(first, second)
+            .iterator(chunk_size=CHUNK_SIZE)
+        )
+        for high, low in rows:
+            keys.append(pack(high, low))
+        return PairSet(keys, self.merge_threshold)
+
+    def _load(self):
+        with self.lock:
+            self.changes = []
+        try:
+            version = get_version()
+            students = self._pairs("class_id", "user_id")
+            enrollments = self._pairs("user_id", "class_id")
+            classes = list(Class.objects.values_list("id", "school_id", "teacher_id"))
+        except Exception:
+            with self.lock:
+                self.changes = None
+            raise
+        with self.lock:
+            self.students = students
+            self.enrollments = enrollments
+            self.classes = {}
+            self.taught = {}
+            self.school_classes = {}
+            for class_id, school_id, teacher_id in classes:
+                self._set_class(class_id, school_id, teacher_id)
+            # Idempotent, so changes the snapshot already has do no harm.
+            for update, args in self.changes:
+                update(*args)
+            self.changes = None
+            self.version = version
+            self.last_sync = self.loaded_at = time.monotonic()
+
+    def load(self):
+        with self.load_lock:
+            self._load()
+
+    def _reload_in_background(self):
+        try:
+            self._load()
+        finally:
+            connection.close()
+            self.load_lock.release()
+
+    def reload(self):
+        """
+        Start loading a new snapshot, unless a load is already running.
+        Lookups keep using the current snapshot until it is ready.
+        """
+        if not self.load_lock.acquire(blocking=False):
+            return
+        if not self.background_reload:
+            try:
+                self._load()
+            finally:
+                self.load_lock.release()
+            return
+        threading.Thread(target=self._reload_in_background, daemon=True).start()
+
+    def sync(self):
+        if self.students is None:
+            # Nothing to answer from yet: one thread loads, the others wait.
+            with self.load_lock:
+                if self.students is None:
+                    self._load()
+        elif time.monotonic() - self.loaded_at >= self.max_age:
+            self.reload()
+        elif time.monotonic() - self.last_sync >= self.sync_interval:
+            self.last_sync = time.monotonic()
+            if get_version() != self.version:
+                self.reload()
+
+    def publish(self):
+        """Bump the shared version after a change applied to this index."""
+        version = bump_version()
+        with self.lock:
+            if self.version is not None and version == self.version + 1:
+                self.version = version
+
+    # Lookups
+
+    def is_student(self, class_id, user_id):
+        self.sync()
+        return (class_id, user_id) in self.students
+
+    def teacher_of(self, class_id):
+        self.sync()
+        return self.classes.get(class_id, (None, None))[1]
+
+    def school_of(self, class_id):
+        self.sync()
+        return self.classes.get(class_id, (None, None))[0]
+
+    def classes_of_student(self, user_id):
+        self.sync()
+        with self.lock:
+            return self.enrollments.lows(user_id)
+
+    def classes_of_teacher(self, user_id):
+        self.sync()
+        with self.lock:
+            return list(self.taught.get(user_id, ()))
+
+    def classes_of_school(self, school_id):
+        self.sync()
+        with self.lock:
+            return list(self.school_classes.get(school_id, ()))
+
+    # Updates
+
+    def _set_class(self, class_id, school_id, teacher_id):
+        self._remove_class(class_id)
+        self.classes[class_id] = (school_id, teacher_id)
+        self.school_classes.setdefault(school_id, set()).add(class_id)
+        if teacher_id is not None:
+            self.taught.setdefault(teacher_id, set()).add(class_id)
+
+    def _remove_class(self, class_id):
+        school_id, teacher_id = self.classes.pop(class_id, (None, None))
+        self.school_classes.get(school_id, set()).discard(class_id)
+        self.taught.get(teacher_id, set()).discard(class_id)
+
+    def _after_commit(self, update, *args):
+        """
+        Apply `update` to this index and publish it once the current
+        transaction commits (at once outside a transaction). A rolled back
+        change never reaches the index or the other workers.
+        """
+
+        def apply():
+            with self.lock:
+                if self.students is not None:
+                    update(*args)
+                if self.changes is not None:
+                    self.changes.append((update, args))
+            self.publish()
+
+        transaction.on_commit(apply)
+
+    def _remove_students(self, class_id, user_ids):
+        if user_ids is None:
+            user_ids = self.students.lows(class_id)
+        for user_id in user_ids:
+            self.students.discard(class_id, user_id)
+            self.enrollments.discard(user_id, class_id)
+
+    def _remove_enrollments(self, user_id, class_ids):
+        if class_ids is None:
+            class_ids = self.enrollments.lows(user_id)
+        for class_id in class_ids:
+            self.students.discard(class_id, user_id)
+            self.enrollments.discard(user_id, class_id)
+
+    def set_class(self, class_id, school_id, teacher_id):
+        self._after_commit(self._set_class, class_id, school_id, teacher_id)
+
+    def remove_class(self, class_id):
+        def update():
+            self._remove_class(class_id)
+            self._remove_students(class_id, None)
+
+        self._after_commit(update)
+
+    def add_students(self, class_id, user_ids):
+        def update(user_ids):
+            for user_id in user_ids:
+                self.students.add(class_id, user_id)
+                self.enrollments.add(user_id, class_id)
+
+        self._after_commit(update, list(user_ids))
+
+    def remove_students(self, class_id, user_ids=None):
+        """Unenroll `user_ids`, or every student, from a class."""
+        if user_ids is not None:
+            user_ids = list(user_ids)
+        self._after_commit(self._remove_students, class_id, user_ids)
+
+    def remove_enrollments(self, user_id, class_ids=None):
+        """Unenroll a student from `class_ids`, or from every class."""
+        if class_ids is not None:
+            class_ids = list(class_ids)
+        self._after_commit(self._remove_enrollments, user_id, class_ids)
+
+    def remove_user(self, user_id):
+        """Drop the enrollments of a deleted user and unset it as teacher."""
+
+        def update():
+            for class_id in self.taught.pop(user_id, ()):
+                self.classes[class_id] = (self.classes[class_id][0], None)
+            self._remove_enrollments(user_id, None)
+
+        self._after_commit(update)
+
+
+enrollment_index = EnrollmentIndex()
@@ -0,0 +1,70 @@
+# Generated by Django 5.2.18 on 2026-10-18 18:21
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+BATCH_SIZE = 1000
+
+
+def populate_lesson_access(apps, schema_editor):
+    Class = apps.get_model('school', 'Class')
+    LessonAccess = apps.get_model('school', 'LessonAccess')
+
+    lessons_by_class = {}
+    for class_id, lesson_id in Class.lessons.through.objects.values_list(
+        'class_id', 'lesson_id'
+    ).iterator(chunk_size=BATCH_SIZE):
+        lessons_by_class.setdefault(class_id, []).append(lesson_id)
+
+    def members():
+        teachers = Class.objects.filter(teacher__isnull=False).values_list(
+            'id', 'teacher_id'
+        )
+        for class_id, teacher_id in teachers.iterator(chunk_size=BATCH_SIZE):
+            yield class_id, teacher_id, 'teacher'
+        students = Class.students.through.objects.values_list('class_id', 'user_id')
+        for class_id, user_id in students.iterator(chunk_size=BATCH_SIZE):
+            yield class_id, user_id, 'student'
+
+    rows = []
+    for class_id, user_id, role in members():
+        for lesson_id in lessons_by_class.get(class_id, ()):
+            rows.append(
+                LessonAccess(
+                    user_id=user_id,
+                    lesson_id=lesson_id,
+                    class_obj_id=class_id,
+                    role=role,
+                )
+            )
+        if len(rows) >= BATCH_SIZE:
+            LessonAccess.objects.bulk_create(rows, ignore_conflicts=True)
+            rows = []
+    LessonAccess.objects.bulk_create(rows, ignore_conflicts=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('school', '0002_initial'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LessonAccess',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('role', models.CharField(choices=[('teacher', 'Teacher'), ('student', 'Student')], max_length=10)),
+                ('class_obj', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='lesson_access', to='school.class')),
+                ('lesson', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='user_access', to='school.lesson')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='lesson_access', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['class_obj', 'role'], name='school_less_class_o_edea2d_idx')],
+                'constraints': [models.UniqueConstraint(fields=('user', 'lesson', 'class_obj', 'role'), name='unique_lesson_access')],
+            },
+        ),
+        migrations.RunPython(populate_lesson_access, migrations.RunPython.noop),
+    ]
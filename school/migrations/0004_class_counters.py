@@ -0,0 +1,62 @@
+# Generated by Django 5.2.18 on 2026-10-18 18:35
+
+from django.db import migrations, models
+from django.db.models import Count, IntegerField, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+
+def count_subquery(queryset, column):
+    counts = (
+        queryset.filter(**{column: OuterRef('pk')})
+        .order_by()
+        .values(column)
+        .annotate(count=Count('*'))
+        .values('count')
+    )
+    return Coalesce(Subquery(counts, output_field=IntegerField()), Value(0))
+
+
+def populate_counters(apps, schema_editor):
+    Class = apps.get_model('school', 'Class')
+    Assignment = apps.get_model('assignment', 'Assignment')
+    Class.objects.update(
+        student_count=count_subquery(Class.students.through.objects, 'class_id'),
+        lesson_count=count_subquery(Class.lessons.through.objects, 'class_id'),
+        assignment_count=count_subquery(Assignment.objects, 'class_obj_id'),
+        open_assignment_count=count_subquery(
+            Assignment.objects.filter(deadline__gt=timezone.now()), 'class_obj_id'
+        ),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('school', '0003_lessonaccess'),
+        ('assignment', '0004_assignment_assignment__created_c8a0ff_idx_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='class',
+            name='assignment_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='class',
+            name='lesson_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='class',
+            name='open_assignment_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='class',
+            name='student_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(populate_counters, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,71 @@
+# Generated by Django 5.2.18 on 2026-10-18 18:37
+
+from django.db import migrations
+from django.db.models import Count, IntegerField, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+
+
+def merge_duplicate_lessons(apps, schema_editor):
+    """
+    Normalize lesson names and fold lessons whose names differ only in case
+    or whitespace into the oldest one, moving their classes, assignments and
+    access rows over, so 0006 can create the unique index.
+    """
+    Lesson = apps.get_model('school', 'Lesson')
+    Class = apps.get_model('school', 'Class')
+    LessonAccess = apps.get_model('school', 'LessonAccess')
+    Assignment = apps.get_model('assignment', 'Assignment')
+    ClassLesson = Class.lessons.through
+
+    kept = {}
+    merged = {}
+    for lesson in Lesson.objects.order_by('pk'):
+        name = ' '.join(lesson.name.split())
+        key = name.lower()
+        if key in kept:
+            merged[lesson.pk] = kept[key]
+            continue
+        kept[key] = lesson.pk
+        if name != lesson.name:
+            Lesson.objects.filter(pk=lesson.pk).update(name=name)
+    if not merged:
+        return
+
+    classes = set()
+    for duplicate_id, lesson_id in merged.items():
+        Assignment.objects.filter(lesson_id=duplicate_id).update(lesson_id=lesson_id)
+        for row in ClassLesson.objects.filter(lesson_id=duplicate_id):
+            classes.add(row.class_id)
+            ClassLesson.objects.get_or_create(
+                class_id=row.class_id, lesson_id=lesson_id
+            )
+        for row in LessonAccess.objects.filter(lesson_id=duplicate_id):
+            LessonAccess.objects.get_or_create(
+                user_id=row.user_id,
+                lesson_id=lesson_id,
+                class_obj_id=row.class_obj_id,
+                role=row.role,
+            )
+    Lesson.objects.filter(pk__in=merged).delete()
+
+    counts = (
+        ClassLesson.objects.filter(class_id=OuterRef('pk'))
+        .order_by()
+        .values('class_id')
+        .annotate(count=Count('*'))
+        .values('count')
+    )
+    Class.objects.filter(pk__in=classes).update(
+        lesson_count=Coalesce(Subquery(counts, output_field=IntegerField()), Value(0))
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('school', '0004_class_counters'),
+    ]
+
+    operations = [
+        migrations.RunPython(merge_duplicate_lessons, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 5.2.18 on 2026-10-18 18:37
+
+import django.db.models.functions.text
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    # Separate from the merge in 0005: on PostgreSQL its deletes leave
+    # deferred trigger events that block creating the index in the same
+    # transaction.
+
+    dependencies = [
+        ('school', '0005_merge_duplicate_lessons'),
+    ]
+
+    operations = [
+        migrations.AddConstraint(
+            model_name='lesson',
+            constraint=models.UniqueConstraint(django.db.models.functions.text.Lower('name'), name='unique_lesson_name'),
+        ),
+    ]
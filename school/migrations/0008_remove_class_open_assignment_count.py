@@ -0,0 +1,17 @@
+# Generated by Django 5.2.18 on 2026-10-18 19:08
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('school', '0007_syncversion'),
+    ]
+
+    operations = [
+        migrations.RemoveField(
+            model_name='class',
+            name='open_assignment_count',
+        ),
+    ]
@@ -1,8 +1,14 @@
 from django.db import models
+from django.db.models.functions import Lower
 
 from user.models import *
 
 
+def normalize_lesson_name(name):
+    """Collapse runs of whitespace so "Math  I " and "Math I" are one lesson."""
+    return " ".join(name.split())
+
+
 class School(models.Model):
     name = models.CharField(max_length=255)
     manager = models.OneToOneField(
@@ -16,6 +22,15 @@ class School(models.Model):
 class Lesson(models.Model):
     name = models.CharField(max_length=255)
 
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(Lower("name"), name="unique_lesson_name")
+        ]
+
+    def save(self, *args, **kwargs):
+        self.name = normalize_lesson_name(self.name)
+        super().save(*args, **kwargs)
+
     def __str__(self):
         return self.name
 
@@ -28,6 +43,59 @@ class Class(models.Model):
     school = models.ForeignKey(School, on_delete=models.CASCADE, related_name="classes")
     students = models.ManyToManyField(User, related_name="class_students", blank=True)
     lessons = models.ManyToManyField(Lesson, related_name="class_lessons", blank=True)
+    # Maintained by the signals in school/signals.py and assignment/signals.py;
+    # `reconcile_class_counters` recomputes them.
+    student_count = models.PositiveIntegerField(default=0, editable=False)
+    lesson_count = models.PositiveIntegerField(default=0, editable=False)
+    assignment_count = models.PositiveIntegerField(default=0, editable=False)
+    # Open assignments are counted when read, see `with_open_assignment_count`.
+
+    def __str__(self):
+        # Admin querysets select school and teacher, so this costs no query.
+        teacher = self.teacher.get_full_name() if self.teacher_id else "-"
+        return f"{self.name} - {self.school.name} - {teacher}"
+
+
+class LessonAccess(models.Model):
+    """
+    Denormalized (user, class, lesson) rows for teachers and students of a
+    class, maintained by the signals in school/signals.py.
+    """
+
+    ROLES = (
+        ("teacher", "Teacher"),
+        ("student", "Student"),
+    )
+    user = models.ForeignKey(
+        User, on_delete=models.CASCADE, related_name="lesson_access"
+    )
+    lesson = models.ForeignKey(
+        Lesson, on_delete=models.CASCADE, related_name="user_access"
+    )
+    class_obj = models.ForeignKey(
+        Class, on_delete=models.CASCADE, related_name="lesson_access"
+    )
+    role = models.CharField(max_length=10, choices=ROLES)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["user", "lesson", "class_obj", "role"],
+                name="unique_lesson_access",
+            )
+        ]
+        indexes = [models.Index(fields=["class_obj", "role"])]
+
+
+class SyncVersion(models.Model):
+    """
+    Version counter of a process-local cache (school/membership.py and
+    school/lessons.py). It is kept in the database, not the cache backend,
+    so every worker sees every bump.
+    """
+
+    key = models.CharField(max_length=100, primary_key=True)
+    version = models.BigIntegerField(default=0)
 
     def __str__(self):
-        return f"{self.name} - {self.school.name} - {self.teacher.get_full_name}"
+        return f"{self.key} - {self.version}"
@@ -1,6 +1,7 @@
 from rest_framework.permissions import BasePermission
 
 from .models import *
+from .principal import get_principal
 
 
 class IsTeacher(BasePermission):
@@ -37,16 +38,12 @@ class IsTeacherOfClass(BasePermission):
         class_id = view.kwargs.get("pk")
         if not class_id:
             return False
-        try:
-            class_obj = Class.objects.get(id=class_id)
-            return request.user == class_obj.teacher
-        except Class.DoesNotExist:
-            return False
+        return get_principal(request).teaches(class_id)
 
 
 class IsManagerOfSchool(BasePermission):
     def has_permission(self, request, view):
-        return hasattr(request.user, "school_manager")
+        return get_principal(request).managed_school_id is not None
 
 
 class IsManagerOfClass(BasePermission):
@@ -54,11 +51,7 @@ class IsManagerOfClass(BasePermission):
         class_id = view.kwargs.get("pk")
         if not class_id:
             return False
-        try:
-            class_obj = Class.objects.get(id=class_id)
-            return request.user == class_obj.school.manager
-        except Class.DoesNotExist:
-            return False
+        return get_principal(request).manages_class(class_id)
 
 
 class IsStudentOfClass(BasePermission):
@@ -66,9 +59,4 @@ class IsStudentOfClass(BasePermission):
         class_id = view.kwargs.get("pk")
         if not class_id:
             return False
-
-        try:
-            class_obj = Class.objects.get(id=class_id)
-            return class_obj.students.filter(id=request.user.id).exists()
-        except Class.DoesNotExist:
-            return False
+        return get_principal(request).enrolled_in(class_id)
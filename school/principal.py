@@ -0,0 +1,136 @@
+from django.utils.functional import cached_property
+
+from .membership import enrollment_index
+from .models import *
+
+
+class Principal:
+    """
+    Memberships of the requesting user, loaded lazily and at most once per
+    request. Permission classes and `get_queryset` methods consult this
+    instead of querying classes and schools again for every check; class
+    memberships come from the process-wide `enrollment_index`.
+    """
+
+    def __init__(self, user):
+        self.user = user
+
+    @property
+    def user_type(self):
+        return getattr(self.user, "user_type", None)
+
+    @cached_property
+    def managed_school_id(self):
+        if self.user_type != "manager":
+            return None
+        return (
+            School.objects.filter(manager_id=self.user.id)
+            .values_list("id", flat=True)
+            .first()
+        )
+
+    @cached_property
+    def managed_class_ids(self):
+        if self.managed_school_id is None:
+            return frozenset()
+        return frozenset(enrollment_index.classes_of_school(self.managed_school_id))
+
+    @cached_property
+    def _taught_classes(self):
+        if self.user_type != "teacher":
+            return {}
+        return {
+            class_id: enrollment_index.school_of(class_id)
+            for class_id in enrollment_index.classes_of_teacher(self.user.id)
+        }
+
+    @cached_property
+    def _enrolled_classes(self):
+        if self.user_type != "student":
+            return {}
+        return {
+            class_id: enrollment_index.school_of(class_id)
+            for class_id in enrollment_index.classes_of_student(self.user.id)
+        }
+
+    @cached_property
+    def taught_class_ids(self):
+        return frozenset(self._taught_classes)
+
+    @cached_property
+    def enrolled_class_ids(self):
+        return frozenset(self._enrolled_classes)
+
+    @cached_property
+    def school_ids(self):
+        school_ids = set(self._taught_classes.values())
+        school_ids.update(self._enrolled_classes.values())
+        if self.managed_school_id is not None:
+            school_ids.add(self.managed_school_id)
+        return frozenset(school_ids)
+
+    @cached_property
+    def lesson_ids(self):
+        if self.user_type not in ["teacher", "student"]:
+            return frozenset()
+        return frozenset(
+            LessonAccess.objects.filter(user_id=self.user.id).values_list(
+                "lesson_id", flat=True
+            )
+        )
+
+    @cached_property
+    def taught_lesson_ids(self):
+        if self.user_type != "teacher":
+            return frozenset()
+        return frozenset(
+            LessonAccess.objects.filter(
+                user_id=self.user.id, role="teacher"
+            ).values_list("lesson_id", flat=True)
+        )
+
+    def teaches(self, class_id):
+        class_id = to_id(class_id)
+        if self.user_type != "teacher" or class_id is None:
+            return False
+        return enrollment_index.teacher_of(class_id) == self.user.id
+
+    def enrolled_in(self, class_id):
+        class_id = to_id(class_id)
+        if self.user_type != "student" or class_id is None:
+            return False
+        return enrollment_index.is_student(class_id, self.user.id)
+
+    def manages_school(self, school_id):
+        school_id = to_id(school_id)
+        return school_id is not None and school_id == self.managed_school_id
+
+    def manages_class(self, class_id):
+        class_id = to_id(class_id)
+        if self.managed_school_id is None or class_id is None:
+            return False
+        return enrollment_index.school_of(class_id) == self.managed_school_id
+
+    def member_of_school(self, school_id):
+        return to_id(school_id) in self.school_ids
+
+
+def to_id(value):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def get_principal(request):
+    """
+    Return the `Principal` of the request, creating it on first use. It is
+    stored on the underlying `HttpRequest` so every permission class and the
+    view share the same instance.
+    """
+    http_request = getattr(request, "_request", request)
+    principal = getattr(http_request, "_principal", None)
+    if principal is None or principal.user is not request.user:
+        principal = Principal(request.user)
+        http_request._principal = principal
+    return principal
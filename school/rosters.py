@@ -0,0 +1,94 @@
+import hashlib
+import json
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.serializers.json import DjangoJSONEncoder
+
+from user.models import User
+from user.serializer import UserSerializer
+
+from . import membership
+from .lessons import lesson_catalog
+from .models import *
+
+VERSION_KEY = "school-roster-version:{}"
+ROSTER_KEY = "school-roster:{}:{}:{}"
+
+
+def build_students(school_id):
+    students = User.objects.filter(
+        class_students__school_id=school_id, user_type="student"
+    ).distinct()
+    return UserSerializer(students, many=True).data
+
+
+def build_teachers(school_id):
+    teachers = User.objects.filter(
+        class_teacher__school_id=school_id, user_type="teacher"
+    ).distinct()
+    return UserSerializer(teachers, many=True).data
+
+
+def build_lessons(school_id):
+    lesson_ids = Class.lessons.through.objects.filter(
+        class__school_id=school_id
+    ).values_list("lesson_id", flat=True)
+    return lesson_catalog.serialize(lesson_ids)
+
+
+BUILDERS = {
+    "students": build_students,
+    "teachers": build_teachers,
+    "lessons": build_lessons,
+}
+
+
+def get_version(school_id, key_format=VERSION_KEY):
+    """
+    Version of a school's rosters (or of another per-school key). Versions
+    are kept in the database (`SyncVersion`), not the cache backend, so a
+    bump in one worker reaches the cached entries of every worker.
+    """
+    return membership.get_version(key_format.format(school_id))
+
+
+def bump_versions(school_ids, key_format=VERSION_KEY):
+    membership.bump_versions(key_format.format(school_id) for school_id in school_ids)
+
+
+def get_roster(school_id, kind):
+    """
+    Return `(etag, data)` of a roster, building and caching it on a miss.
+    The strong ETag is a hash of the serialized roster.
+    """
+    key = ROSTER_KEY.format(school_id, kind, get_version(school_id))
+    entry = cache.get(key)
+    if entry is None:
+        data = json.loads(json.dumps(BUILDERS[kind](school_id), cls=DjangoJSONEncoder))
+        content = json.dumps(data, sort_keys=True).encode()
+        entry = (f'"{hashlib.sha256(content).hexdigest()[:32]}"', data)
+        cache.set(
+            key, entry, timeout=getattr(settings, "SCHOOL_ROSTER_CACHE_TIMEOUT", 3600)
+        )
+    return entry
+
+
+def school_ids_of_classes(class_ids):
+    return set(
+        Class.objects.filter(id__in=class_ids).values_list("school_id", flat=True)
+    )
+
+
+def school_ids_of_user(user_id):
+    return set(
+        Class.objects.filter(students=user_id).values_list("school_id", flat=True)
+    ) | set(
+        Class.objects.filter(teacher_id=user_id).values_list("school_id", flat=True)
+    )
+
+
+def school_ids_of_lesson(lesson_id):
+    return set(
+        Class.objects.filter(lessons=lesson_id).values_list("school_id", flat=True)
+    )
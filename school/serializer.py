@@ -1,12 +1,14 @@
 from rest_framework import serializers
 
+from schoolManagement.fieldsets import SparseFieldsMixin
 from user.models import User
 from user.serializer import *
 
+from .counters import open_assignments, prefetch_open_assignments
 from .models import *
 
 
-class SchoolSerializer(serializers.ModelSerializer):
+class SchoolSerializer(SparseFieldsMixin, serializers.ModelSerializer):
 
     class Meta:
         model = School
@@ -18,22 +20,44 @@ class SchoolSerializer(serializers.ModelSerializer):
         return value
 
 
-class LessonSerializer(serializers.ModelSerializer):
+class LessonSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     class Meta:
         model = Lesson
         fields = ["id", "name"]
 
 
-class ClassSerializer(serializers.ModelSerializer):
+class ClassSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     lessons = LessonSerializer(many=True, read_only=True)
     students = UserSerializer(many=True, read_only=True)
+    open_assignment_count = serializers.SerializerMethodField()
 
     class Meta:
         model = Class
-        fields = ["id", "name", "teacher", "school", "students", "lessons"]
-
-
-class StudentClassSerializer(serializers.ModelSerializer):
+        fields = [
+            "id",
+            "name",
+            "teacher",
+            "school",
+            "students",
+            "lessons",
+            "student_count",
+            "lesson_count",
+            "assignment_count",
+            "open_assignment_count",
+        ]
+        # Read when nested in another serializer, where the classes come
+        # without the annotation of `ClassViewSet`.
+        nested_prefetch = [prefetch_open_assignments()]
+
+    def get_open_assignment_count(self, obj):
+        if hasattr(obj, "open_assignment_count"):
+            return obj.open_assignment_count
+        if hasattr(obj, "open_assignments"):
+            return len(obj.open_assignments)
+        return open_assignments().filter(class_obj=obj).count()
+
+
+class StudentClassSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     lessons = LessonSerializer(many=True, read_only=True)
 
     class Meta:
@@ -54,6 +78,25 @@ class CreateClassSerializer(serializers.ModelSerializer):
         return data
 
 
+class BulkStudentsSerializer(serializers.Serializer):
+    national_ids = serializers.ListField(
+        child=serializers.RegexField(
+            r"^\d{10}$", error_messages={"invalid": "National id must be 10 digits"}
+        ),
+        allow_empty=True,
+        max_length=10000,
+    )
+
+
+class BulkLessonsSerializer(serializers.Serializer):
+    classes = serializers.ListField(
+        child=serializers.IntegerField(min_value=1), max_length=10000
+    )
+    names = serializers.ListField(
+        child=serializers.CharField(max_length=255), min_length=1, max_length=100
+    )
+
+
 class AddRemoveStudentClassSerializer(serializers.ModelSerializer):
     national_id = serializers.CharField(max_length=10)
 
@@ -0,0 +1,203 @@
+from django.db import transaction
+from django.db.models.signals import (
+    m2m_changed,
+    post_delete,
+    post_save,
+    pre_delete,
+    pre_save,
+)
+from django.dispatch import receiver
+
+from user.models import User
+
+from . import access, counters, rosters
+from .lessons import lesson_catalog
+from .membership import enrollment_index
+from .models import *
+
+# User fields shown in school rosters; saves touching only other fields
+# (e.g. last_login) leave the rosters alone.
+ROSTER_USER_FIELDS = {
+    "username",
+    "first_name",
+    "last_name",
+    "email",
+    "bio",
+    "user_type",
+}
+
+
+def changed_school_ids(instance, action, reverse, pk_set, of_reverse_instance):
+    """
+    School ids affected by an m2m change on Class. For `clear` from the
+    reverse side the ids are collected in `pre_clear`, before the rows go.
+    """
+    if not reverse:
+        return {instance.school_id}
+    if action == "pre_clear":
+        instance._cleared_school_ids = of_reverse_instance(instance.pk)
+    if action == "post_clear":
+        return getattr(instance, "_cleared_school_ids", set())
+    return rosters.school_ids_of_classes(pk_set or ())
+
+
+@receiver(m2m_changed, sender=Class.students.through)
+def sync_student_access(sender, instance, action, reverse, pk_set, **kwargs):
+    if action == "post_add":
+        if reverse:
+            access.grant(pk_set, [instance.pk], "student")
+            for class_id in pk_set:
+                enrollment_index.add_students(class_id, [instance.pk])
+        else:
+            access.grant([instance.pk], pk_set, "student")
+            enrollment_index.add_students(instance.pk, pk_set)
+    elif action == "post_remove":
+        if reverse:
+            access.revoke(user=instance, class_obj__in=pk_set, role="student")
+            enrollment_index.remove_enrollments(instance.pk, pk_set)
+        else:
+            access.revoke(class_obj=instance, user__in=pk_set, role="student")
+            enrollment_index.remove_students(instance.pk, pk_set)
+    elif action == "post_clear":
+        if reverse:
+            access.revoke(user=instance, role="student")
+            enrollment_index.remove_enrollments(instance.pk)
+        else:
+            access.revoke(class_obj=instance, role="student")
+            enrollment_index.remove_students(instance.pk)
+
+    school_ids = changed_school_ids(
+        instance, action, reverse, pk_set, rosters.school_ids_of_user
+    )
+    if action.startswith("post_"):
+        transaction.on_commit(lambda: rosters.bump_versions(school_ids))
+
+
+@receiver(m2m_changed, sender=Class.lessons.through)
+def sync_lesson_access(sender, instance, action, reverse, pk_set, **kwargs):
+    if action == "post_add":
+        if reverse:
+            for class_id in pk_set:
+                access.grant_lessons(class_id, [instance.pk])
+        else:
+            access.grant_lessons(instance.pk, pk_set)
+    elif action == "post_remove":
+        if reverse:
+            access.revoke(lesson=instance, class_obj__in=pk_set)
+        else:
+            access.revoke(class_obj=instance, lesson__in=pk_set)
+    elif action == "post_clear":
+        if reverse:
+            access.revoke(lesson=instance)
+        else:
+            access.revoke(class_obj=instance)
+
+    school_ids = changed_school_ids(
+        instance, action, reverse, pk_set, rosters.school_ids_of_lesson
+    )
+    if action.startswith("post_"):
+        transaction.on_commit(lambda: rosters.bump_versions(school_ids))
+
+
+@receiver(m2m_changed, sender=Class.students.through)
+def count_students(sender, instance, action, reverse, pk_set, **kwargs):
+    counters.track_m2m(
+        "student_count", "user_id", instance, action, reverse, pk_set, sender
+    )
+
+
+@receiver(m2m_changed, sender=Class.lessons.through)
+def count_lessons(sender, instance, action, reverse, pk_set, **kwargs):
+    counters.track_m2m(
+        "lesson_count", "lesson_id", instance, action, reverse, pk_set, sender
+    )
+
+
+@receiver(pre_save, sender=Class)
+def remember_teacher(sender, instance, update_fields=None, **kwargs):
+    if not instance.pk or (
+        update_fields and not {"teacher", "school"} & set(update_fields)
+    ):
+        instance._previous = (instance.teacher_id, instance.school_id)
+        return
+    instance._previous = (
+        Class.objects.filter(pk=instance.pk)
+        .values_list("teacher_id", "school_id")
+        .first()
+    ) or (None, None)
+
+
+@receiver(post_save, sender=Class)
+def sync_teacher_access(sender, instance, created, **kwargs):
+    previous_teacher_id, previous_school_id = getattr(
+        instance, "_previous", (None, None)
+    )
+    school_ids = {instance.school_id, previous_school_id} - {None}
+    transaction.on_commit(lambda: rosters.bump_versions(school_ids))
+    if created or (previous_teacher_id, previous_school_id) != (
+        instance.teacher_id,
+        instance.school_id,
+    ):
+        enrollment_index.set_class(
+            instance.pk, instance.school_id, instance.teacher_id
+        )
+    if created or previous_teacher_id == instance.teacher_id:
+        return
+    access.revoke(class_obj=instance, role="teacher")
+    if instance.teacher_id:
+        access.grant([instance.pk], [instance.teacher_id], "teacher")
+
+
+@receiver(post_delete, sender=Class)
+def bump_deleted_class_school(sender, instance, **kwargs):
+    transaction.on_commit(lambda: rosters.bump_versions([instance.school_id]))
+    enrollment_index.remove_class(instance.pk)
+
+
+@receiver(post_save, sender=User)
+def bump_user_schools(sender, instance, created, update_fields=None, **kwargs):
+    if created or (update_fields and not ROSTER_USER_FIELDS & set(update_fields)):
+        return
+    school_ids = rosters.school_ids_of_user(instance.pk)
+    transaction.on_commit(lambda: rosters.bump_versions(school_ids))
+
+
+@receiver(post_save, sender=Lesson)
+def bump_lesson_schools(sender, instance, created, **kwargs):
+    if not created:
+        school_ids = rosters.school_ids_of_lesson(instance.pk)
+        transaction.on_commit(lambda: rosters.bump_versions(school_ids))
+
+
+@receiver(pre_delete, sender=User)
+def remember_user_schools(sender, instance, **kwargs):
+    instance._school_ids = rosters.school_ids_of_user(instance.pk)
+    instance._class_changes = counters.m2m_changes(
+        Class.students.through, instance, True, None, "user_id"
+    )
+
+
+@receiver(pre_delete, sender=Lesson)
+def remember_lesson_schools(sender, instance, **kwargs):
+    instance._school_ids = rosters.school_ids_of_lesson(instance.pk)
+    instance._class_changes = counters.m2m_changes(
+        Class.lessons.through, instance, True, None, "lesson_id"
+    )
+
+
+@receiver(post_delete, sender=User)
+@receiver(post_delete, sender=Lesson)
+def bump_deleted_member_schools(sender, instance, **kwargs):
+    school_ids = getattr(instance, "_school_ids", ())
+    transaction.on_commit(lambda: rosters.bump_versions(school_ids))
+    counter = "student_count" if sender is User else "lesson_count"
+    changes = getattr(instance, "_class_changes", {})
+    counters.adjust(counter, {class_id: -n for class_id, n in changes.items()})
+    if sender is User:
+        enrollment_index.remove_user(instance.pk)
+
+
+@receiver(post_save, sender=Lesson)
+@receiver(post_delete, sender=Lesson)
+def invalidate_lesson_catalog(sender, **kwargs):
+    transaction.on_commit(lesson_catalog.invalidate)
@@ -1,10 +1,35 @@
+from array import array
+from datetime import timedelta
+from io import StringIO
+from types import SimpleNamespace
+
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import IntegrityError, connection, transaction
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
+from django.utils import timezone
 from rest_framework import status
+from rest_framework.request import Request
+from rest_framework.response import Response
 from rest_framework.test import APIClient, APIRequestFactory
 
+from assignment.models import Assignment, Solution
+from schoolManagement.testing import count_queries, without_silk
 from user.models import *
 
+from .counters import with_open_assignment_count
+from .gradebook import ArrowRenderer
+from .lessons import get_or_create_lessons, lesson_catalog
+from .membership import (
+    VERSION_KEY,
+    EnrollmentIndex,
+    PairSet,
+    bump_version,
+    enrollment_index,
+    get_version,
+)
 from .models import *
 from .permission import *
 from .serializer import *
@@ -89,3 +114,1085 @@ class SchoolViewSetTest(TestCase):
         response = self.client.delete(url)
         self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
         self.assertFalse(School.objects.filter(pk=self.school.pk).exists())
+
+
+@without_silk
+class PrincipalQueryCountTest(TestCase):
+    def setUp(self):
+        enrollment_index.clear()
+        lesson_catalog.clear()
+        self.client = APIClient()
+        self.factory = APIRequestFactory()
+        self.manager_user = User.objects.create_user(
+            username="manager",
+            email="manager@example.com",
+            password="managerpassword123",
+            user_type="manager",
+            national_id="0000000002",
+        )
+        self.teacher_user = User.objects.create_user(
+            username="teacher",
+            email="teacher@example.com",
+            password="teacherpassword123",
+            user_type="teacher",
+            national_id="0000000004",
+        )
+        self.school = School.objects.create(
+            name="Test School", manager=self.manager_user
+        )
+        self.class_obj = Class.objects.create(
+            name="Class A", school=self.school, teacher=self.teacher_user
+        )
+        self.class_obj.lessons.add(Lesson.objects.create(name="Math"))
+        lesson_catalog.load()
+
+    def test_class_lessons_by_teacher(self):
+        self.client.force_authenticate(user=self.teacher_user)
+        url = reverse("class-lessons", kwargs={"pk": self.class_obj.pk})
+
+        # class, lesson ids (names come from the lesson catalog)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        self.assertEqual(count_queries(queries), 2)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data[0]["name"], "Math")
+
+    def test_class_lessons_by_manager(self):
+        self.client.force_authenticate(user=self.manager_user)
+        url = reverse("class-lessons", kwargs={"pk": self.class_obj.pk})
+
+        # class filtered by an Exists on the managed school, lesson ids
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        self.assertEqual(count_queries(queries), 2)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_permission_checks_share_memberships(self):
+        request = Request(self.factory.get("/"))
+        request.user = self.teacher_user
+        view = SimpleNamespace(kwargs={"pk": str(self.class_obj.pk)})
+        permissions = [IsTeacherOfClass(), IsStudentOfClass(), IsManagerOfClass()]
+        enrollment_index.load()
+
+        # memberships are answered by the enrollment index
+        with CaptureQueriesContext(connection) as queries:
+            results = [
+                permission.has_permission(request, view)
+                for permission in permissions * 3
+            ]
+        self.assertEqual(count_queries(queries), 0)
+        self.assertEqual(results, [True, False, False] * 3)
+
+
+class LessonAccessTest(TestCase):
+    def setUp(self):
+        enrollment_index.clear()
+        lesson_catalog.clear()
+        self.client = APIClient()
+        self.manager_user = User.objects.create_user(
+            username="manager",
+            email="manager@example.com",
+            password="managerpassword123",
+            user_type="manager",
+            national_id="0000000002",
+        )
+        self.student_user = User.objects.create_user(
+            username="student",
+            email="student@example.com",
+            password="studentpassword123",
+            user_type="student",
+            national_id="0000000003",
+        )
+        self.teacher_user = User.objects.create_user(
+            username="teacher",
+            email="teacher@example.com",
+            password="teacherpassword123",
+            user_type="teacher",
+            national_id="0000000004",
+        )
+        self.school = School.objects.create(
+            name="Test School", manager=self.manager_user
+        )
+        self.class_obj = Class.objects.create(
+            name="Class A", school=self.school, teacher=self.teacher_user
+        )
+        self.math = Lesson.objects.create(name="Math")
+        self.physics = Lesson.objects.create(name="Physics")
+        self.class_obj.lessons.add(self.math, self.physics)
+        self.class_obj.students.add(self.student_user)
+
+    def my_lessons(self, user):
+        self.client.force_authenticate(user=user)
+        response = self.client.get(reverse("user-my-lessons"))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return sorted(lesson["name"] for lesson in response.data)
+
+    def test_my_lessons_for_teacher_and_student(self):
+        self.assertEqual(self.my_lessons(self.teacher_user), ["Math", "Physics"])
+        self.assertEqual(self.my_lessons(self.student_user), ["Math", "Physics"])
+
+    def test_access_follows_class_changes(self):
+        self.class_obj.lessons.remove(self.physics)
+        self.class_obj.students.remove(self.student_user)
+        self.assertEqual(self.my_lessons(self.teacher_user), ["Math"])
+        self.assertEqual(self.my_lessons(self.student_user), [])
+
+        other_teacher = User.objects.create_user(
+            username="teacher2",
+            email="teacher2@example.com",
+            password="teacherpassword123",
+            user_type="teacher",
+            national_id="0000000005",
+        )
+        self.class_obj.teacher = other_teacher
+        self.class_obj.save()
+        self.assertEqual(self.my_lessons(self.teacher_user), [])
+        self.assertEqual(self.my_lessons(other_teacher), ["Math"])
+
+    def test_rebuild(self):
+        expected = set(LessonAccess.objects.values_list("user", "lesson", "role"))
+        LessonAccess.objects.all().delete()
+        call_command("rebuild_lesson_access", stdout=StringIO())
+        self.assertEqual(
+            set(LessonAccess.objects.values_list("user", "lesson", "role")), expected
+        )
+        self.assertEqual(len(expected), 4)
+
+    def test_my_lessons_by_manager(self):
+        self.client.force_authenticate(user=self.manager_user)
+        response = self.client.get(reverse("user-my-lessons"))
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+
+@without_silk
+class SchoolRosterCacheTest(TestCase):
+    def setUp(self):
+        enrollment_index.clear()
+        lesson_catalog.clear()
+        cache.clear()
+        self.client = APIClient()
+        self.manager_user = User.objects.create_user(
+            username="manager",
+            email="manager@example.com",
+            password="managerpassword123",
+            user_type="manager",
+            national_id="0000000002",
+        )
+        self.student_user = User.objects.create_user(
+            username="student",
+            email="student@example.com",
+            password="studentpassword123",
+            user_type="student",
+            national_id="0000000003",
+        )
+        self.school = School.objects.create(
+            name="Test School", manager=self.manager_user
+        )
+        self.class_obj = Class.objects.create(name="Class A", school=self.school)
+        self.class_obj.students.add(self.student_user)
+        self.url = reverse("school-students", kwargs={"pk": self.school.pk})
+        self.client.force_authenticate(user=self.manager_user)
+
+    def test_not_modified(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([user["username"] for user in response.data], ["student"])
+
+        etag = response["ETag"]
+        # managed school and roster version, the roster comes from the cache
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(count_queries(queries), 2)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(response["ETag"], etag)
+
+    def test_changes_invalidate_roster(self):
+        etag = self.client.get(self.url)["ETag"]
+
+        other_student = User.objects.create_user(
+            username="student2",
+            email="student2@example.com",
+            password="studentpassword123",
+            user_type="student",
+            national_id="0000000005",
+        )
+        with self.captureOnCommitCallbacks(execute=True):
+            other_student.class_students.add(self.class_obj)
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertNotEqual(response["ETag"], etag)
+        self.assertEqual(len(response.data), 2)
+
+        etag = response["ETag"]
+        self.student_user.first_name = "Sara"
+        with self.captureOnCommitCallbacks(execute=True):
+            self.student_user.save()
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertIn("Sara", [user["first_name"] for user in response.data])
+
+    def test_rolled_back_change_keeps_roster(self):
+        etag = self.client.get(self.url)["ETag"]
+        with self.assertRaises(RuntimeError):
+            with transaction.atomic():
+                self.student_user.first_name = "Sara"
+                self.student_user.save()
+                raise RuntimeError
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+    def test_other_school_not_found(self):
+        other_school = School.objects.create(name="Other School")
+        url = reverse("school-teachers", kwargs={"pk": other_school.pk})
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+
+class BulkEnrollmentTest(TestCase):
+    def setUp(self):
+        enrollment_index.clear()
+        lesson_catalog.clear()
+        cache.clear()
+        self.client = APIClient()
+        self.teacher_user = User.objects.create_user(
+            username="teacher",
+            email="teacher@example.com",
+            password="teacherpassword123",
+            user_type="teacher",
+            national_id="0000000004",
+        )
+        self.school = School.objects.create(name="Test School")
+        self.class_obj = Class.objects.create(
+            name="Class A", school=self.school, teacher=self.teacher_user
+        )
+        self.class_obj.lessons.add(Lesson.objects.create(name="Math"))
+        self.students = User.objects.bulk_create(
+            User(
+                username=f"student{i}",
+                email=f"student{i}@example.com",
+                national_id=f"100000000{i}",
+                user_type="student",
+            )
+            for i in range(4)
+        )
+        self.client.force_authenticate(user=self.teacher_user)
+
+    def post(self, name, national_ids, method="post"):
+        url = reverse(name, kwargs={"pk": self.class_obj.pk})
+        return getattr(self.client, method)(
+            url, {"national_ids": national_ids}, format="json"
+        )
+
+    def enrolled(self):
+        return set(self.class_obj.students.values_list("national_id", flat=True))
+
+    def test_add_remove_and_set(self):
+        response = self.post(
+            "class-add-students", ["1000000000", "1000000001", "9999999999"]
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data["added"], 2)
+        self.assertEqual(response.data["unknown"], ["9999999999"])
+        self.assertEqual(self.enrolled(), {"1000000000", "1000000001"})
+
+        response = self.post("class-remove-students", ["1000000001", "1000000002"])
+        self.assertEqual(response.data["removed"], 1)
+        self.assertEqual(self.enrolled(), {"1000000000"})
+
+        response = self.post(
+            "class-set-students", ["1000000002", "1000000003"], method="put"
+        )
+        self.assertEqual(response.data, {"added": 2, "removed": 1, "unknown": []})
+        self.assertEqual(self.enrolled(), {"1000000002", "1000000003"})
+        self.assertEqual(
+            set(
+                LessonAccess.objects.filter(role="student").values_list(
+                    "user__national_id", flat=True
+                )
+            ),
+            {"1000000002", "1000000003"},
+        )
+
+    def test_requires_teacher_of_class(self):
+        other_teacher = User.objects.create_user(
+            username="teacher2",
+            email="teacher2@example.com",
+            password="teacherpassword123",
+            user_type="teacher",
+            national_id="0000000005",
+        )
+        self.client.force_authenticate(user=other_teacher)
+        response = self.post("class-add-students", ["1000000000"])
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+    def test_invalid_national_id(self):
+        response = self.post("class-add-students", ["12ab"])
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class EnrollmentIndexTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        enrollment_index.clear()
+        lesson_catalog.clear()
+        self.teacher_user = User.objects.create_user(
+            username="teacher",
+            email="teacher@example.com",
+            password="teacherpassword123",
+            user_type="teacher",
+            national_id="0000000004",
+        )
+        self.student_user = User.objects.create_user(
+            username="student",
+            email="student@example.com",
+            password="studentpassword123",
+            user_type="student",
+            national_id="0000000003",
+        )
+        self.school = School.objects.create(name="Test School")
+        self.class_obj = Class.objects.create(
+            name="Class A", school=self.school, teacher=self.teacher_user
+        )
+        self.class_obj.students.add(self.student_user)
+
+    def test_lookups_follow_changes(self):
+        index = enrollment_index
+        self.assertTrue(index.is_student(self.class_obj.pk, self.student_user.pk))
+        self.assertEqual(index.teacher_of(self.class_obj.pk), self.teacher_user.pk)
+        self.assertEqual(index.classes_of_school(self.school.pk), [self.class_obj.pk])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.student_user.class_students.remove(self.class_obj)
+        self.assertFalse(index.is_student(self.class_obj.pk, self.student_user.pk))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            other_class = Class.objects.create(name="Class B", school=self.school)
+            other_class.students.add(self.student_user)
+        self.assertEqual(
+            index.classes_of_student(self.student_user.pk), [other_class.pk]
+        )
+
+        with self.captureOnCommitCallbacks(execute=True):
+            other_class.delete()
+        self.assertEqual(index.classes_of_student(self.student_user.pk), [])
+        self.assertEqual(index.classes_of_school(self.school.pk), [self.class_obj.pk])
+
+    def test_other_worker_resyncs_from_version(self):
+        worker = EnrollmentIndex()
+        worker.sync_interval = 0
+        worker.background_reload = False
+        self.assertTrue(worker.is_student(self.class_obj.pk, self.student_user.pk))
+
+        # this process applies the change in place and bumps the version
+        enrollment_index.load()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.class_obj.students.clear()
+        self.assertFalse(
+            enrollment_index.is_student(self.class_obj.pk, self.student_user.pk)
+        )
+        self.assertEqual(enrollment_index.version, get_version(VERSION_KEY))
+        self.assertFalse(worker.is_student(self.class_obj.pk, self.student_user.pk))
+
+    def test_reloads_after_max_age(self):
+        other_class = Class.objects.create(name="Class B", school=self.school)
+        self.assertFalse(
+            enrollment_index.is_student(other_class.pk, self.student_user.pk)
+        )
+        # written without signals, so the version does not move
+        Class.students.through.objects.create(
+            class_id=other_class.pk, user_id=self.student_user.pk
+        )
+        self.assertFalse(
+            enrollment_index.is_student(other_class.pk, self.student_user.pk)
+        )
+        enrollment_index.max_age = 0
+        enrollment_index.background_reload = False
+        self.addCleanup(setattr, enrollment_index, "max_age", 300)
+        self.addCleanup(setattr, enrollment_index, "background_reload", True)
+        self.assertTrue(
+            enrollment_index.is_student(other_class.pk, self.student_user.pk)
+        )
+
+    def test_lookups_do_not_wait_for_a_running_reload(self):
+        worker = EnrollmentIndex()
+        worker.sync_interval = 0
+        self.assertTrue(worker.is_student(self.class_obj.pk, self.student_user.pk))
+        Class.students.through.objects.all().delete()
+        bump_version(VERSION_KEY)
+
+        # another thread is loading: answer from the current snapshot
+        worker.load_lock.acquire()
+        with CaptureQueriesContext(connection) as queries:
+            self.assertTrue(
+                worker.is_student(self.class_obj.pk, self.student_user.pk)
+            )
+        self.assertEqual(count_queries(queries), 1)  # the version check
+        worker.load_lock.release()
+
+        worker.background_reload = False
+        self.assertFalse(worker.is_student(self.class_obj.pk, self.student_user.pk))
+
+    def test_rolled_back_changes_are_not_applied(self):
+        other_class = Class.objects.create(name="Class B", school=self.school)
+        self.assertFalse(
+            enrollment_index.is_student(other_class.pk, self.student_user.pk)
+        )
+        version = enrollment_index.version
+        with self.assertRaises(RuntimeError):
+            with transaction.atomic():
+                other_class.students.add(self.student_user)
+                raise RuntimeError
+        enrollment_index.sync()
+        self.assertFalse(
+            enrollment_index.is_student(other_class.pk, self.student_user.pk)
+        )
+        self.assertEqual(enrollment_index.version, version)
+
+    def test_pair_set_merges_pending_changes(self):
+        pairs = PairSet(array("Q"), merge_threshold=2)
+        for user_id in [5, 3, 9]:
+            pairs.add(1, user_id)
+        pairs.discard(1, 3)
+        self.assertEqual(sorted(pairs.lows(1)), [5, 9])
+        self.assertEqual(len(pairs), 2)
+        self.assertIn((1, 9), pairs)
+        self.assertNotIn((2, 9), pairs)
+
+
+@without_silk
+class SchoolDashboardTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        enrollment_index.clear()
+        lesson_catalog.clear()
+        self.client = APIClient()
+        self.manager_user = User.objects.create_user(
+            username="manager",
+            email="manager@example.com",
+            password="managerpassword123",
+            user_type="manager",
+            national_id="0000000002",
+        )
+        self.teacher_user = User.objects.create_user(
+            username="teacher",
+            email="teacher@example.com",
+            password="teacherpassword123",
+            user_type="teacher",
+            national_id="0000000004",
+        )
+        self.students = User.objects.bulk_create(
+            User(
+                username=f"student{i}",
+                email=f"student{i}@example.com",
+                national_id=f"100000000{i}",
+                user_type="student",
+            )
+            for i in range(3)
+        )
+        self.school = School.objects.create(
+            name="Test School", manager=self.manager_user
+        )
+        self.class_obj = Class.objects.create(
+            name="Class A", school=self.school, teacher=self.teacher_user
+        )
+        Class.objects.create(name="Class B", school=self.school)
+        self.math = Lesson.objects.create(name="Math")
+        self.class_obj.lessons.add(self.math)
+        self.class_obj.students.add(*self.students)
+        self.assignment = Assignment.objects.create(
+            title="Homework",
+            grade=100,
+            deadline=timezone.now(),
+            lesson=self.math,
+            class_obj=self.class_obj,
+        )
+        for student, grade in zip(self.students[:2], [80, 90]):
+            Solution.objects.create(
+                student=student, assignment=self.assignment, grade=grade
+            )
+        self.url = reverse("school-dashboard", kwargs={"pk": self.school.pk})
+        self.client.force_authenticate(user=self.manager_user)
+
+    def test_dashboard(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        data = response.data
+        self.assertEqual(
+            [data[key] for key in ["classes", "students", "teachers", "lessons"]],
+            [2, 3, 1, 1],
+        )
+        self.assertEqual(data["assignments"], 1)
+        self.assertEqual(data["submissions"], 2)
+        self.assertEqual(data["average_grade"], 85.0)
+        self.assertEqual(data["per_class"][0]["students"], 3)
+        self.assertIsNone(data["per_class"][1]["average_grade"])
+
+    def test_dashboard_is_cached_until_solutions_change(self):
+        self.client.get(self.url)
+        # managed school and the dashboard versions
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(self.url)
+        self.assertEqual(count_queries(queries), 2)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Solution.objects.create(
+                student=self.students[2], assignment=self.assignment, grade=100
+            )
+        response = self.client.get(self.url)
+        self.assertEqual(response.data["submissions"], 3)
+        self.assertEqual(response.data["average_grade"], 90.0)
+
+    def test_dashboard_of_other_school(self):
+        other_school = School.objects.create(name="Other School")
+        url = reverse("school-dashboard", kwargs={"pk": other_school.pk})
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+
+@without_silk
+class ClassCounterTest(TestCase):
+    def setUp(self):
+        enrollment_index.clear()
+        lesson_catalog.clear()
+        self.client = APIClient()
+        self.teacher_user = User.objects.create_user(
+            username="teacher",
+            email="teacher@example.com",
+            password="teacherpassword123",
+            user_type="teacher",
+            national_id="0000000004",
+        )
+        self.students = User.objects.bulk_create(
+            User(
+                username=f"student{i}",
+                email=f"student{i}@example.com",
+                national_id=f"100000000{i}",
+                user_type="student",
+            )
+            for i in range(4)
+        )
+        self.school = School.objects.create(name="Test School")
+        self.class_obj = Class.objects.create(
+            name="Class A", school=self.school, teacher=self.teacher_user
+        )
+        self.other_class = Class.objects.create(name="Class B", school=self.school)
+        self.math = Lesson.objects.create(name="Math")
+
+    def counters(self, class_obj):
+        class_obj = with_open_assignment_count(Class.objects).get(pk=class_obj.pk)
+        return [
+            class_obj.student_count,
+            class_obj.lesson_count,
+            class_obj.assignment_count,
+            class_obj.open_assignment_count,
+        ]
+
+    def test_counters_follow_changes(self):
+        self.class_obj.students.add(*self.students)
+        self.class_obj.students.remove(self.students[0], self.students[0])
+        self.students[1].class_students.add(self.other_class)
+        self.students[2].class_students.remove(self.class_obj, self.other_class)
+        self.class_obj.lessons.add(self.math)
+        self.math.class_lessons.add(self.other_class)
+        assignment = Assignment.objects.create(
+            title="Homework",
+            grade=100,
+            deadline=timezone.now() + timedelta(days=1),
+            lesson=self.math,
+            class_obj=self.class_obj,
+        )
+        self.assertEqual(self.counters(self.class_obj), [2, 1, 1, 1])
+        self.assertEqual(self.counters(self.other_class), [1, 1, 0, 0])
+
+        assignment.class_obj = self.other_class
+        assignment.deadline = timezone.now() - timedelta(days=1)
+        assignment.save()
+        self.students[3].delete()
+        self.math.class_lessons.clear()
+        self.assertEqual(self.counters(self.class_obj), [1, 0, 0, 0])
+        self.assertEqual(self.counters(self.other_class), [1, 0, 1, 0])
+
+        assignment.delete()
+        self.class_obj.students.clear()
+        self.assertEqual(self.counters(self.class_obj), [0, 0, 0, 0])
+        self.assertEqual(self.counters(self.other_class), [1, 0, 0, 0])
+
+    def test_drifted_counter_stays_at_zero(self):
+        self.class_obj.students.add(self.students[0])
+        # drifted: the count was lost without the enrollment being removed
+        Class.objects.filter(pk=self.class_obj.pk).update(student_count=0)
+        self.class_obj.students.remove(self.students[0])
+        self.assertEqual(self.counters(self.class_obj), [0, 0, 0, 0])
+
+    def test_reconcile(self):
+        self.class_obj.students.add(*self.students)
+        self.class_obj.lessons.add(self.math)
+        expected = self.counters(self.class_obj)
+        Class.objects.update(student_count=0, lesson_count=7)
+        call_command("reconcile_class_counters", batch_size=1, stdout=StringIO())
+        self.assertEqual(self.counters(self.class_obj), expected)
+        self.assertEqual(self.counters(self.other_class), [0, 0, 0, 0])
+
+    def test_list_ordered_by_counter(self):
+        self.other_class.students.add(*self.students)
+        admin_user = User.objects.create_superuser(
+            username="admin",
+            email="admin@example.com",
+            password="adminpassword123",
+            national_id="0000000001",
+        )
+        self.client.force_authenticate(user=admin_user)
+        response = self.client.get(
+            reverse("class-list"),
+            {"ordering": "-student_count", "student_count__gte": 1},
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            [row["name"] for row in response.data["results"]], ["Class B"]
+        )
+
+    def test_pages_through_tied_counters_without_offset(self):
+        Class.objects.bulk_create(
+            Class(name=f"Class {i}", school=self.school) for i in range(5)
+        )
+        self.other_class.students.add(*self.students)
+        admin_user = User.objects.create_superuser(
+            username="admin",
+            email="admin@example.com",
+            password="adminpassword123",
+            national_id="0000000001",
+        )
+        self.client.force_authenticate(user=admin_user)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(
+                reverse("class-list"), {"ordering": "-student_count", "limit": 2}
+            )
+            pages = [[row["id"] for row in response.data["results"]]]
+            while response.data["next"]:
+                response = self.client.get(response.data["next"])
+                pages.append([row["id"] for row in response.data["results"]])
+            backwards = []
+            while response.data["previous"]:
+                response = self.client.get(response.data["previous"])
+                page = [row["id"] for row in response.data["results"]]
+                backwards.insert(0, page)
+
+        ids = sum(pages, [])
+        self.assertEqual(ids[0], self.other_class.pk)
+        all_ids = Class.objects.values_list("pk", flat=True)
+        self.assertEqual(sorted(ids), sorted(all_ids))
+        self.assertEqual(backwards, pages[:-1])
+        self.assertFalse(any("OFFSET" in q["sql"] for q in queries.captured_queries))
+
+    def test_expired_assignments_stop_counting_as_open(self):
+        assignment = Assignment.objects.create(
+            title="Homework",
+            grade=100,
+            deadline=timezone.now() + timedelta(days=1),
+            lesson=self.math,
+            class_obj=self.class_obj,
+        )
+        admin_user = User.objects.create_superuser(
+            username="admin",
+            email="admin@example.com",
+            password="adminpassword123",
+            national_id="0000000001",
+        )
+        self.client.force_authenticate(user=admin_user)
+        params = {"ordering": "-open_assignment_count", "open_assignment_count__gte": 1}
+        response = self.client.get(reverse("class-list"), params)
+        self.assertEqual(
+            [row["open_assignment_count"] for row in response.data["results"]], [1]
+        )
+
+        # The deadline passing is not a write.
+        Assignment.objects.filter(pk=assignment.pk).update(
+            deadline=timezone.now() - timedelta(minutes=1)
+        )
+        response = self.client.get(reverse("class-list"), params)
+        self.assertEqual(response.data["results"], [])
+        self.client.force_authenticate(user=self.teacher_user)
+        response = self.client.get(
+            reverse("assignment-detail", args=[assignment.pk]), {"expand": "class_obj"}
+        )
+        self.assertEqual(response.data["class_obj"]["open_assignment_count"], 0)
+        self.assertEqual(self.counters(self.class_obj), [0, 0, 1, 0])
+
+
+class LessonCatalogTest(TestCase):
+    def setUp(self):
+        enrollment_index.clear()
+        lesson_catalog.clear()
+        self.client = APIClient()
+        self.manager_user = User.objects.create_user(
+            username="manager",
+            email="manager@example.com",
+            password="managerpassword123",
+            user_type="manager",
+            national_id="0000000002",
+        )
+        self.teacher_user = User.objects.create_user(
+            username="teacher",
+            email="teacher@example.com",
+            password="teacherpassword123",
+            user_type="teacher",
+            national_id="0000000004",
+        )
+        self.school = School.objects.create(
+            name="Test School", manager=self.manager_user
+        )
+        self.other_school = School.objects.create(name="Other School")
+        self.class_a = Class.objects.create(
+            name="Class A", school=self.school, teacher=self.teacher_user
+        )
+        self.class_b = Class.objects.create(name="Class B", school=self.school)
+        self.other_class = Class.objects.create(
+            name="Class C", school=self.other_school
+        )
+        self.math = Lesson.objects.create(name="  Math ")
+
+    def test_names_are_normalized_and_unique(self):
+        self.assertEqual(self.math.name, "Math")
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            Lesson.objects.create(name="MATH")
+        lessons = get_or_create_lessons(["math", "Physics  I", "physics i"])
+        self.assertEqual(sorted(lessons.values()), ["Math", "Physics I"])
+        self.assertEqual(Lesson.objects.count(), 2)
+        self.assertEqual(
+            get_or_create_lessons(["PHYSICS I"]).keys(),
+            {Lesson.objects.get(name="Physics I").pk},
+        )
+
+    def test_add_lesson(self):
+        self.client.force_authenticate(user=self.manager_user)
+        url = reverse("class-add-lesson", kwargs={"pk": self.class_a.pk})
+        response = self.client.post(url, {"name": "math"})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        response = self.client.post(url, {"name": "MATH "})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(list(self.class_a.lessons.all()), [self.math])
+
+        self.client.force_authenticate(user=self.teacher_user)
+        response = self.client.post(url, {"name": "Physics"})
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+    def test_assign_lessons(self):
+        self.class_a.lessons.add(self.math)
+        self.class_a.students.add(
+            User.objects.create_user(
+                username="student",
+                email="student@example.com",
+                password="studentpassword123",
+                user_type="student",
+                national_id="1000000000",
+            )
+        )
+        url = reverse("class-assign-lessons")
+        data = {
+            "classes": [self.class_a.pk, self.class_b.pk],
+            "names": ["Math", "Art"],
+        }
+
+        self.client.force_authenticate(user=self.manager_user)
+        response = self.client.post(
+            url, {**data, "classes": [self.class_a.pk, self.other_class.pk]}
+        )
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+        response = self.client.post(url, data)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data["added"], 3)
+        self.assertEqual(
+            sorted(lesson["name"] for lesson in response.data["lessons"]),
+            ["Art", "Math"],
+        )
+
+        art = Lesson.objects.get(name="Art")
+        self.assertEqual(
+            set(self.class_b.lessons.values_list("name", flat=True)), {"Math", "Art"}
+        )
+        self.class_a.refresh_from_db()
+        self.assertEqual(self.class_a.lesson_count, 2)
+        self.assertEqual(
+            set(LessonAccess.objects.filter(lesson=art).values_list("user", "role")),
+            {
+                (self.teacher_user.pk, "teacher"),
+                (self.class_a.students.get().pk, "student"),
+            },
+        )
+
+    def test_catalog_serves_lesson_lists(self):
+        self.class_a.lessons.add(self.math)
+        self.client.force_authenticate(user=self.manager_user)
+        url = reverse("school-lessons", kwargs={"pk": self.school.pk})
+        response = self.client.get(url)
+        self.assertEqual(response.data, [{"id": self.math.pk, "name": "Math"}])
+
+        # a lesson another worker created is picked up on a miss
+        physics = Lesson.objects.create(name="Physics")
+        self.assertEqual(
+            lesson_catalog.serialize([physics.pk]),
+            [{"id": physics.pk, "name": "Physics"}],
+        )
+        self.math.name = "Algebra"
+        self.math.save()
+        lesson_catalog.invalidate()
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(lesson_catalog.find(" algebra"), self.math.pk)
+            self.assertIsNone(lesson_catalog.find("Math"))
+        # one reload: the version and the lessons
+        self.assertEqual(count_queries(queries), 2)
+
+
+@without_silk
+class SchoolAdminTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        enrollment_index.clear()
+        lesson_catalog.clear()
+        self.admin_user = User.objects.create_superuser(
+            username="admin",
+            email="admin@example.com",
+            password="adminpassword123",
+            national_id="0000000001",
+        )
+        self.client.force_login(self.admin_user)
+        self.teachers = [
+            User.objects.create_user(
+                username=f"teacher{i}",
+                email=f"teacher{i}@example.com",
+                password="teacherpassword123",
+                user_type="teacher",
+                national_id=f"200000000{i}",
+            )
+            for i in range(3)
+        ]
+        self.students = User.objects.bulk_create(
+            User(
+                username=f"student{i}",
+                email=f"student{i}@example.com",
+                national_id=f"100000000{i}",
+                user_type="student",
+            )
+            for i in range(3)
+        )
+        self.school = School.objects.create(name="Test School")
+
+    def create_classes(self, count):
+        return [
+            Class.objects.create(
+                name=f"Class {i}",
+                school=School.objects.create(name=f"School {i}"),
+                teacher=self.teachers[i % len(self.teachers)],
+            )
+            for i in range(count)
+        ]
+
+    def changelist_queries(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse("admin:school_class_changelist"))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return count_queries(queries)
+
+    def test_changelist_queries_do_not_grow_with_rows(self):
+        self.create_classes(2)
+        few = self.changelist_queries()
+        self.create_classes(6)
+        self.assertEqual(self.changelist_queries(), few)
+
+    def test_move_students(self):
+        source, other, target = self.create_classes(3)
+        source.students.add(*self.students[:2])
+        other.students.add(self.students[2])
+        target.students.add(self.students[0])
+        response = self.client.post(
+            reverse("admin:school_class_changelist"),
+            {
+                "action": "move_students",
+                "_selected_action": [source.pk, other.pk],
+                "target_class": target.pk,
+            },
+        )
+        self.assertEqual(response.status_code, status.HTTP_302_FOUND)
+        self.assertEqual(set(target.students.all()), set(self.students))
+        counts = dict(Class.objects.values_list("id", "student_count"))
+        self.assertEqual([counts[c.pk] for c in [source, other, target]], [0, 0, 3])
+        self.assertTrue(enrollment_index.is_student(target.pk, self.students[1].pk))
+        self.assertFalse(enrollment_index.is_student(source.pk, self.students[1].pk))
+        self.assertFalse(
+            LessonAccess.objects.filter(class_obj__in=[source, other]).exists()
+        )
+
+    def test_teacher_autocomplete_offers_teachers(self):
+        response = self.client.get(
+            reverse("admin:autocomplete"),
+            {
+                "app_label": "school",
+                "model_name": "class",
+                "field_name": "teacher",
+                "term": "",
+            },
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            {int(result["id"]) for result in response.json()["results"]},
+            {teacher.pk for teacher in self.teachers},
+        )
+
+
+class GradebookTest(TestCase):
+    def setUp(self):
+        # Versions roll back with each test; cached entries do not.
+        cache.clear()
+        enrollment_index.clear()
+        self.client = APIClient()
+        self.teacher_user = User.objects.create_user(
+            username="teacher",
+            email="teacher@example.com",
+            password="teacherpassword123",
+            user_type="teacher",
+            national_id="0000000004",
+        )
+        self.other_teacher = User.objects.create_user(
+            username="other",
+            email="other@example.com",
+            password="teacherpassword123",
+            user_type="teacher",
+            national_id="0000000005",
+        )
+        self.students = User.objects.bulk_create(
+            User(
+                username=f"student{i}",
+                email=f"student{i}@example.com",
+                national_id=f"100000000{i}",
+                user_type="student",
+                last_name=name,
+            )
+            for i, name in enumerate(["B", "A", "C"])
+        )
+        school = School.objects.create(name="Test School")
+        self.class_obj = Class.objects.create(
+            name="Class A", school=school, teacher=self.teacher_user
+        )
+        self.class_obj.students.add(*self.students[:2])
+        math = Lesson.objects.create(name="Math")
+        now = timezone.now()
+        self.assignments = [
+            Assignment.objects.create(
+                title=f"Homework {i}",
+                grade=20,
+                deadline=now + timedelta(days=2 - i),
+                lesson=math,
+                class_obj=self.class_obj,
+            )
+            for i in range(2)
+        ]
+
+    def solve(self, student, assignment, grade):
+        with self.captureOnCommitCallbacks(execute=True):
+            Solution.objects.create(
+                student=student, assignment=assignment, grade=grade
+            )
+
+    def test_gradebook_matrix(self):
+        first, second = self.students[:2]
+        self.solve(first, self.assignments[0], 10)
+        self.solve(first, self.assignments[0], 12.5)
+        self.solve(second, self.assignments[1], 18)
+        # no longer enrolled
+        self.solve(self.students[2], self.assignments[1], 7)
+
+        self.client.force_authenticate(user=self.teacher_user)
+        url = reverse("class-gradebook", kwargs={"pk": self.class_obj.pk})
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        data = response.json()
+        self.assertEqual(data["students"]["id"], [second.pk, first.pk])
+        self.assertEqual(
+            data["assignments"]["id"], [a.pk for a in reversed(self.assignments)]
+        )
+        self.assertEqual(data["assignments"]["grade"], [20.0, 20.0])
+        self.assertEqual(data["rows"], [0, 1])
+        self.assertEqual(data["columns"], [0, 1])
+        self.assertEqual(data["values"], [18.0, 12.5])
+
+    def test_gradebook_permissions(self):
+        url = reverse("class-gradebook", kwargs={"pk": self.class_obj.pk})
+        self.client.force_authenticate(user=self.other_teacher)
+        self.assertEqual(self.client.get(url).status_code, status.HTTP_403_FORBIDDEN)
+        self.client.force_authenticate(user=self.students[0])
+        self.assertEqual(self.client.get(url).status_code, status.HTTP_403_FORBIDDEN)
+
+    def test_empty_gradebook(self):
+        empty = Class.objects.create(
+            name="Empty", school=self.class_obj.school, teacher=self.teacher_user
+        )
+        self.client.force_authenticate(user=self.teacher_user)
+        response = self.client.get(reverse("class-gradebook", kwargs={"pk": empty.pk}))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.json()["students"]["id"], [])
+        self.assertEqual(response.json()["values"], [])
+
+    def test_arrow_renderer_sends_errors_as_json(self):
+        response = Response({"detail": "Not found."}, status=404)
+        response.exception = True
+        body = ArrowRenderer().render(
+            response.data, renderer_context={"response": response}
+        )
+        self.assertEqual(response["Content-Type"], "application/json")
+        self.assertEqual(body, b'{"detail": "Not found."}')
+
+
+@without_silk
+class GradeStatsTest(TestCase):
+    setUp = GradebookTest.setUp
+    solve = GradebookTest.solve
+
+    def test_grade_stats(self):
+        first, second = self.students[:2]
+        homework, quiz = self.assignments
+        self.solve(first, homework, 10)
+        self.solve(second, homework, 15)
+        self.solve(second, quiz, 18)
+
+        self.client.force_authenticate(user=self.teacher_user)
+        url = reverse("class-grade-stats", kwargs={"pk": self.class_obj.pk})
+        data = self.client.get(url).json()
+        assignments = data["assignments"]
+        self.assertEqual(assignments["id"], [homework.pk, quiz.pk])
+        self.assertEqual(assignments["mean"], [62.5, 90.0])
+        self.assertEqual(assignments["std"], [12.5, 0.0])
+        self.assertEqual(assignments["median"], [62.5, 90.0])
+        self.assertEqual(assignments["p25"], [56.25, 90.0])
+        self.assertEqual(assignments["histogram"][0][5], 1)
+        self.assertEqual(assignments["histogram"][0][7], 1)
+        self.assertEqual(data["classes"]["mean"], [71.67])
+        self.assertEqual(data["lessons"]["count"], [3])
+        self.assertEqual(data["students"]["id"], [first.pk, second.pk])
+        self.assertEqual(data["students"]["mean_z"], [-1.0, 0.5])
+
+        url = f"/assignment/assignments/{homework.pk}/stats/"
+        with CaptureQueriesContext(connection) as queries:
+            data = self.client.get(url).json()
+        self.assertEqual(data["mean"], 62.5)
+        self.assertEqual(
+            data["students"],
+            {"id": [first.pk, second.pk], "score": [50.0, 75.0], "z": [-1.0, 1.0]},
+        )
+        # the assignment's class and the grades version; statistics come from
+        # the cache
+        self.assertEqual(count_queries(queries), 2)
+
+        self.solve(first, quiz, 20)
+        data = self.client.get(url.replace(str(homework.pk), str(quiz.pk))).json()
+        self.assertEqual(data["count"], 2)
+        self.assertEqual(data["mean"], 95.0)
+
+    def test_grade_stats_permissions(self):
+        self.client.force_authenticate(user=self.other_teacher)
+        url = f"/assignment/assignments/{self.assignments[0].pk}/stats/"
+        self.assertEqual(self.client.get(url).status_code, status.HTTP_403_FORBIDDEN)
+        url = reverse("class-grade-stats", kwargs={"pk": self.class_obj.pk})
+        self.assertEqual(self.client.get(url).status_code, status.HTTP_403_FORBIDDEN)
+        self.client.force_authenticate(user=self.teacher_user)
+        data = self.client.get(url).json()
+        self.assertEqual(data["assignments"]["mean"], [])
@@ -1,24 +1,38 @@
+from django.utils.cache import parse_etags
+from django_filters.rest_framework import DjangoFilterBackend
 from drf_yasg.utils import swagger_auto_schema
 from rest_framework import generics, status, viewsets
+from rest_framework.filters import OrderingFilter
 from rest_framework.decorators import *
 from rest_framework.permissions import *
 from rest_framework.response import *
 from rest_framework.views import *
 from rest_framework_simplejwt.tokens import RefreshToken
 
+from assignment.analytics import class_stats
+from schoolManagement.queryplan import QueryPlanMixin
 from user.models import *
 from user.serializer import *
 
+from .counters import with_open_assignment_count
+from .dashboard import get_dashboard
+from .enrollment import add_lessons_to_classes, sync_students
 from .filters import *
+from .gradebook import RENDERERS as GRADEBOOK_RENDERERS
+from .gradebook import build_gradebook
+from .lessons import lesson_catalog
 from .models import *
 from .permission import *
+from .principal import get_principal, to_id
+from .rosters import get_roster
 from .serializer import *
 
 
-class SchoolViewSet(viewsets.ModelViewSet):
+class SchoolViewSet(QueryPlanMixin, viewsets.ModelViewSet):
     permission_classes = [IsAuthenticated]
     queryset = School.objects.all()
     serializer_class = SchoolSerializer
+    filter_backends = [DjangoFilterBackend, SchoolAccessFilterBackend]
 
     def get_permissions(self):
         if self.action in ["create", "update", "partial_update", "destroy"]:
@@ -26,13 +40,51 @@ class SchoolViewSet(viewsets.ModelViewSet):
         permission_classes = [IsAuthenticated]
         return [permission() for permission in permission_classes]
 
-    def get_queryset(self):
-        user = self.request.user
-        if user.is_staff:
-            return School.objects.all()
-        elif user.user_type == "manager":
-            return School.objects.filter(manager=user)
-        return School.objects.none()
+    def get_school_id(self, request, pk):
+        """Id of a school the user administers or manages, else None."""
+        school_id = to_id(pk)
+        if school_id is None:
+            return None
+        if request.user.is_staff:
+            found = School.objects.filter(pk=school_id).exists()
+        else:
+            found = get_principal(request).manages_school(school_id)
+        return school_id if found else None
+
+    def roster(self, request, pk, kind):
+        """
+        Serve a cached roster of the school with a strong ETag, answering
+        304 when the client already holds the current version.
+        """
+        school_id = self.get_school_id(request, pk)
+        if school_id is None:
+            return Response(
+                {"detail": "School not found."}, status=status.HTTP_404_NOT_FOUND
+            )
+
+        etag, data = get_roster(school_id, kind)
+        headers = {"ETag": etag}
+        if_none_match = parse_etags(request.headers.get("If-None-Match", ""))
+        if "*" in if_none_match or etag in [
+            tag.removeprefix("W/") for tag in if_none_match
+        ]:
+            return Response(status=status.HTTP_304_NOT_MODIFIED, headers=headers)
+        return Response(data, status=status.HTTP_200_OK, headers=headers)
+
+    @swagger_auto_schema(
+        operation_description="Counts and grade averages of a school by manager."
+    )
+    @action(detail=True, methods=["get"], permission_classes=[IsManagerOfSchool])
+    def dashboard(self, request, pk=None):
+
+        # URL: /schools/{school_id}/dashboard/
+
+        school_id = self.get_school_id(request, pk)
+        if school_id is None:
+            return Response(
+                {"detail": "School not found."}, status=status.HTTP_404_NOT_FOUND
+            )
+        return Response(get_dashboard(school_id), status=status.HTTP_200_OK)
 
     @swagger_auto_schema(operation_description="See all students of school by manager")
     @action(
@@ -44,18 +96,7 @@ class SchoolViewSet(viewsets.ModelViewSet):
 
         # URL: /schools/{school_id}/students/
 
-        try:
-            school = self.get_object()
-            students = User.objects.filter(
-                class_students__school=school, user_type="student"
-            ).distinct()
-            serializer = UserSerializer(students, many=True)
-            return Response(serializer.data, status=status.HTTP_200_OK)
-
-        except School.DoesNotExist:
-            return Response(
-                {"detail": "School not found."}, status=status.HTTP_404_NOT_FOUND
-            )
+        return self.roster(requset, pk, "students")
 
     @swagger_auto_schema(operation_description="See all lessons of school by manager.")
     @action(
@@ -67,16 +108,7 @@ class SchoolViewSet(viewsets.ModelViewSet):
 
         # URL: /schools/{school_id}/lessons/
 
-        try:
-            school = self.get_object()
-            lessons = Lesson.objects.filter(class_lessons__school=school).distinct()
-            serializer = LessonSerializer(lessons, many=True)
-            return Response(serializer.data, status=status.HTTP_200_OK)
-
-        except School.DoesNotExist:
-            return Response(
-                {"detail": "The school not found."}, status=status.HTTP_404_NOT_FOUND
-            )
+        return self.roster(request, pk, "lessons")
 
     @swagger_auto_schema(operation_description="See all teachers of school by manager.")
     @action(detail=True, methods=["get"], permission_classes=[IsManagerOfSchool])
@@ -84,49 +116,46 @@ class SchoolViewSet(viewsets.ModelViewSet):
 
         # URL: /schools/{school_id}/teachers/
 
-        try:
-            school = self.get_object()
-            teachers = User.objects.filter(
-                class_teacher__school=school, user_type="teacher"
-            ).distinct()
-            serializer = UserSerializer(teachers, many=True)
-            return Response(serializer.data, status=status.HTTP_200_OK)
-
-        except School.DoesNotExist:
-            return Response(
-                {"detail": "The school not found."}, status=status.HTTP_404_NOT_FOUND
-            )
+        return self.roster(request, pk, "teachers")
 
 
-class ClassViewSet(viewsets.ModelViewSet):
+class ClassViewSet(QueryPlanMixin, viewsets.ModelViewSet):
     permission_classes = [IsAuthenticated]
     serializer_class = ClassSerializer
     queryset = Class.objects.all()
+    filter_backends = [DjangoFilterBackend, ClassAccessFilterBackend, OrderingFilter]
+    filterset_class = ClassFilter
+    ordering_fields = [
+        "name",
+        "student_count",
+        "lesson_count",
+        "assignment_count",
+        "open_assignment_count",
+    ]
 
     def get_permissions(self):
         if self.action in ["create", "update", "partial_update", "destroy"]:
             permission_classes = [IsAdminUser]
+        elif self.action in ["add_students", "remove_students", "set_students"]:
+            permission_classes = [IsAdminUser | IsTeacherOfClass]
+        elif self.action == "add_lesson":
+            permission_classes = [IsAdminUser | IsManagerOfClass]
+        elif self.action == "assign_lessons":
+            permission_classes = [IsAdminUser | IsManagerOfSchool]
+        elif self.action in ["gradebook", "grade_stats"]:
+            permission_classes = [IsAdminUser | IsTeacherOfClass | IsManagerOfClass]
         else:
             permission_classes = [IsAuthenticated, IsStudentReadOnly]
         return [permission() for permission in permission_classes]
 
+    def get_queryset(self):
+        return with_open_assignment_count(super().get_queryset())
+
     def get_serializer_class(self):
         if self.action in ["create", "update", "partial_update"]:
             return CreateClassSerializer
         return super().get_serializer_class()
 
-    def get_queryset(self):
-        user = self.request.user
-        if user.is_staff:
-            return Class.objects.all()
-        if user.user_type == "teacher":
-            return Class.objects.filter(teacher=self.request.user)
-        if user.user_type == "student":
-            return Class.objects.filter(students=user)
-        if user.user_type == "manager":
-            return Class.objects.filter(school__manager=user)
-        return super().get_queryset()
-
     def perform_create(self, serializer):
         return super().perform_create(serializer)
 
@@ -243,6 +272,77 @@ class ClassViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_404_NOT_FOUND,
             )
 
+    def change_students(self, request, pk, mode):
+        serializer = BulkStudentsSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        try:
+            result = sync_students(
+                to_id(pk), serializer.validated_data["national_ids"], mode
+            )
+        except Class.DoesNotExist:
+            return Response(
+                {"detail": "This class was not found."},
+                status=status.HTTP_404_NOT_FOUND,
+            )
+        return Response(result, status=status.HTTP_200_OK)
+
+    @swagger_auto_schema(
+        operation_description="Add many students to a class by teacher.",
+        request_body=BulkStudentsSerializer,
+    )
+    @action(
+        detail=True,
+        methods=["post"],
+        url_path="add-students",
+        url_name="add-students",
+    )
+    def add_students(self, request, pk=None):
+        """
+
+        URL: /classes/{class_id}/add-students/
+        Request Body: {"national_ids": [national_id, ...]}
+
+        """
+        return self.change_students(request, pk, "add")
+
+    @swagger_auto_schema(
+        operation_description="Remove many students from a class by teacher.",
+        request_body=BulkStudentsSerializer,
+    )
+    @action(
+        detail=True,
+        methods=["post"],
+        url_path="remove-students",
+        url_name="remove-students",
+    )
+    def remove_students(self, request, pk=None):
+        """
+
+        URL: /classes/{class_id}/remove-students/
+        Request Body: {"national_ids": [national_id, ...]}
+
+        """
+        return self.change_students(request, pk, "remove")
+
+    @swagger_auto_schema(
+        operation_description="Replace the students of a class by teacher.",
+        request_body=BulkStudentsSerializer,
+    )
+    @action(
+        detail=True,
+        methods=["put"],
+        url_path="set-students",
+        url_name="set-students",
+    )
+    def set_students(self, request, pk=None):
+        """
+
+        URL: /classes/{class_id}/set-students/
+        Request Body: {"national_ids": [national_id, ...]}
+
+        """
+        return self.change_students(request, pk, "set")
+
     @swagger_auto_schema(operation_description="See students of a class by teacher.")
     @action(
         detail=True,
@@ -279,19 +379,17 @@ class ClassViewSet(viewsets.ModelViewSet):
         """
         try:
             class_obj = self.get_object()
-            lesson_name = requset.data.get("name")
+            lesson_name = normalize_lesson_name(requset.data.get("name") or "")
             if not lesson_name:
                 return Response(
                     {"detail": "The lesson name is required."},
                     status=status.HTTP_400_BAD_REQUEST,
                 )
-            lesson, created = Lesson.objects.get_or_create(name=lesson_name)
-            if class_obj.lessons.filter(id=lesson.id).exits():
+            if not add_lessons_to_classes([class_obj.pk], [lesson_name])["added"]:
                 return Response(
-                    {"detail": "The lesson name is required."},
+                    {"detail": "This lesson is already in this class."},
                     status=status.HTTP_400_BAD_REQUEST,
                 )
-            class_obj.lessons.add(lesson)
             return Response(
                 {"detail": "This lesson was added successfully."},
                 status=status.HTTP_200_OK,
@@ -302,6 +400,36 @@ class ClassViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_404_NOT_FOUND,
             )
 
+    @swagger_auto_schema(
+        operation_description="Add lessons to many classes by manager.",
+        request_body=BulkLessonsSerializer,
+    )
+    @action(
+        detail=False,
+        methods=["post"],
+        url_path="assign-lessons",
+        url_name="assign-lessons",
+    )
+    def assign_lessons(self, request):
+        """
+
+        URL: /classes/assign-lessons/
+        Request Body: {"classes": [class_id, ...], "names": ["Lesson Name", ...]}
+
+        """
+        serializer = BulkLessonsSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        class_ids = serializer.validated_data["classes"]
+        if not request.user.is_staff:
+            principal = get_principal(request)
+            if not all(principal.manages_class(class_id) for class_id in class_ids):
+                return Response(
+                    {"detail": "You can only add lessons to classes of your school."},
+                    status=status.HTTP_403_FORBIDDEN,
+                )
+        result = add_lessons_to_classes(class_ids, serializer.validated_data["names"])
+        return Response(result, status=status.HTTP_200_OK)
+
     @swagger_auto_schema(operation_description="List all lessons of a class.")
     @action(
         detail=True,
@@ -314,11 +442,48 @@ class ClassViewSet(viewsets.ModelViewSet):
 
         try:
             class_obj = self.get_object()
-            lessons = class_obj.lessons.all()
-            serializer = LessonSerializer(lessons, many=True)
-            return Response(serializer.data, status=status.HTTP_200_OK)
+            lesson_ids = Class.lessons.through.objects.filter(
+                class_id=class_obj.pk
+            ).values_list("lesson_id", flat=True)
+            return Response(
+                lesson_catalog.serialize(lesson_ids), status=status.HTTP_200_OK
+            )
 
         except Class.DoesNotExist:
             return Response(
                 {"detail": "Class not found."}, status=status.HTTP_404_NOT_FOUND
             )
+
+    @swagger_auto_schema(
+        operation_description="Grades of a class as a students x assignments matrix."
+    )
+    @action(detail=True, methods=["get"], renderer_classes=GRADEBOOK_RENDERERS)
+    def gradebook(self, request, pk=None):
+        """
+
+        URL: /classes/{class_id}/gradebook/
+        JSON by default; Arrow IPC with ?format=arrow or
+        Accept: application/vnd.apache.arrow.stream when pyarrow is installed.
+
+        """
+        class_obj = self.get_object()
+        return Response(build_gradebook(class_obj.pk), status=status.HTTP_200_OK)
+
+    @swagger_auto_schema(
+        operation_description="Grade statistics of a class per assignment and lesson."
+    )
+    @action(
+        detail=True,
+        methods=["get"],
+        url_path="grade-stats",
+        url_name="grade-stats",
+    )
+    def grade_stats(self, request, pk=None):
+        """
+
+        URL: /classes/{class_id}/grade-stats/
+        Scores are percentages of the assignment grades.
+
+        """
+        class_obj = self.get_object()
+        return Response(class_stats(class_obj.pk), status=status.HTTP_200_OK)
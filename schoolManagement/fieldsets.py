@@ -0,0 +1,81 @@
+from rest_framework import serializers
+
+FIELDS_PARAM = "fields"
+EXPAND_PARAM = "expand"
+
+
+def split_paths(paths):
+    """
+    Split dotted paths into top-level names and the paths below each name:
+    `["id", "class_obj.name", "class_obj.students"]` gives
+    `({"id", "class_obj"}, {"class_obj": ["name", "students"]})`.
+    """
+    names, nested = set(), {}
+    for path in paths:
+        name, _, rest = path.partition(".")
+        if not name:
+            continue
+        names.add(name)
+        if rest:
+            nested.setdefault(name, []).append(rest)
+    return names, nested
+
+
+def parse_param(request, param):
+    value = request.query_params.get(param) if request is not None else None
+    if not value:
+        return None
+    return [path.strip() for path in value.split(",") if path.strip()]
+
+
+class SparseFieldsMixin:
+    """
+    Sparse fieldsets for model serializers. `?fields=id,title,class_obj.name`
+    keeps only the listed fields, and nested serializers render as primary
+    keys unless named in `?expand=class_obj,class_obj.students`. The top-level
+    serializer reads both parameters from the request and hands the dotted
+    remainders down to its expanded children.
+    """
+
+    sparse_options = None
+
+    def get_sparse_options(self):
+        if self.sparse_options is not None:
+            return self.sparse_options
+        parent = self.parent
+        if isinstance(parent, serializers.ListSerializer):
+            parent = parent.parent
+        if parent is not None:
+            return None, []
+        request = self.context.get("request")
+        expand = parse_param(request, EXPAND_PARAM) or []
+        return parse_param(request, FIELDS_PARAM), expand
+
+    def get_fields(self):
+        fields = super().get_fields()
+        requested, expand = self.get_sparse_options()
+
+        nested_fields = {}
+        if requested is not None:
+            names, nested_fields = split_paths(requested)
+            fields = {name: field for name, field in fields.items() if name in names}
+        expanded, nested_expand = split_paths(expand)
+
+        for name, field in fields.items():
+            many = isinstance(field, serializers.ListSerializer)
+            nested = field.child if many else field
+            if not field.read_only:
+                continue
+            if not isinstance(nested, serializers.BaseSerializer):
+                continue
+            if name in expanded:
+                if isinstance(nested, SparseFieldsMixin):
+                    nested.sparse_options = (
+                        nested_fields.get(name),
+                        nested_expand.get(name, []),
+                    )
+            else:
+                fields[name] = serializers.PrimaryKeyRelatedField(
+                    read_only=True, many=many, source=field.source
+                )
+        return fields
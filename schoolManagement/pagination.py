@@ -0,0 +1,213 @@
+import json
+import operator
+from functools import reduce
+
+from django.core.paginator import Paginator
+from django.db import connections
+from django.db.models import Q
+from django.utils.functional import cached_property
+from rest_framework.exceptions import NotFound
+from rest_framework.filters import OrderingFilter
+from rest_framework.pagination import CursorPagination
+
+
+def estimate_count(queryset):
+    """
+    Approximate row count of a queryset from PostgreSQL planner statistics:
+    `pg_class.reltuples` for a whole table, otherwise the row estimate of the
+    query plan. Other databases fall back to an exact `COUNT(*)`.
+    """
+    connection = connections[queryset.db]
+    if connection.vendor != "postgresql":
+        return queryset.count()
+
+    with connection.cursor() as cursor:
+        if not queryset.query.where and not queryset.query.distinct:
+            cursor.execute(
+                "SELECT reltuples FROM pg_class WHERE oid = %s::regclass",
+                [queryset.model._meta.db_table],
+            )
+            row = cursor.fetchone()
+            if row and row[0] >= 0:
+                return int(row[0])
+
+        sql, params = queryset.order_by().query.sql_with_params()
+        cursor.execute(f"EXPLAIN (FORMAT JSON) {sql}", params)
+        plan = cursor.fetchone()[0]
+        if isinstance(plan, str):
+            plan = json.loads(plan)
+        return int(plan[0]["Plan"]["Plan Rows"])
+
+
+class EstimatedCountPaginator(Paginator):
+    """
+    Paginator for admin changelists of large tables: past
+    `exact_count_limit` rows the page count comes from `estimate_count`
+    instead of a `COUNT(*)`. Smaller results, and databases without planner
+    estimates, are counted exactly.
+    """
+
+    exact_count_limit = 10000
+
+    @cached_property
+    def count(self):
+        queryset = self.object_list
+        if (
+            not hasattr(queryset, "query")
+            or connections[queryset.db].vendor != "postgresql"
+        ):
+            return super().count
+        estimate = estimate_count(queryset)
+        if estimate < self.exact_count_limit:
+            return super().count
+        return estimate
+
+
+def reverse_ordering(ordering):
+    return tuple(field[1:] if field[0] == "-" else f"-{field}" for field in ordering)
+
+
+def after_position(ordering, position):
+    """
+    Rows past `position` (the values of the `ordering` fields of a row) in
+    that ordering, as the row comparison `(a, b, id) > (x, y, z)` expanded
+    per field so each may run in its own direction. The leading field's
+    bound is repeated on its own, so an index on it limits the scan.
+    """
+    fields = [(field.lstrip("-"), field[0] == "-") for field in ordering]
+    predicates, equal = [], Q()
+    for (name, descending), value in zip(fields, position):
+        lookup = "lt" if descending else "gt"
+        predicates.append(equal & Q(**{f"{name}__{lookup}": value}))
+        equal &= Q(**{name: value})
+    name, descending = fields[0]
+    bound = Q(**{f"{name}__{'lte' if descending else 'gte'}": position[0]})
+    return bound & reduce(operator.or_, predicates)
+
+
+def unique_ordering(ordering):
+    """`ordering` up to its first unique field, ended by the id if it has none."""
+    fields = []
+    for field in ordering:
+        fields.append(field)
+        if field.lstrip("-") in ["id", "pk"]:
+            return tuple(fields)
+    return (*fields, "id")
+
+
+class KeysetPagination(CursorPagination):
+    """
+    Cursor pagination on a stable `(created_at, id)` ordering (`id` for
+    models without `created_at`).
+
+    No total is computed unless the client asks for one with
+    `?count=estimate` (planner statistics) or `?count=exact` (`COUNT(*)`).
+    Views can override the ordering with a `pagination_ordering` attribute,
+    and clients with `?ordering=` on views using `OrderingFilter`. The id
+    always ends the ordering, and the cursor holds the values of every
+    ordering field of the last row, so rows tied on the leading fields are
+    skipped by `after_position` instead of an `OFFSET`, and a deep page
+    costs the same as the first. Ordering fields should not be nullable.
+    """
+
+    page_size_query_param = "limit"
+    max_page_size = 1000
+    count_query_param = "count"
+
+    def get_ordering(self, request, queryset, view):
+        for backend in getattr(view, "filter_backends", []):
+            if issubclass(backend, OrderingFilter):
+                ordering = backend().get_ordering(request, queryset, view)
+                if ordering:
+                    return unique_ordering(ordering)
+        ordering = getattr(view, "pagination_ordering", None)
+        if ordering is not None:
+            return unique_ordering(ordering)
+        field_names = {field.name for field in queryset.model._meta.concrete_fields}
+        if "created_at" in field_names:
+            return ("created_at", "id")
+        return ("id",)
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.count = None
+        self.count_exact = None
+        count = request.query_params.get(self.count_query_param)
+        if count == "exact":
+            self.count = queryset.count()
+            self.count_exact = True
+        elif count == "estimate":
+            self.count = estimate_count(queryset)
+            self.count_exact = False
+
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        if not self.page_size:
+            return None
+        self.base_url = request.build_absolute_uri()
+        self.ordering = self.get_ordering(request, queryset, view)
+        self.cursor = self.decode_cursor(request)
+        offset, reverse, position = self.cursor or (0, False, None)
+
+        # The cursor is built from the ordering fields of the last row; keep
+        # them loaded when the queryset was narrowed with `.only()`.
+        loaded, deferred = queryset.query.deferred_loading
+        if loaded and not deferred:
+            queryset = queryset.only(
+                *loaded, *[field.lstrip("-") for field in self.ordering]
+            )
+        ordering = reverse_ordering(self.ordering) if reverse else self.ordering
+        queryset = queryset.order_by(*ordering)
+        if position is not None:
+            try:
+                values = json.loads(position)
+            except ValueError:
+                values = None
+            if not isinstance(values, list) or len(values) != len(ordering):
+                raise NotFound(self.invalid_cursor_message)
+            queryset = queryset.filter(after_position(ordering, values))
+
+        # Positions are unique, so the offset is 0 in the links given out.
+        results = list(queryset[offset : offset + self.page_size + 1])
+        self.page = results[: self.page_size]
+        following = None
+        if len(results) > len(self.page):
+            following = self._get_position_from_instance(results[-1], self.ordering)
+
+        if reverse:
+            self.page.reverse()
+            self.has_next = position is not None or offset > 0
+            self.has_previous = following is not None
+            self.next_position, self.previous_position = position, following
+        else:
+            self.has_next = following is not None
+            self.has_previous = position is not None or offset > 0
+            self.next_position, self.previous_position = following, position
+        if (self.has_previous or self.has_next) and self.template is not None:
+            self.display_page_controls = True
+        return self.page
+
+    def _get_position_from_instance(self, instance, ordering):
+        values = []
+        for field in ordering:
+            name = field.lstrip("-")
+            if isinstance(instance, dict):
+                values.append(str(instance[name]))
+            else:
+                values.append(str(getattr(instance, name)))
+        return json.dumps(values)
+
+    def get_paginated_response(self, data):
+        response = super().get_paginated_response(data)
+        if self.count is not None:
+            response.data["count"] = self.count
+            response.data["count_exact"] = self.count_exact
+        return response
+
+    def get_paginated_response_schema(self, schema):
+        response_schema = super().get_paginated_response_schema(schema)
+        response_schema["properties"]["count"] = {
+            "type": "integer",
+            "example": 123,
+        }
+        response_schema["properties"]["count_exact"] = {"type": "boolean"}
+        return response_schema
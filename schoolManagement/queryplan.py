@@ -0,0 +1,152 @@
+from django.core.exceptions import FieldDoesNotExist
+from django.db.models import Prefetch
+from rest_framework.relations import ManyRelatedField, PrimaryKeyRelatedField
+from rest_framework.serializers import BaseSerializer, ListSerializer
+
+from .fieldsets import EXPAND_PARAM, FIELDS_PARAM
+
+MAX_CACHED_PLANS = 512
+
+
+def prefixed(prefix, lookup):
+    if isinstance(lookup, Prefetch):
+        return Prefetch(
+            f"{prefix}__{lookup.prefetch_through}",
+            lookup.queryset,
+            to_attr=lookup.to_attr,
+        )
+    return f"{prefix}__{lookup}"
+
+
+def plan_related(serializer, model, nested=False):
+    """
+    Walk the readable fields of `serializer` and return the
+    `(select_related, prefetch_related, only)` plan needed to render
+    instances of `model` without a query per row. Forward foreign keys and
+    one-to-one relations are joined; many-valued relations are prefetched,
+    with the nested serializer's own plan pushed into the `Prefetch`
+    queryset. `only` lists the columns the serializer reads, or is None
+    when a field may read anything (methods, properties, `source="*"`).
+    A `nested` serializer adds its `Meta.nested_prefetch`, the lookups it
+    reads in place of annotations its own view makes.
+    """
+    select, prefetch, only = [], [], [model._meta.pk.name]
+    if nested:
+        prefetch += getattr(getattr(serializer, "Meta", None), "nested_prefetch", [])
+    for field in serializer.fields.values():
+        if field.write_only:
+            continue
+        if field.source == "*":
+            if isinstance(field, BaseSerializer):
+                nested_select, nested_prefetch, nested_only = plan_related(
+                    field, model, nested
+                )
+                select += nested_select
+                prefetch += nested_prefetch
+                only = merge_only(only, nested_only)
+            else:
+                only = None
+            continue
+
+        try:
+            model_field = model._meta.get_field(field.source_attrs[0])
+        except FieldDoesNotExist:
+            only = None
+            continue
+        name = field.source_attrs[0]
+        if not model_field.is_relation:
+            only = merge_only(only, [name])
+            continue
+
+        if isinstance(field, ListSerializer):
+            nested = field.child
+        elif isinstance(field, ManyRelatedField):
+            nested = field.child_relation
+        else:
+            nested = field
+
+        if model_field.many_to_one or model_field.one_to_one:
+            if model_field.concrete:
+                only = merge_only(only, [name])
+                if isinstance(nested, PrimaryKeyRelatedField):
+                    continue
+            select.append(name)
+            if isinstance(nested, BaseSerializer):
+                nested_select, nested_prefetch, nested_only = plan_related(
+                    nested, model_field.related_model, nested=True
+                )
+                select += [prefixed(name, lookup) for lookup in nested_select]
+                prefetch += [prefixed(name, lookup) for lookup in nested_prefetch]
+                if model_field.concrete and nested_only is not None:
+                    only = merge_only(
+                        only, [prefixed(name, column) for column in nested_only]
+                    )
+        elif isinstance(nested, BaseSerializer):
+            nested_plan = plan_related(nested, model_field.related_model, nested=True)
+            if nested_plan[2] is not None and model_field.one_to_many:
+                nested_plan[2].append(model_field.field.name)
+            queryset = apply_plan(
+                model_field.related_model._default_manager.all(), nested_plan
+            )
+            prefetch.append(Prefetch(name, queryset))
+        else:
+            prefetch.append(name)
+    return select, prefetch, only
+
+
+def merge_only(only, columns):
+    if only is None or columns is None:
+        return None
+    return only + [column for column in columns if column not in only]
+
+
+def apply_plan(queryset, plan):
+    select, prefetch, only = plan
+    if select:
+        queryset = queryset.select_related(*select)
+    if prefetch:
+        queryset = queryset.prefetch_related(*prefetch)
+    if only is not None:
+        queryset = queryset.only(*only)
+    return queryset
+
+
+class QueryPlanMixin:
+    """
+    Derive `select_related`/`prefetch_related` and the `.only()` columns for
+    the querysets of a viewset from its serializer, honouring the
+    `?fields=`/`?expand=` selection. Plans are cached per serializer class
+    and selection, and applied in `filter_queryset`, which list and retrieve
+    run on top of the viewsets' own `get_queryset`. Other actions load the
+    object for permission checks or their own serializers and are left
+    alone.
+    """
+
+    query_plan_actions = ["list", "retrieve"]
+    _query_plans = {}
+
+    def get_query_plan(self):
+        serializer_class = self.get_serializer_class()
+        params = self.request.query_params
+        key = (
+            serializer_class,
+            params.get(FIELDS_PARAM, ""),
+            params.get(EXPAND_PARAM, ""),
+        )
+        plan = self._query_plans.get(key)
+        if plan is None:
+            plan = plan_related(self.get_serializer(), serializer_class.Meta.model)
+            if len(self._query_plans) >= MAX_CACHED_PLANS:
+                self._query_plans.clear()
+            self._query_plans[key] = plan
+        return plan
+
+    def filter_queryset(self, queryset):
+        queryset = super().filter_queryset(queryset)
+        if self.action not in self.query_plan_actions:
+            return queryset
+        serializer_class = self.get_serializer_class()
+        model = getattr(getattr(serializer_class, "Meta", None), "model", None)
+        if model is not queryset.model:
+            return queryset
+        return apply_plan(queryset, self.get_query_plan())
@@ -38,6 +38,7 @@ INSTALLED_APPS = [
     "django.contrib.sessions",
     "django.contrib.messages",
     "django.contrib.staticfiles",
+    "django.contrib.postgres",
     "rest_framework",
     "django_extensions",
     "django_filters",
@@ -64,11 +65,11 @@ MIDDLEWARE = [
 REST_FRAMEWORK = {
     "DEFAULT_AUTHENTICATION_CLASSES": [
         # "rest_framework.authentication.BasicAuthentication",
-        "rest_framework_simplejwt.authentication.JWTAuthentication",
+        "user.authentication.CachedJWTAuthentication",
         "rest_framework.authentication.SessionAuthentication",  # for admin
     ],
     "DEFAULT_FILTER_BACKENDS": ["django_filters.rest_framework.DjangoFilterBackend"],
-    "DEFAULT_PAGINATION_CLASS": "rest_framework.pagination.LimitOffsetPagination",
+    "DEFAULT_PAGINATION_CLASS": "schoolManagement.pagination.KeysetPagination",
     "PAGE_SIZE": 100,
 }
 AUTH_USER_MODEL = "user.User"
@@ -81,6 +82,96 @@ SIMPLE_JWT = {
     "REFRESH_TOKEN_LIFETIME": timedelta(days=15),
 }
 
+# Process-local cache of authenticated users, see user/authentication.py.
+# Changes made through another worker are seen at most SYNC_INTERVAL seconds
+# later, through version stamps kept in the database; stamps are re-read
+# OVERLAP seconds back in case they were committed late.
+USER_AUTH_CACHE = {
+    "MAX_ENTRIES": 10000,
+    "TTL": 300,  # seconds
+    "SYNC_INTERVAL": 5,  # seconds
+    "OVERLAP": 30,  # seconds
+}
+
+# In-memory filter in front of the refresh token blacklist, see user/tokens.py.
+# Tokens blacklisted by another worker are rejected here after at most
+# SYNC_INTERVAL seconds. Rows committed out of id order are picked up through
+# the gaps they leave for GAP_TIMEOUT seconds, and by the full rebuild every
+# REBUILD_INTERVAL seconds after that.
+TOKEN_BLACKLIST_FILTER = {
+    "CAPACITY": 100000,
+    "ERROR_RATE": 0.001,
+    "SYNC_INTERVAL": 5,  # seconds
+    "GAP_TIMEOUT": 60,  # seconds
+    "REBUILD_INTERVAL": 10 * 60,  # seconds
+}
+
+# Password hashing pool, see user/hashing.py. WORKERS=None uses one process
+# per CPU and 0 hashes on the request thread. A profile changing the work
+# factor makes Django rehash the password on the user's next login.
+PASSWORD_HASHING = {
+    "WORKERS": None,
+    "PROFILE": "default",
+    "PROFILES": {
+        "default": {},
+        "pbkdf2-600k": {"algorithm": "pbkdf2_sha256", "iterations": 600000},
+    },
+}
+
+# Bulk user import
+USER_IMPORT_BATCH_SIZE = 1000
+
+# Process-local enrollment index, see school/membership.py. Changes made by
+# another worker are picked up at most SYNC_INTERVAL seconds later, through a
+# version counter kept in the database; the whole index is reloaded every
+# MAX_AGE seconds regardless. With BACKGROUND_RELOAD those reloads run in a
+# thread while requests keep using the loaded index.
+ENROLLMENT_INDEX = {
+    "SYNC_INTERVAL": 5,  # seconds
+    "MAX_AGE": 5 * 60,  # seconds
+    "MERGE_THRESHOLD": 4096,
+    "BACKGROUND_RELOAD": True,
+}
+
+LESSON_CATALOG = {
+    "SYNC_INTERVAL": 5,  # seconds
+}
+
+# Seconds a built school roster stays cached; edits invalidate it sooner.
+SCHOOL_ROSTER_CACHE_TIMEOUT = 3600
+SCHOOL_DASHBOARD_CACHE_TIMEOUT = 3600
+GRADE_STATS_CACHE_TIMEOUT = 3600
+
+# Resumable attachment uploads, see assignment/uploads.py.
+UPLOAD_SESSIONS = {
+    "DIR": BASE_DIR / "uploads" / "partial",
+    "MAX_CHUNK_SIZE": 8 * 1024 * 1024,
+    "MAX_SIZE": 200 * 1024 * 1024,
+    "EXPIRE_AFTER": 24 * 60 * 60,  # seconds
+}
+
+# Assignment and solution files are stored once per distinct content, in a
+# sharded tree under MEDIA_ROOT/blobs, see assignment/storage.py.
+STORAGES = {
+    "default": {"BACKEND": "django.core.files.storage.FileSystemStorage"},
+    "staticfiles": {
+        "BACKEND": "django.contrib.staticfiles.storage.StaticFilesStorage"
+    },
+    "attachments": {"BACKEND": "assignment.storage.ContentAddressedStorage"},
+}
+# Unreferenced blobs younger than this many seconds are kept by
+# collect_blobs, the attachment naming them may not be saved yet.
+BLOB_GC_GRACE = 60 * 60
+
+# Attachment downloads, see assignment/downloads.py. With "x-accel-redirect"
+# nginx serves the files from an internal location:
+#     location /protected/ { internal; alias <MEDIA_ROOT>/; }
+DOWNLOADS = {
+    "BACKEND": "django",  # or "x-accel-redirect", "x-sendfile"
+    "INTERNAL_URL": "/protected/",
+    "URL_EXPIRE": 60 * 60,  # seconds
+}
+
 ROOT_URLCONF = "schoolManagement.urls"
 
 TEMPLATES = [
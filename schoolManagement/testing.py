@@ -0,0 +1,14 @@
+from django.test import modify_settings
+
+# Query-count tests run without Silk, which records every request.
+without_silk = modify_settings(
+    MIDDLEWARE={"remove": "silk.middleware.SilkyMiddleware"}
+)
+
+
+def count_queries(context):
+    # Silk may still run EXPLAIN for every query when a previous test left
+    # its collector active; only the application's own queries are counted.
+    return len(
+        [q for q in context.captured_queries if not q["sql"].startswith("EXPLAIN")]
+    )
@@ -19,7 +19,9 @@ from django.contrib import admin
 from django.urls import include, path
 from drf_yasg import openapi
 from drf_yasg.views import get_schema_view
-from rest_framework_simplejwt.views import TokenObtainPairView, TokenRefreshView
+from rest_framework_simplejwt.views import TokenObtainPairView
+
+from user.views import FilteredTokenRefreshView
 
 schema_view = get_schema_view(
     openapi.Info(
@@ -36,7 +38,11 @@ schema_view = get_schema_view(
 urlpatterns = [
     path("admin/", admin.site.urls),
     path("api/token/", TokenObtainPairView.as_view(), name="token_obtain_pair"),
-    path("api/token/refresh/", TokenRefreshView.as_view(), name="token_refresh"),
+    path(
+        "api/token/refresh/",
+        FilteredTokenRefreshView.as_view(),
+        name="token_refresh",
+    ),
     path("user/", include("user.urls")),
     path("schools/", include("school.urls")),
     path("assignment/", include("assignment.urls")),
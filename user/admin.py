@@ -1,5 +1,78 @@
 from django.contrib import admin
+from django.contrib.auth.admin import UserAdmin as BaseUserAdmin
 
+from schoolManagement.pagination import EstimatedCountPaginator
+
+from .authentication import invalidate_users
 from .models import *
 
-admin.site.register(User)
+# Autocomplete fields offering users, and the user type each one accepts.
+AUTOCOMPLETE_USER_TYPES = {
+    "manager": "manager",
+    "teacher": "teacher",
+    "students": "student",
+}
+
+
+@admin.register(User)
+class UserAdmin(BaseUserAdmin):
+    list_display = [
+        "id",
+        "username",
+        "national_id",
+        "email",
+        "user_type",
+        "is_active",
+        "is_staff",
+    ]
+    list_filter = ["user_type", "is_active", "is_staff"]
+    # Exact and prefix lookups, which the unique indexes can serve.
+    search_fields = ["=national_id", "^username", "^email", "^last_name"]
+    ordering = ["-id"]
+    fieldsets = BaseUserAdmin.fieldsets + (
+        ("School", {"fields": ("user_type", "national_id", "bio")}),
+    )
+    add_fieldsets = (
+        (
+            None,
+            {
+                "classes": ("wide",),
+                "fields": (
+                    "username",
+                    "email",
+                    "national_id",
+                    "user_type",
+                    "password1",
+                    "password2",
+                ),
+            },
+        ),
+    )
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+    actions = ["activate_users", "deactivate_users"]
+
+    def get_search_results(self, request, queryset, search_term):
+        queryset, may_have_duplicates = super().get_search_results(
+            request, queryset, search_term
+        )
+        user_type = AUTOCOMPLETE_USER_TYPES.get(request.GET.get("field_name"))
+        match = getattr(request, "resolver_match", None)
+        if user_type and match is not None and match.url_name == "autocomplete":
+            queryset = queryset.filter(user_type=user_type)
+        return queryset, may_have_duplicates
+
+    def set_active(self, request, queryset, is_active):
+        ids = User.objects.set_active(queryset.exclude(pk=request.user.pk), is_active)
+        invalidate_users(ids)
+        return len(ids)
+
+    @admin.action(description="Activate selected users")
+    def activate_users(self, request, queryset):
+        count = self.set_active(request, queryset, True)
+        self.message_user(request, f"{count} users activated.")
+
+    @admin.action(description="Deactivate selected users")
+    def deactivate_users(self, request, queryset):
+        count = self.set_active(request, queryset, False)
+        self.message_user(request, f"{count} users deactivated.")
@@ -0,0 +1,221 @@
+import threading
+import time
+from collections import OrderedDict
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import router
+from django.db.models import F
+from django.utils import timezone
+from django.utils.translation import gettext_lazy as _
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.utils import get_md5_hash_password
+
+from .models import AuthVersion, User
+
+
+class UserCache:
+    """
+    Process-local LRU cache of user rows with a time to live. Entries are
+    stored together with the version stamp they were loaded under, so a
+    version bump anywhere makes them stale.
+    """
+
+    def __init__(self, max_entries=10000, ttl=300):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, user_id, version):
+        key = str(user_id)
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None or entry[0] != version or entry[1] < time.monotonic():
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return entry[2]
+
+    def set(self, user_id, version, values):
+        if self.max_entries <= 0:
+            return
+        key = str(user_id)
+        with self.lock:
+            self.entries[key] = (version, time.monotonic() + self.ttl, values)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+                self.evictions += 1
+
+    def discard(self, user_id):
+        with self.lock:
+            self.entries.pop(str(user_id), None)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+    def stats(self):
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "size": len(self.entries),
+                "max_entries": self.max_entries,
+                "hit_ratio": self.hits / lookups if lookups else 0.0,
+            }
+
+
+class UserVersions:
+    """
+    Version stamps of users (`AuthVersion` rows), as seen by this process.
+    Stamps changed since the last look are read at most every
+    `sync_interval` seconds, reaching `overlap` seconds further back for
+    stamps committed late, and their users dropped from `user_cache`. A user
+    whose stamp this process has not seen change is at version 0; stamps
+    seen more than `keep` seconds ago are forgotten, since entries cached
+    under the version before them have expired by then.
+    """
+
+    def __init__(self, sync_interval=5, overlap=30, keep=600):
+        self.sync_interval = sync_interval
+        self.overlap = overlap
+        self.keep = keep
+        self.lock = threading.Lock()
+        self.clear()
+
+    def clear(self):
+        with self.lock:
+            self.versions = {}
+            self.synced_at = timezone.now()
+            self.last_sync = time.monotonic()
+
+    def get(self, user_id):
+        if time.monotonic() - self.last_sync >= self.sync_interval:
+            self.sync()
+        return self.versions.get(str(user_id), (0, 0.0))[0]
+
+    def sync(self):
+        # One thread reads the changes; the others go on with what is known.
+        if not self.lock.acquire(blocking=False):
+            return
+        try:
+            now = timezone.now()
+            since = self.synced_at - timedelta(seconds=self.overlap)
+            self._update(
+                AuthVersion.objects.filter(updated_at__gte=since).values_list(
+                    "user_id", "version"
+                )
+            )
+            self.synced_at = now
+            self.last_sync = time.monotonic()
+            cutoff = self.last_sync - self.keep
+            for key in [k for k, (_, seen) in self.versions.items() if seen < cutoff]:
+                del self.versions[key]
+        finally:
+            self.lock.release()
+
+    def update(self, rows):
+        with self.lock:
+            self._update(rows)
+
+    def _update(self, rows):
+        seen = time.monotonic()
+        for user_id, version in rows:
+            key = str(user_id)
+            if version > self.versions.get(key, (0, 0.0))[0]:
+                self.versions[key] = (version, seen)
+                user_cache.discard(user_id)
+
+
+def _build_user_cache():
+    options = getattr(settings, "USER_AUTH_CACHE", {})
+    return UserCache(
+        max_entries=options.get("MAX_ENTRIES", 10000),
+        ttl=options.get("TTL", 300),
+    )
+
+
+def _build_user_versions():
+    options = getattr(settings, "USER_AUTH_CACHE", {})
+    return UserVersions(
+        sync_interval=options.get("SYNC_INTERVAL", 5),
+        overlap=options.get("OVERLAP", 30),
+        keep=2 * options.get("TTL", 300),
+    )
+
+
+user_cache = _build_user_cache()
+user_versions = _build_user_versions()
+
+
+def invalidate_users(user_ids, chunk_size=1000):
+    """
+    Bump the version stamp of the given users in the database and drop them
+    from this process's cache. Other workers drop them once they read the
+    new stamps, within `SYNC_INTERVAL` seconds.
+    """
+    user_ids = list(user_ids)
+    for start in range(0, len(user_ids), chunk_size):
+        chunk = user_ids[start : start + chunk_size]
+        now = timezone.now()
+        AuthVersion.objects.bulk_create(
+            [AuthVersion(user_id=user_id, updated_at=now) for user_id in chunk],
+            ignore_conflicts=True,
+        )
+        stamps = AuthVersion.objects.filter(pk__in=chunk)
+        stamps.update(version=F("version") + 1, updated_at=now)
+        user_versions.update(stamps.values_list("user_id", "version"))
+    for user_id in user_ids:
+        user_cache.discard(user_id)
+
+
+class CachedJWTAuthentication(JWTAuthentication):
+    """
+    `JWTAuthentication` that resolves the token's user from `user_cache` and
+    only reads the `User` table on a miss.
+    """
+
+    field_names = [field.attname for field in User._meta.concrete_fields]
+
+    def get_user(self, validated_token):
+        try:
+            user_id = validated_token[api_settings.USER_ID_CLAIM]
+        except KeyError as e:
+            raise InvalidToken(
+                _("Token contained no recognizable user identification")
+            ) from e
+
+        version = user_versions.get(user_id)
+        values = user_cache.get(user_id, version)
+        if values is None:
+            user = super().get_user(validated_token)
+            user_cache.set(
+                user_id,
+                version,
+                tuple(getattr(user, name) for name in self.field_names),
+            )
+            return user
+
+        # Every hit gets its own instance so nothing cached on it during a
+        # request leaks into the next one.
+        user = User.from_db(router.db_for_read(User), self.field_names, values)
+        if api_settings.CHECK_USER_IS_ACTIVE and not user.is_active:
+            raise AuthenticationFailed(_("User is inactive"), code="user_inactive")
+        if api_settings.CHECK_REVOKE_TOKEN:
+            if validated_token.get(
+                api_settings.REVOKE_TOKEN_CLAIM
+            ) != get_md5_hash_password(user.password):
+                raise AuthenticationFailed(
+                    _("The user's password has been changed."), code="password_changed"
+                )
+        return user
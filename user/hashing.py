@@ -0,0 +1,126 @@
+import atexit
+import copy
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+from django.conf import settings
+from django.contrib.auth.hashers import get_hasher, make_password
+
+# This module must not import models: pool workers started with "spawn"
+# import it before the app registry is ready.
+
+
+def _hash_password(password, algorithm=None, options=None):
+    if not password:
+        return make_password(None)
+    hasher = get_hasher(algorithm or "default")
+    if options:
+        hasher = copy.copy(hasher)
+        for name, value in options.items():
+            setattr(hasher, name, value)
+    return hasher.encode(password, hasher.salt())
+
+
+def get_hashing_settings():
+    return getattr(settings, "PASSWORD_HASHING", {})
+
+
+def get_profile(name=None):
+    """
+    Return `(algorithm, options)` of a hasher profile from
+    `PASSWORD_HASHING["PROFILES"]`. Options are hasher attributes such as
+    `iterations` (PBKDF2), `time_cost` (Argon2) or `rounds` (bcrypt).
+    """
+    hashing = get_hashing_settings()
+    name = name or hashing.get("PROFILE", "default")
+    profile = dict(hashing.get("PROFILES", {}).get(name, {}))
+    return profile.pop("algorithm", None), profile
+
+
+class PasswordHashingService:
+    """
+    Hash passwords on a bounded process pool so PBKDF2 work neither holds the
+    GIL of the request worker nor runs twice. At most `max_pending` hashes are
+    queued; callers beyond that wait for a slot. With `workers=0` hashing runs
+    on the calling thread.
+    """
+
+    def __init__(self, workers=None, profile=None, max_pending=None):
+        hashing = get_hashing_settings()
+        if workers is None:
+            workers = hashing.get("WORKERS")
+        if workers is None:
+            workers = os.cpu_count() or 1
+        self.workers = max(0, int(workers))
+        self.algorithm, self.options = get_profile(profile)
+        self.max_pending = max_pending or hashing.get(
+            "MAX_PENDING", max(1, self.workers) * 8
+        )
+        self.slots = threading.BoundedSemaphore(self.max_pending)
+        self.lock = threading.Lock()
+        self.pool = None
+
+    def get_pool(self):
+        with self.lock:
+            if self.pool is None:
+                self.pool = ProcessPoolExecutor(max_workers=self.workers)
+            return self.pool
+
+    def hash(self, password):
+        if self.workers == 0:
+            return _hash_password(password, self.algorithm, self.options)
+        with self.slots:
+            future = self.get_pool().submit(
+                _hash_password, password, self.algorithm, self.options
+            )
+            return future.result()
+
+    def hash_many(self, passwords):
+        """
+        Hash passwords in order. Each job holds a `max_pending` slot until it
+        finishes, so a large batch is fed to the pool as slots free up.
+        """
+        if self.workers == 0:
+            return [
+                _hash_password(password, self.algorithm, self.options)
+                for password in passwords
+            ]
+        pool = self.get_pool()
+        futures = []
+        for password in passwords:
+            self.slots.acquire()
+            try:
+                future = pool.submit(
+                    _hash_password, password, self.algorithm, self.options
+                )
+            except BaseException:
+                self.slots.release()
+                raise
+            future.add_done_callback(lambda future: self.slots.release())
+            futures.append(future)
+        return [future.result() for future in futures]
+
+    def shutdown(self):
+        with self.lock:
+            if self.pool is not None:
+                self.pool.shutdown()
+                self.pool = None
+
+
+hashing_service = PasswordHashingService()
+atexit.register(hashing_service.shutdown)
+
+
+def hash_passwords(passwords, workers=None):
+    """
+    Hash a batch of raw passwords with the shared service, or with a
+    dedicated pool of `workers` processes.
+    """
+    if workers is None:
+        return hashing_service.hash_many(passwords)
+    service = PasswordHashingService(workers=workers)
+    try:
+        return service.hash_many(passwords)
+    finally:
+        service.shutdown()
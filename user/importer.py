@@ -0,0 +1,189 @@
+import codecs
+import csv
+import json
+
+from django.conf import settings
+from django.contrib.auth.validators import UnicodeUsernameValidator
+from django.core.exceptions import ValidationError
+from django.core.validators import validate_email
+from django.db import IntegrityError, transaction
+
+from .hashing import hash_passwords
+from .models import User
+
+IMPORT_FIELDS = [
+    "national_id",
+    "username",
+    "email",
+    "password",
+    "first_name",
+    "last_name",
+    "user_type",
+]
+REQUIRED_FIELDS = ["national_id", "username", "email", "user_type"]
+USER_TYPES = dict(User.USER_TYPES)
+
+username_validator = UnicodeUsernameValidator()
+
+
+def detect_format(filename, default="csv"):
+    name = (filename or "").lower()
+    if name.endswith((".ndjson", ".jsonl")):
+        return "ndjson"
+    if name.endswith(".csv"):
+        return "csv"
+    return default
+
+
+def iter_rows(stream, fmt="csv"):
+    """
+    Yield one dict per record of a binary CSV or NDJSON stream. The stream is
+    decoded line by line, so the upload is never held in memory as a whole.
+    """
+    lines = codecs.iterdecode(stream, "utf-8-sig")
+    if fmt == "csv":
+        for row in csv.DictReader(lines):
+            yield row
+    elif fmt == "ndjson":
+        for line in lines:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                row = json.loads(line)
+            except ValueError:
+                row = None
+            yield row if isinstance(row, dict) else {"__invalid__": line}
+    else:
+        raise ValueError(f"Unsupported import format: {fmt}")
+
+
+def clean_row(row):
+    errors = {}
+    if "__invalid__" in row:
+        return None, {"row": ["Invalid JSON object."]}
+
+    data = {
+        field: str(row.get(field) or "").strip()
+        for field in IMPORT_FIELDS
+    }
+    for field in REQUIRED_FIELDS:
+        if not data[field]:
+            errors[field] = ["This field is required."]
+
+    if data["national_id"] and (
+        len(data["national_id"]) != 10 or not data["national_id"].isdigit()
+    ):
+        errors["national_id"] = ["National id must be 10 digits."]
+    if data["user_type"] and data["user_type"] not in USER_TYPES:
+        errors["user_type"] = [f"\"{data['user_type']}\" is not a valid user type."]
+    if data["email"]:
+        try:
+            validate_email(data["email"])
+        except ValidationError:
+            errors["email"] = ["Enter a valid email address."]
+        data["email"] = User.objects.normalize_email(data["email"])
+    if data["username"]:
+        try:
+            username_validator(data["username"])
+        except ValidationError as e:
+            errors["username"] = e.messages
+
+    return data, errors
+
+
+class UserImporter:
+    """
+    Bulk user import: rows are validated and checked for uniqueness against
+    the database one batch at a time, passwords are hashed in a process pool
+    and users are written with `bulk_create`.
+    """
+
+    unique_fields = ["national_id", "email", "username"]
+
+    def __init__(self, batch_size=None, hash_workers=None, activate=False):
+        self.batch_size = batch_size or getattr(
+            settings, "USER_IMPORT_BATCH_SIZE", 1000
+        )
+        self.hash_workers = hash_workers
+        self.activate = activate
+        self.created = 0
+        self.errors = []
+        self.seen = {field: set() for field in self.unique_fields}
+
+    def run(self, rows):
+        batch = []
+        for number, row in enumerate(rows, start=1):
+            batch.append((number, row))
+            if len(batch) >= self.batch_size:
+                self.import_batch(batch)
+                batch = []
+        if batch:
+            self.import_batch(batch)
+        return self.report()
+
+    def report(self):
+        return {
+            "created": self.created,
+            "failed": len(self.errors),
+            "errors": sorted(self.errors, key=lambda error: error["row"]),
+        }
+
+    def import_batch(self, batch):
+        cleaned = []
+        for number, row in batch:
+            data, errors = clean_row(row)
+            if errors:
+                self.errors.append({"row": number, "errors": errors})
+            else:
+                cleaned.append((number, data))
+
+        existing = {
+            field: set(
+                User.objects.filter(
+                    **{f"{field}__in": [data[field] for _, data in cleaned]}
+                ).values_list(field, flat=True)
+            )
+            for field in self.unique_fields
+        }
+
+        valid = []
+        for number, data in cleaned:
+            errors = {}
+            for field in self.unique_fields:
+                if data[field] in existing[field]:
+                    errors[field] = [f"A user with this {field} already exists."]
+                elif data[field] in self.seen[field]:
+                    errors[field] = [f"Duplicate {field} in the uploaded file."]
+            if errors:
+                self.errors.append({"row": number, "errors": errors})
+                continue
+            for field in self.unique_fields:
+                self.seen[field].add(data[field])
+            valid.append((number, data))
+
+        if not valid:
+            return
+
+        hashed = hash_passwords(
+            [data.pop("password") for _, data in valid], workers=self.hash_workers
+        )
+        users = [
+            User(password=password, is_active=self.activate, **data)
+            for (_, data), password in zip(valid, hashed)
+        ]
+        try:
+            with transaction.atomic():
+                User.objects.bulk_create(users, batch_size=self.batch_size)
+        except IntegrityError:
+            # A concurrent registration took one of the values between the
+            # uniqueness check and the insert; report the batch as failed.
+            for number, _ in valid:
+                self.errors.append(
+                    {
+                        "row": number,
+                        "errors": {"detail": ["Conflicting user, please retry."]},
+                    }
+                )
+            return
+        self.created += len(users)
@@ -0,0 +1,58 @@
+import os
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from user.hashing import PasswordHashingService, get_hashing_settings
+
+
+class Command(BaseCommand):
+    help = "Measure password hashing throughput of each hasher profile."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--profile",
+            action="append",
+            dest="profiles",
+            help="Profile to measure, may be repeated. Defaults to all profiles.",
+        )
+        parser.add_argument("--count", type=int, default=64)
+        parser.add_argument(
+            "--workers", type=int, default=os.cpu_count() or 1, help="Pool size."
+        )
+
+    def handle(self, *args, **options):
+        profiles = options["profiles"] or list(
+            get_hashing_settings().get("PROFILES", {"default": {}})
+        )
+        count = options["count"]
+        workers = max(1, options["workers"])
+        cores = min(workers, os.cpu_count() or 1)
+        passwords = [f"benchmark-password-{i}" for i in range(count)]
+
+        self.stdout.write(
+            f"{'profile':<20}{'inline/s':>12}{'pool/s':>12}{'per core/s':>12}"
+        )
+        for profile in profiles:
+            if profile not in get_hashing_settings().get("PROFILES", {}):
+                raise CommandError(f"Unknown hasher profile: {profile}")
+
+            inline = PasswordHashingService(workers=0, profile=profile)
+            inline_rate = self.measure(inline, passwords)
+
+            pooled = PasswordHashingService(workers=workers, profile=profile)
+            pooled.hash("warm-up")
+            try:
+                pool_rate = self.measure(pooled, passwords)
+            finally:
+                pooled.shutdown()
+
+            self.stdout.write(
+                f"{profile:<20}{inline_rate:>12.1f}{pool_rate:>12.1f}"
+                f"{pool_rate / cores:>12.1f}"
+            )
+
+    def measure(self, service, passwords):
+        start = time.perf_counter()
+        service.hash_many(passwords)
+        return len(passwords) / (time.perf_counter() - start)
@@ -0,0 +1,35 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from user.importer import UserImporter, detect_format, iter_rows
+
+
+class Command(BaseCommand):
+    help = "Import users from a CSV or NDJSON file."
+
+    def add_arguments(self, parser):
+        parser.add_argument("path")
+        parser.add_argument("--format", choices=["csv", "ndjson"])
+        parser.add_argument("--batch-size", type=int)
+        parser.add_argument("--workers", type=int, help="Password hashing processes.")
+        parser.add_argument("--activate", action="store_true")
+
+    def handle(self, *args, **options):
+        fmt = options["format"] or detect_format(options["path"])
+        importer = UserImporter(
+            batch_size=options["batch_size"],
+            hash_workers=options["workers"],
+            activate=options["activate"],
+        )
+        try:
+            with open(options["path"], "rb") as stream:
+                report = importer.run(iter_rows(stream, fmt))
+        except OSError as e:
+            raise CommandError(str(e))
+
+        for error in report["errors"]:
+            self.stderr.write(f"row {error['row']}: {error['errors']}")
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Created {report['created']} users, {report['failed']} rows failed."
+            )
+        )
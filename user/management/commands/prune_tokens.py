@@ -0,0 +1,38 @@
+from django.core.management.base import BaseCommand
+
+from user.tokens import prune_expired_tokens
+
+
+class Command(BaseCommand):
+    help = "Delete expired outstanding and blacklisted tokens in small batches."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=1000)
+        parser.add_argument(
+            "--after-id",
+            type=int,
+            default=0,
+            help="Resume from the last id printed by an interrupted run.",
+        )
+        parser.add_argument("--max-batches", type=int)
+        parser.add_argument(
+            "--pause", type=float, default=0, help="Seconds to sleep between batches."
+        )
+
+    def handle(self, *args, **options):
+        def report(deleted, last_id):
+            self.stdout.write(f"Deleted {deleted} expired tokens up to id {last_id}.")
+            self.stdout.flush()
+
+        deleted, last_id = prune_expired_tokens(
+            batch_size=options["batch_size"],
+            after_id=options["after_id"],
+            max_batches=options["max_batches"],
+            pause=options["pause"],
+            on_batch=report,
+        )
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Done: deleted {deleted} expired tokens up to id {last_id}."
+            )
+        )
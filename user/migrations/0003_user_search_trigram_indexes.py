@@ -0,0 +1,38 @@
+from django.contrib.postgres.operations import TrigramExtension
+from django.db import migrations
+
+SEARCH_FIELDS = ["username", "first_name", "last_name", "email", "national_id"]
+
+
+def create_trigram_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    for field in SEARCH_FIELDS:
+        schema_editor.execute(
+            f"CREATE INDEX CONCURRENTLY IF NOT EXISTS user_user_{field}_trgm "
+            f'ON user_user USING gin ("{field}" gin_trgm_ops)'
+        )
+
+
+def drop_trigram_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    for field in SEARCH_FIELDS:
+        schema_editor.execute(
+            f"DROP INDEX CONCURRENTLY IF EXISTS user_user_{field}_trgm"
+        )
+
+
+class Migration(migrations.Migration):
+    atomic = False
+
+    dependencies = [
+        ("user", "0002_alter_user_managers"),
+    ]
+
+    operations = [
+        TrigramExtension(),
+        migrations.RunPython(
+            create_trigram_indexes, drop_trigram_indexes, atomic=False
+        ),
+    ]
@@ -24,3 +24,19 @@ class User(AbstractUser):
 
     def __str__(self):
         return f"{self.username} - {self.bio}"
+
+
+class AuthVersion(models.Model):
+    """
+    Version stamp of the cached authentication data of a user, bumped when
+    the user changes (user/authentication.py). It is kept in the database,
+    not the cache backend, so every worker sees every bump. Not a foreign
+    key: the stamp of a deleted user must still reach the other workers.
+    """
+
+    user_id = models.BigIntegerField(primary_key=True)
+    version = models.BigIntegerField(default=0)
+    updated_at = models.DateTimeField(db_index=True)
+
+    def __str__(self):
+        return f"{self.user_id} - {self.version}"
@@ -0,0 +1,156 @@
+import threading
+from collections import Counter
+
+from django.contrib.postgres.search import TrigramSimilarity
+from django.db import connections
+from django.db.models import Q
+from django.db.models.functions import Greatest
+
+from .models import User
+
+SEARCH_FIELDS = ["username", "first_name", "last_name", "email", "national_id"]
+SIMILARITY_THRESHOLD = 0.3
+
+
+def trigrams(value):
+    """
+    Trigrams of a string the way pg_trgm builds them: lowercased words padded
+    with two spaces in front and one behind.
+    """
+    grams = set()
+    for word in "".join(c if c.isalnum() else " " for c in value.lower()).split():
+        padded = f"  {word} "
+        grams.update(padded[i : i + 3] for i in range(len(padded) - 2))
+    return grams
+
+
+class NgramIndex:
+    """
+    In-process trigram index over `SEARCH_FIELDS`, used when the database is
+    not PostgreSQL (e.g. SQLite test runs). Built on first search and kept up
+    to date by the `User` save and delete signals; users inserted with
+    `bulk_create` are picked up by id before each search.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.postings = None
+        self.grams = {}
+        self.last_id = 0
+
+    def build(self):
+        with self.lock:
+            self.postings = {}
+            self.grams = {}
+            self.last_id = 0
+        self.sync()
+
+    def sync(self):
+        rows = (
+            User.objects.filter(id__gt=self.last_id)
+            .order_by("id")
+            .values_list("id", *SEARCH_FIELDS)
+        )
+        for user_id, *values in rows.iterator(chunk_size=5000):
+            with self.lock:
+                self._remove(user_id)
+                self._add(self.postings, self.grams, user_id, values)
+                self.last_id = max(self.last_id, user_id)
+
+    @staticmethod
+    def _add(postings, grams, user_id, values):
+        for field, value in enumerate(values):
+            field_grams = trigrams(value or "")
+            grams[user_id, field] = field_grams
+            for gram in field_grams:
+                postings.setdefault(gram, set()).add((user_id, field))
+
+    def _remove(self, user_id):
+        for field in range(len(SEARCH_FIELDS)):
+            for gram in self.grams.pop((user_id, field), ()):
+                entries = self.postings.get(gram)
+                if entries is not None:
+                    entries.discard((user_id, field))
+                    if not entries:
+                        del self.postings[gram]
+
+    def update(self, user):
+        with self.lock:
+            if self.postings is None:
+                return
+            self._remove(user.pk)
+            values = [getattr(user, field) for field in SEARCH_FIELDS]
+            self._add(self.postings, self.grams, user.pk, values)
+
+    def remove(self, user_id):
+        with self.lock:
+            if self.postings is not None:
+                self._remove(user_id)
+
+    def search(self, query, limit, allowed_ids=None):
+        if self.postings is None:
+            self.build()
+        else:
+            self.sync()
+        query_grams = trigrams(query)
+        if not query_grams:
+            return []
+
+        with self.lock:
+            shared = Counter()
+            for gram in query_grams:
+                shared.update(self.postings.get(gram, ()))
+            scores = {}
+            for (user_id, field), count in shared.items():
+                if allowed_ids is not None and user_id not in allowed_ids:
+                    continue
+                size = len(self.grams[user_id, field])
+                score = count / (len(query_grams) + size - count)
+                if score > scores.get(user_id, 0):
+                    scores[user_id] = score
+
+        ranked = sorted(
+            (
+                (score, user_id)
+                for user_id, score in scores.items()
+                if score >= SIMILARITY_THRESHOLD
+            ),
+            key=lambda item: (-item[0], item[1]),
+        )
+        return ranked[:limit]
+
+
+ngram_index = NgramIndex()
+
+
+def search_users(query, queryset, limit=10):
+    """
+    Return up to `limit` users of `queryset` most similar to `query` across
+    `SEARCH_FIELDS`, best match first, each annotated with `similarity`.
+    """
+    if connections[queryset.db].vendor == "postgresql":
+        matches = Q()
+        for field in SEARCH_FIELDS:
+            matches |= Q(**{f"{field}__trigram_similar": query})
+        return list(
+            queryset.filter(matches)
+            .annotate(
+                similarity=Greatest(
+                    *[TrigramSimilarity(field, query) for field in SEARCH_FIELDS]
+                )
+            )
+            .order_by("-similarity", "id")[:limit]
+        )
+
+    allowed_ids = None
+    if queryset.query.where:
+        allowed_ids = set(queryset.values_list("id", flat=True))
+    ranked = ngram_index.search(query, limit, allowed_ids)
+    users = User.objects.in_bulk([user_id for _, user_id in ranked])
+    result = []
+    for score, user_id in ranked:
+        user = users.get(user_id)
+        if user is not None:
+            user.similarity = score
+            result.append(user)
+    return result
@@ -1,11 +1,15 @@
-from django.contrib.auth.hashers import make_password
 from django.core.exceptions import *
 from rest_framework import serializers
+from rest_framework_simplejwt.serializers import TokenRefreshSerializer
 
+from schoolManagement.fieldsets import SparseFieldsMixin
+
+from .hashing import hashing_service
 from .models import User
+from .tokens import FilteredRefreshToken
 
 
-class UserSerializer(serializers.ModelSerializer):
+class UserSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     class Meta:
         model = User
         fields = [
@@ -46,7 +50,7 @@ class RegisterSerializer(serializers.ModelSerializer):
         validated_data.pop("confirm_password")
         user = User(**validated_data)
         user.is_active = False
-        user.set_password(validated_data["password"])
+        user.password = hashing_service.hash(validated_data["password"])
         user.save()
         return user
 
@@ -55,3 +59,37 @@ class UpdateBioSerializer(serializers.ModelSerializer):
     class Meta:
         model = User
         fields = ("bio",)
+
+
+class FilteredTokenRefreshSerializer(TokenRefreshSerializer):
+    token_class = FilteredRefreshToken
+
+
+class BulkActivationSerializer(serializers.Serializer):
+    ids = serializers.ListField(child=serializers.IntegerField(), required=False)
+    user_type = serializers.ChoiceField(choices=User.USER_TYPES, required=False)
+    national_id_prefix = serializers.RegexField(r"^\d{1,10}$", required=False)
+    joined_after = serializers.DateTimeField(required=False)
+    joined_before = serializers.DateTimeField(required=False)
+
+    def validate(self, data):
+        if not data:
+            raise serializers.ValidationError(
+                "You should specify ids or at least one filter."
+            )
+        return data
+
+    def get_queryset(self):
+        data = self.validated_data
+        queryset = User.objects.all()
+        if "ids" in data:
+            queryset = queryset.filter(id__in=data["ids"])
+        if "user_type" in data:
+            queryset = queryset.filter(user_type=data["user_type"])
+        if "national_id_prefix" in data:
+            queryset = queryset.filter(national_id__startswith=data["national_id_prefix"])
+        if "joined_after" in data:
+            queryset = queryset.filter(date_joined__gte=data["joined_after"])
+        if "joined_before" in data:
+            queryset = queryset.filter(date_joined__lt=data["joined_before"])
+        return queryset
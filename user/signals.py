@@ -0,0 +1,33 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken
+
+from .authentication import invalidate_users
+from .models import User
+from .search import ngram_index
+from .tokens import blacklist_filter
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def invalidate_cached_user(sender, instance, **kwargs):
+    # After commit, so no request can cache the old row under the new stamp.
+    user_id = instance.pk
+    transaction.on_commit(lambda: invalidate_users([user_id]))
+
+
+@receiver(post_save, sender=User)
+def index_user(sender, instance, **kwargs):
+    ngram_index.update(instance)
+
+
+@receiver(post_delete, sender=User)
+def unindex_user(sender, instance, **kwargs):
+    ngram_index.remove(instance.pk)
+
+
+@receiver(post_save, sender=BlacklistedToken)
+def add_to_blacklist_filter(sender, instance, created, **kwargs):
+    if created:
+        blacklist_filter.add(instance.token.jti)
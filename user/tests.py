@@ -1,8 +1,30 @@
+from datetime import timedelta
+from io import StringIO
+
+from django.contrib.auth.hashers import check_password
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import connection, transaction
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
 from rest_framework import status
 from rest_framework.test import APIClient
+from rest_framework_simplejwt.token_blacklist.models import (
+    BlacklistedToken,
+    OutstandingToken,
+)
+from rest_framework_simplejwt.tokens import AccessToken
+
+from school.membership import enrollment_index
+from school.models import Class, School
+from schoolManagement.testing import count_queries, without_silk
 
-from .models import User
+from .authentication import user_cache, user_versions
+from .hashing import PasswordHashingService
+from .models import AuthVersion, User
+from .search import ngram_index
+from .tokens import FilteredRefreshToken, blacklist_filter
 
 
 class UserRegistrationTest(TestCase):
@@ -37,6 +59,26 @@ class UserRegistrationTest(TestCase):
         self.assertEqual(User.objects.count(), 2)  # Including the existing user
         self.assertEqual(User.objects.get(username="bla").email, "bla@example.com")
 
+    def test_create_user_hashes_password_once(self):
+        self.assertTrue(self.existing_user.check_password("bla"))
+
+    def test_registered_user_password(self):
+        self.client.post(
+            "/user/register/",
+            {
+                "username": "bla",
+                "first_name": "bla",
+                "last_name": "bla",
+                "email": "bla@example.com",
+                "national_id": "1234567890",
+                "user_type": "student",
+                "password": "bla",
+                "confirm_password": "bla",
+            },
+            format="json",
+        )
+        self.assertTrue(User.objects.get(username="bla").check_password("bla"))
+
     def test_user_registration_with_mismatched_passwords(self):
         response = self.client.post(
             "/user/register/",
@@ -138,3 +180,381 @@ class UserRegistrationTest(TestCase):
             format="json",
         )
         self.assertEqual(response.status_code, 400)
+
+
+class UserBulkImportTest(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.admin_user = User.objects.create_superuser(
+            username="admin",
+            email="admin@example.com",
+            password="adminpassword123",
+            national_id="0000000001",
+        )
+        self.client.force_authenticate(user=self.admin_user)
+
+    def upload(self, name, content):
+        return self.client.post(
+            "/user/users/bulk-import/",
+            {"file": SimpleUploadedFile(name, content.encode())},
+            format="multipart",
+        )
+
+    def test_import_csv(self):
+        response = self.upload(
+            "users.csv",
+            "national_id,username,email,password,first_name,last_name,user_type\n"
+            "1234567890,st1,st1@example.com,pass,a,b,student\n"
+            "1234567891,st2,st2@example.com,pass,c,d,teacher\n",
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data["created"], 2)
+        self.assertEqual(response.data["failed"], 0)
+        self.assertTrue(User.objects.get(username="st1").check_password("pass"))
+        self.assertFalse(User.objects.get(username="st2").is_active)
+
+    def test_import_reports_invalid_and_duplicate_rows(self):
+        response = self.upload(
+            "users.ndjson",
+            '{"national_id": "0000000001", "username": "x", "email": "x@example.com", "user_type": "student"}\n'
+            '{"national_id": "123", "username": "y", "email": "y@example.com", "user_type": "student"}\n'
+            '{"national_id": "1234567890", "username": "z", "email": "z@example.com", "user_type": "student"}\n'
+            '{"national_id": "1234567890", "username": "w", "email": "w@example.com", "user_type": "student"}\n'
+            "not json\n",
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data["created"], 1)
+        self.assertEqual(
+            [error["row"] for error in response.data["errors"]], [1, 2, 4, 5]
+        )
+
+    def test_import_by_non_admin(self):
+        student = User.objects.create_user(
+            username="student",
+            email="student@example.com",
+            password="pass",
+            national_id="0000000002",
+            user_type="student",
+        )
+        self.client.force_authenticate(user=student)
+        response = self.upload("users.csv", "national_id\n")
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+
+class PasswordHashingTest(TestCase):
+    def test_hash_many_frees_every_slot(self):
+        service = PasswordHashingService(workers=1, max_pending=2)
+        self.addCleanup(service.shutdown)
+        hashes = service.hash_many(f"password{i}" for i in range(5))
+        self.assertEqual(len(hashes), 5)
+        self.assertTrue(check_password("password3", hashes[3]))
+        for _ in range(2):
+            self.assertTrue(service.slots.acquire(blocking=False))
+
+
+@without_silk
+class CachedJWTAuthenticationTest(TestCase):
+    def setUp(self):
+        user_cache.clear()
+        user_versions.clear()
+        self.client = APIClient()
+        self.user = User.objects.create_user(
+            username="student",
+            email="student@example.com",
+            password="pass",
+            national_id="0000000002",
+            user_type="student",
+            is_active=True,
+        )
+        self.url = f"/user/users/{self.user.pk}/"
+        self.client.credentials(
+            HTTP_AUTHORIZATION=f"Bearer {AccessToken.for_user(self.user)}"
+        )
+
+    def test_second_request_is_served_from_cache(self):
+        hits = user_cache.stats()["hits"]
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(self.url)
+        self.assertEqual(count_queries(queries), 2)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(self.url)
+        self.assertEqual(count_queries(queries), 1)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(user_cache.stats()["hits"], hits + 1)
+
+    def test_save_invalidates_cached_user(self):
+        self.client.get(self.url)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.is_active = False
+            self.user.save()
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_rolled_back_save_keeps_cached_user(self):
+        self.client.get(self.url)
+        with self.assertRaises(RuntimeError):
+            with transaction.atomic():
+                self.user.bio = "changed"
+                self.user.save()
+                raise RuntimeError
+        self.assertFalse(AuthVersion.objects.exists())
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(self.url)
+        self.assertEqual(count_queries(queries), 1)
+
+    def test_change_through_other_worker_is_seen_after_sync(self):
+        self.client.get(self.url)
+        # another worker deactivates the user and bumps the stamp
+        User.objects.filter(pk=self.user.pk).update(is_active=False)
+        AuthVersion.objects.create(
+            user_id=self.user.pk, version=1, updated_at=timezone.now()
+        )
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        user_versions.sync()
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+
+class TokenBlacklistFilterTest(TestCase):
+    def setUp(self):
+        blacklist_filter.rebuild()
+        self.client = APIClient()
+        self.user = User.objects.create_user(
+            username="student",
+            email="student@example.com",
+            password="pass",
+            national_id="0000000002",
+            user_type="student",
+            is_active=True,
+        )
+        self.refresh = FilteredRefreshToken.for_user(self.user)
+
+    def test_refresh_skips_blacklist_query(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post(
+                "/api/token/refresh/", {"refresh": str(self.refresh)}, format="json"
+            )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertFalse(
+            [q for q in queries.captured_queries if "blacklistedtoken" in q["sql"]]
+        )
+
+    def test_refresh_after_logout(self):
+        self.client.force_authenticate(user=self.user)
+        response = self.client.post(
+            "/user/logout/", {"refresh": str(self.refresh)}, format="json"
+        )
+        self.assertEqual(response.status_code, status.HTTP_205_RESET_CONTENT)
+
+        response = self.client.post(
+            "/api/token/refresh/", {"refresh": str(self.refresh)}, format="json"
+        )
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_rows_committed_out_of_order_are_pulled(self):
+        tokens = [FilteredRefreshToken.for_user(self.user) for _ in range(3)]
+        rows = [
+            BlacklistedToken.objects.create(
+                token=OutstandingToken.objects.get(jti=token["jti"])
+            )
+            for token in tokens
+        ]
+        # the middle row is not committed yet when the filter pulls
+        late_id, late_token = rows[1].pk, rows[1].token
+        rows[1].delete()
+        blacklist_filter.last_sync = 0
+        self.assertTrue(blacklist_filter.might_contain(tokens[2]["jti"]))
+        self.assertIn(late_id, blacklist_filter.gaps)
+
+        BlacklistedToken.objects.create(pk=late_id, token=late_token)
+        blacklist_filter.last_sync = 0
+        self.assertTrue(blacklist_filter.might_contain(tokens[1]["jti"]))
+        self.assertEqual(blacklist_filter.gaps, {})
+
+    def test_prune_tokens(self):
+        self.refresh.blacklist()
+        expired = FilteredRefreshToken.for_user(self.user)
+        OutstandingToken.objects.filter(jti=expired["jti"]).update(
+            expires_at=timezone.now() - timedelta(days=1)
+        )
+        expired.blacklist()
+        expired_id = OutstandingToken.objects.get(jti=expired["jti"]).id
+
+        out = StringIO()
+        call_command("prune_tokens", batch_size=1, stdout=out)
+        self.assertEqual(
+            list(OutstandingToken.objects.values_list("jti", flat=True)),
+            [self.refresh["jti"]],
+        )
+        # each committed batch reports the id to resume from
+        self.assertTrue(
+            out.getvalue().startswith(
+                f"Deleted 1 expired tokens up to id {expired_id}.\n"
+            )
+        )
+
+
+class KeysetPaginationTest(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.admin_user = User.objects.create_superuser(
+            username="admin",
+            email="admin@example.com",
+            password="adminpassword123",
+            national_id="0000000001",
+        )
+        for i in range(4):
+            User.objects.create_user(
+                username=f"student{i}",
+                email=f"student{i}@example.com",
+                password="pass",
+                national_id=f"100000000{i}",
+                user_type="student",
+            )
+        self.client.force_authenticate(user=self.admin_user)
+
+    def test_follow_cursor(self):
+        response = self.client.get("/user/users/", {"limit": 2})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertNotIn("count", response.data)
+        usernames = [user["username"] for user in response.data["results"]]
+
+        while response.data["next"]:
+            response = self.client.get(response.data["next"])
+            usernames += [user["username"] for user in response.data["results"]]
+        self.assertEqual(
+            usernames, ["admin", "student0", "student1", "student2", "student3"]
+        )
+
+    def test_exact_count(self):
+        response = self.client.get("/user/users/", {"limit": 2, "count": "exact"})
+        self.assertEqual(response.data["count"], 5)
+        self.assertTrue(response.data["count_exact"])
+
+
+class BulkActivationTest(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.admin_user = User.objects.create_superuser(
+            username="admin",
+            email="admin@example.com",
+            password="adminpassword123",
+            national_id="0000000001",
+        )
+        self.students = [
+            User.objects.create_user(
+                username=f"student{i}",
+                email=f"student{i}@example.com",
+                password="pass",
+                national_id=f"12{i}0000000",
+                user_type="student",
+            )
+            for i in range(3)
+        ]
+        self.client.force_authenticate(user=self.admin_user)
+
+    def test_bulk_activate_by_filter(self):
+        response = self.client.post(
+            "/user/users/bulk-activate/",
+            {"user_type": "student", "national_id_prefix": "121"},
+            format="json",
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data, {"updated": 1})
+        self.assertEqual(
+            list(User.objects.filter(is_active=True, user_type="student")),
+            [self.students[1]],
+        )
+
+    def test_bulk_activate_then_deactivate_by_ids(self):
+        ids = [student.pk for student in self.students]
+        response = self.client.post(
+            "/user/users/bulk-activate/", {"ids": ids}, format="json"
+        )
+        self.assertEqual(response.data["updated"], 3)
+
+        response = self.client.post(
+            "/user/users/bulk-deactivate/",
+            {"ids": ids + [self.admin_user.pk]},
+            format="json",
+        )
+        self.assertEqual(response.data["updated"], 3)
+        self.assertTrue(User.objects.get(pk=self.admin_user.pk).is_active)
+
+    def test_admin_activate_action(self):
+        self.client.force_login(self.admin_user)
+        response = self.client.post(
+            "/admin/user/user/",
+            {
+                "action": "activate_users",
+                "_selected_action": [student.pk for student in self.students[:2]],
+            },
+        )
+        self.assertEqual(response.status_code, status.HTTP_302_FOUND)
+        self.assertEqual(
+            list(User.objects.filter(is_active=True, user_type="student")),
+            self.students[:2],
+        )
+
+    def test_bulk_activate_requires_criteria(self):
+        response = self.client.post("/user/users/bulk-activate/", {}, format="json")
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class UserSearchTest(TestCase):
+    def setUp(self):
+        enrollment_index.clear()
+        ngram_index.build()
+        self.client = APIClient()
+        self.admin_user = User.objects.create_superuser(
+            username="admin",
+            email="admin@example.com",
+            password="adminpassword123",
+            national_id="0000000001",
+        )
+        self.manager_user = User.objects.create_user(
+            username="manager",
+            email="manager@example.com",
+            password="pass",
+            national_id="0000000002",
+            user_type="manager",
+        )
+        self.ali = User.objects.create_user(
+            username="ali.rezaei",
+            first_name="Ali",
+            last_name="Rezaei",
+            email="ali@example.com",
+            password="pass",
+            national_id="1000000001",
+            user_type="student",
+        )
+        self.alireza = User.objects.create_user(
+            username="alireza",
+            first_name="Alireza",
+            last_name="Karimi",
+            email="alireza@example.com",
+            password="pass",
+            national_id="1000000002",
+            user_type="student",
+        )
+        school = School.objects.create(name="Test School", manager=self.manager_user)
+        class_obj = Class.objects.create(name="Class A", school=school)
+        class_obj.students.add(self.ali)
+
+    def test_search_by_admin(self):
+        self.client.force_authenticate(user=self.admin_user)
+        response = self.client.get("/user/users/search/", {"q": "rezaei"})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data[0]["id"], self.ali.pk)
+
+    def test_search_by_manager_is_scoped_to_school(self):
+        self.client.force_authenticate(user=self.manager_user)
+        response = self.client.get("/user/users/search/", {"q": "ali"})
+        self.assertEqual([user["id"] for user in response.data], [self.ali.pk])
+
+    def test_search_by_student(self):
+        self.client.force_authenticate(user=self.ali)
+        response = self.client.get("/user/users/search/", {"q": "ali"})
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
@@ -0,0 +1,187 @@
+import hashlib
+import math
+import threading
+import time
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.token_blacklist.models import (
+    BlacklistedToken,
+    OutstandingToken,
+)
+from rest_framework_simplejwt.tokens import RefreshToken
+
+# Most skipped ids a blacklist filter keeps asking for.
+MAX_GAPS = 1000
+
+class BloomFilter:
+    """
+    Fixed size Bloom filter over strings. `in` never gives a false negative,
+    and gives a false positive with roughly `error_rate` probability while
+    fewer than `capacity` items were added.
+    """
+
+    def __init__(self, capacity, error_rate=0.001):
+        self.capacity = capacity
+        self.size = max(8, int(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hash_count = max(1, round(self.size / capacity * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+        self.count = 0
+
+    def _positions(self, item):
+        digest = hashlib.blake2b(item.encode(), digest_size=16).digest()
+        first = int.from_bytes(digest[:8], "little")
+        second = int.from_bytes(digest[8:], "little") | 1
+        for i in range(self.hash_count):
+            yield (first + i * second) % self.size
+
+    def add(self, item):
+        for position in self._positions(item):
+            self.bits[position >> 3] |= 1 << (position & 7)
+        self.count += 1
+
+    def __contains__(self, item):
+        return all(
+            self.bits[position >> 3] & (1 << (position & 7))
+            for position in self._positions(item)
+        )
+
+
+class BlacklistFilter:
+    """
+    In-memory filter of blacklisted token ids. New blacklist rows are pulled
+    incrementally (by primary key) at most every `SYNC_INTERVAL` seconds, so a
+    token blacklisted by another worker is only rejected here after that
+    delay. Tokens blacklisted in this process are added immediately.
+
+    Ids are not committed in order: a row may appear below ids already
+    pulled. Ids skipped by a pull are kept as gaps and asked for again by
+    the following pulls for `GAP_TIMEOUT` seconds, and the filter is
+    rebuilt from scratch every `REBUILD_INTERVAL` seconds for the rest.
+    """
+
+    def __init__(self):
+        options = getattr(settings, "TOKEN_BLACKLIST_FILTER", {})
+        self.capacity = options.get("CAPACITY", 100000)
+        self.error_rate = options.get("ERROR_RATE", 0.001)
+        self.sync_interval = options.get("SYNC_INTERVAL", 5)
+        self.gap_timeout = options.get("GAP_TIMEOUT", 60)
+        self.rebuild_interval = options.get("REBUILD_INTERVAL", 10 * 60)
+        self.lock = threading.Lock()
+        self.bloom = None
+        self.last_id = 0
+        self.gaps = {}
+        self.last_sync = 0.0
+        self.built_at = 0.0
+
+    def rebuild(self):
+        with self.lock:
+            count = BlacklistedToken.objects.count()
+            while self.capacity < count * 2:
+                self.capacity *= 2
+            self.bloom = BloomFilter(self.capacity, self.error_rate)
+            self.last_id = 0
+            self.gaps = {}
+            self.built_at = time.monotonic()
+            self._pull()
+
+    def _pull(self):
+        now = time.monotonic()
+        rows = (
+            BlacklistedToken.objects.filter(
+                Q(id__gt=self.last_id) | Q(id__in=list(self.gaps))
+            )
+            .order_by("id")
+            .values_list("id", "token__jti")
+        )
+        for row_id, jti in rows.iterator(chunk_size=5000):
+            self.bloom.add(jti)
+            if self.gaps.pop(row_id, None) is not None:
+                continue
+            if self.last_id and row_id - self.last_id - 1 <= MAX_GAPS:
+                for missing in range(self.last_id + 1, row_id):
+                    self.gaps[missing] = now
+            self.last_id = row_id
+        self.gaps = {
+            row_id: seen
+            for row_id, seen in list(self.gaps.items())[-MAX_GAPS:]
+            if now - seen < self.gap_timeout
+        }
+        self.last_sync = now
+
+    def sync(self):
+        if (
+            self.bloom is None
+            or self.bloom.count > self.capacity
+            or time.monotonic() - self.built_at >= self.rebuild_interval
+        ):
+            self.rebuild()
+            return
+        if time.monotonic() - self.last_sync >= self.sync_interval:
+            with self.lock:
+                self._pull()
+
+    def add(self, jti):
+        if self.bloom is not None:
+            with self.lock:
+                self.bloom.add(jti)
+
+    def might_contain(self, jti):
+        self.sync()
+        return jti in self.bloom
+
+
+blacklist_filter = BlacklistFilter()
+
+
+class FilteredRefreshToken(RefreshToken):
+    """
+    Refresh token whose blacklist check consults `blacklist_filter` first and
+    only queries the blacklist table for possible members.
+    """
+
+    def check_blacklist(self):
+        jti = self.payload[api_settings.JTI_CLAIM]
+        if blacklist_filter.might_contain(jti):
+            super().check_blacklist()
+
+    def blacklist(self):
+        blacklisted = super().blacklist()
+        blacklist_filter.add(self.payload[api_settings.JTI_CLAIM])
+        return blacklisted
+
+
+def prune_expired_tokens(
+    batch_size=1000, after_id=0, max_batches=None, pause=0, on_batch=None
+):
+    """
+    Delete expired outstanding tokens and their blacklist rows in primary key
+    order, one short transaction per batch. Returns the number of deleted
+    tokens and the last id reached, which can be passed back as `after_id`
+    to resume an interrupted run. `on_batch(deleted, last_id)` is called
+    after each committed batch.
+    """
+    now = timezone.now()
+    deleted = 0
+    batches = 0
+    while max_batches is None or batches < max_batches:
+        ids = list(
+            OutstandingToken.objects.filter(id__gt=after_id, expires_at__lt=now)
+            .order_by("id")
+            .values_list("id", flat=True)[:batch_size]
+        )
+        if not ids:
+            break
+        with transaction.atomic():
+            _, counts = OutstandingToken.objects.filter(id__in=ids).delete()
+        deleted += counts.get(OutstandingToken._meta.label, 0)
+        after_id = ids[-1]
+        batches += 1
+        if on_batch is not None:
+            on_batch(deleted, after_id)
+        if pause:
+            time.sleep(pause)
+    return deleted, after_id
@@ -1,5 +1,7 @@
-from django.contrib.auth.hashers import make_password
 from django.contrib.auth.models import BaseUserManager
+from django.db import connections, transaction
+
+from .hashing import hashing_service
 
 
 class UserManager(BaseUserManager):
@@ -15,7 +17,7 @@ class UserManager(BaseUserManager):
 
         email = self.normalize_email(email)
         user = self.model(username=username, email=email, **extra_fields)
-        user.set_password(make_password(password))
+        user.password = hashing_service.hash(password)
         user.save(using=self._db)
         return user
 
@@ -32,3 +34,30 @@ class UserManager(BaseUserManager):
             raise ValueError("Superuser must have is_superuser=True.")
 
         return self.create_user(username, email, password, **extra_fields)
+
+    def set_active(self, queryset, is_active):
+        """
+        Set `is_active` on every user of `queryset` whose flag differs, with a
+        single `UPDATE ... RETURNING` on PostgreSQL and SQLite. Returns the
+        ids of the changed users.
+        """
+        queryset = queryset.exclude(is_active=is_active)
+        connection = connections[queryset.db]
+        if connection.vendor not in ["postgresql", "sqlite"]:
+            with transaction.atomic(using=queryset.db):
+                ids = list(queryset.select_for_update().values_list("pk", flat=True))
+                self.filter(pk__in=ids).update(is_active=is_active)
+            return ids
+
+        quote = connection.ops.quote_name
+        opts = self.model._meta
+        pk = quote(opts.pk.column)
+        subquery, params = queryset.values("pk").query.sql_with_params()
+        sql = (
+            f"UPDATE {quote(opts.db_table)} "
+            f"SET {quote(opts.get_field('is_active').column)} = %s "
+            f"WHERE {pk} IN ({subquery}) RETURNING {pk}"
+        )
+        with connection.cursor() as cursor:
+            cursor.execute(sql, [is_active, *params])
+            return [row[0] for row in cursor.fetchall()]
@@ -1,21 +1,31 @@
+from django.db.models import Q
 from django.shortcuts import render
 from drf_yasg.utils import swagger_auto_schema
 from rest_framework import generics, status, viewsets
 from rest_framework.decorators import *
+from rest_framework.parsers import MultiPartParser
 from rest_framework.permissions import *
 from rest_framework.response import *
 from rest_framework.views import *
-from rest_framework_simplejwt.tokens import RefreshToken
+from rest_framework_simplejwt.views import TokenRefreshView
 
+from school.access import lesson_ids_for
+from school.lessons import lesson_catalog
 from school.models import *
+from school.principal import get_principal
 from school.serializer import *
+from schoolManagement.queryplan import QueryPlanMixin
 
+from .authentication import invalidate_users, user_cache
+from .importer import UserImporter, detect_format, iter_rows
 from .models import User
 from .permission import *
+from .search import search_users
 from .serializer import *
+from .tokens import FilteredRefreshToken
 
 
-class UserViewSet(viewsets.ModelViewSet):
+class UserViewSet(QueryPlanMixin, viewsets.ModelViewSet):
     permission_classes = [IsAuthenticated]
     queryset = User.objects.all()
     serializer_class = UserSerializer
@@ -34,55 +44,172 @@ class UserViewSet(viewsets.ModelViewSet):
     def activate(self, request, pk=None):
         user = self.get_object()
         user.is_active = True
-        user.save()
+        user.save(update_fields=["is_active"])
         return Response(
             {"message": "User activated successfully."},
             status=status.HTTP_200_OK,
         )
 
-    @swagger_auto_schema(operation_description="See all lessons of teacher.")
+    @swagger_auto_schema(operation_description="Deactivate user by admin.")
+    @action(
+        detail=True,
+        methods=["patch"],
+        permission_classes=[IsAdminUser],
+    )
+    def deactivate(self, request, pk=None):
+        user = self.get_object()
+        user.is_active = False
+        user.save(update_fields=["is_active"])
+        return Response(
+            {"message": "User deactivated successfully."},
+            status=status.HTTP_200_OK,
+        )
+
+    def set_active_bulk(self, request, is_active):
+        serializer = BulkActivationSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        queryset = serializer.get_queryset().exclude(pk=request.user.pk)
+        ids = User.objects.set_active(queryset, is_active)
+        invalidate_users(ids)
+        return Response({"updated": len(ids)}, status=status.HTTP_200_OK)
+
+    @swagger_auto_schema(
+        operation_description="Activate users selected by ids or filters by admin.",
+        request_body=BulkActivationSerializer,
+    )
+    @action(
+        detail=False,
+        methods=["post"],
+        url_path="bulk-activate",
+        url_name="bulk-activate",
+        permission_classes=[IsAdminUser],
+    )
+    def bulk_activate(self, request):
+        """
+
+        URL: /users/bulk-activate/
+        Request Body: {"ids": [1, 2]} or
+            {"user_type": "student", "national_id_prefix": "12", "joined_after": "..."}
+
+        """
+        return self.set_active_bulk(request, True)
+
+    @swagger_auto_schema(
+        operation_description="Deactivate users selected by ids or filters by admin.",
+        request_body=BulkActivationSerializer,
+    )
+    @action(
+        detail=False,
+        methods=["post"],
+        url_path="bulk-deactivate",
+        url_name="bulk-deactivate",
+        permission_classes=[IsAdminUser],
+    )
+    def bulk_deactivate(self, request):
+        # URL: /users/bulk-deactivate/
+        return self.set_active_bulk(request, False)
+
+    @swagger_auto_schema(
+        operation_description="Hit ratio of this worker's authentication cache."
+    )
     @action(
         detail=False,
         methods=["get"],
-        url_name="my-lessons",
-        url_path="my-lessons",
-        permission_classes=[IsTeacher],
+        url_path="auth-cache-stats",
+        url_name="auth-cache-stats",
+        permission_classes=[IsAdminUser],
     )
-    def my_lessons(self, request):
+    def auth_cache_stats(self, request):
+        return Response(user_cache.stats(), status=status.HTTP_200_OK)
 
-        # URL: /users/my_lessons/
+    @swagger_auto_schema(operation_description="Import users from a CSV or NDJSON file by admin.")
+    @action(
+        detail=False,
+        methods=["post"],
+        url_path="bulk-import",
+        url_name="bulk-import",
+        permission_classes=[IsAdminUser],
+        parser_classes=[MultiPartParser],
+    )
+    def bulk_import(self, request):
+        """
 
+        URL: /users/bulk-import/
+        Request Body (multipart): {"file": <users.csv | users.ndjson>, "activate": true}
+
+        """
+        upload = request.FILES.get("file")
+        if upload is None:
+            return Response(
+                {"detail": "The file is required."},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        fmt = request.data.get("format") or detect_format(upload.name)
+        if fmt not in ["csv", "ndjson"]:
+            return Response(
+                {"detail": "The file must be CSV or NDJSON."},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        activate = str(request.data.get("activate", "")).lower() in ["1", "true"]
+        importer = UserImporter(activate=activate)
+        report = importer.run(iter_rows(upload, fmt))
+        return Response(report, status=status.HTTP_200_OK)
+
+    @swagger_auto_schema(operation_description="Search users by admin or manager.")
+    @action(
+        detail=False,
+        methods=["get"],
+        permission_classes=[IsAdminUser | IsManager],
+    )
+    def search(self, request):
+
+        # URL: /users/search/?q=ali&limit=10
+
+        query = request.query_params.get("q", "").strip()
+        if len(query) < 2:
+            return Response(
+                {"detail": "The search query must have at least 2 characters."},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
         try:
-            lessons = Lesson.objects.filter(
-                class_lessons__teacher=request.user
-            ).distinct()
-            serializer = LessonSerializer(lessons, many=True)
-            return Response(serializer.data, status=status.HTTP_200_OK)
+            limit = min(int(request.query_params.get("limit", 10)), 50)
+        except ValueError:
+            limit = 10
 
-        except Exception as e:
-            return Response({"detail": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        if request.user.is_staff:
+            users = User.objects.all()
+        else:
+            # Managers only find the students and teachers of their school.
+            class_ids = get_principal(request).managed_class_ids
+            users = User.objects.filter(
+                Q(
+                    id__in=Class.students.through.objects.filter(
+                        class_id__in=class_ids
+                    ).values("user_id")
+                )
+                | Q(id__in=Class.objects.filter(id__in=class_ids).values("teacher_id"))
+            )
+
+        results = search_users(query, users, limit)
+        data = UserSerializer(results, many=True).data
+        for item, user in zip(data, results):
+            item["similarity"] = round(user.similarity, 3)
+        return Response(data, status=status.HTTP_200_OK)
 
-    @swagger_auto_schema(operation_description="See all lessons of student.")
+    @swagger_auto_schema(operation_description="See all lessons of teacher or student.")
     @action(
         detail=False,
         methods=["get"],
         url_name="my-lessons",
         url_path="my-lessons",
-        permission_classes=[IsStudent],
+        permission_classes=[IsTeacher | IsStudent],
     )
     def my_lessons(self, request):
 
-        # URL: /users/my_lessons/
+        # URL: /users/my-lessons/
 
-        try:
-            lessons = Lesson.objects.filter(
-                class_lessons__students=request.user
-            ).distinct()
-            serializer = LessonSerializer(lessons, many=True)
-            return Response(serializer.data, status=status.HTTP_200_OK)
-
-        except Exception as e:
-            return Response({"detail": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        lesson_ids = lesson_ids_for(request.user).values_list("lesson_id", flat=True)
+        return Response(lesson_catalog.serialize(lesson_ids), status=status.HTTP_200_OK)
 
     def list(self, request, *args, **kwargs):
         if self.request.user.is_staff:
@@ -142,7 +269,7 @@ class LogoutAPIView(generics.GenericAPIView):
     def post(self, request, *args, **kwargs):
         try:
             refresh_token = request.data["refresh"]
-            token = RefreshToken(refresh_token)
+            token = FilteredRefreshToken(refresh_token)
             token.blacklist()
             return Response(
                 {"detail": "Successfully logged out."},
@@ -153,3 +280,7 @@ class LogoutAPIView(generics.GenericAPIView):
                 {"detail": "There is a problem with logging out."},
                 status=status.HTTP_400_BAD_REQUEST,
             )
+
+
+class FilteredTokenRefreshView(TokenRefreshView):
+    serializer_class = FilteredTokenRefreshSerializer